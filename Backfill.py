@@ -0,0 +1,443 @@
+"""Archiva las publicaciones de varios boletines para reprocesarlas.
+
+Descarga las publicaciones de un rango de boletines, o de todos los
+boletines de un municipio, y las agrega a un archivo comprimido.
+
+Uso:
+    python Backfill.py 4000-4047 [--workers N] [--output archivo]
+    python Backfill.py all [--workers N] [--output archivo]
+
+Si se corta, volviendo a correr el mismo comando se retoma desde el
+último checkpoint, sin volver a descargar lo ya archivado.
+"""
+import argparse
+import gzip
+import io
+import json
+import os
+import re
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from SIBOM import SIBOM, BulletinIndexScanner
+
+# zstd comprime mejor y más rápido que gzip, pero es opcional
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+
+class BackfillArchive:
+    """Archivo comprimido, sólo de agregado, con una publicación por
+    línea en JSON, más un checkpoint para retomar.
+
+    Cada Flush agrega un bloque comprimido independiente al final del
+    archivo (un frame de zstd o un miembro de gzip; los dos formatos
+    admiten concatenarlos) y después reescribe el checkpoint, que
+    guarda hasta qué byte el archivo es válido. Si el proceso se corta
+    entre las dos cosas, al abrirlo de nuevo trunco lo que sobra, así
+    nunca quedan publicaciones repetidas.
+
+    Atributos
+    ---------
+    path : str
+        Path del archivo. Si termina en ".zst" uso zstd, si no gzip. Si
+        es un archivo nuevo y no está instalado zstandard, cambio ".zst"
+        por ".gz".
+    level : int
+        Nivel de compresión.
+    done_bulletins : set
+        IDs de los boletines archivados completos.
+    partial : dict
+        ID de boletín incompleto --> set con los content IDs ya
+        archivados.
+    records : int
+        Cantidad de publicaciones en el archivo.
+    """
+    level = 9
+
+    def __init__(self, path: str, read_only: bool = False) -> None:
+        """
+        Parámetros
+        ----------
+        path : str
+            Ídem atributo. Se crea el directorio si no existe.
+        read_only : bool
+            Si es True, sólo voy a leer el archivo (con Read), así que
+            no lo toco aunque tenga bytes sin checkpoint: puede estar
+            escribiéndolo otro proceso.
+        """
+        if path.endswith(".zst") and zstandard is None:
+            # Sin zstandard no puedo leer ni agregar a un archivo ya
+            # empezado, pero uno nuevo lo puedo escribir con gzip
+            if read_only or os.path.exists(path + ".checkpoint"):
+                raise ImportError("Para usar %s hace falta zstandard" % (path))
+            print("WARNING: zstandard no está instalado, uso gzip")
+            path = path[:-len(".zst")] + ".gz"
+
+        self.path = path
+        self.checkpoint_path = path + ".checkpoint"
+        self.zstd = path.endswith(".zst")
+
+        directory = os.path.dirname(path)
+        if directory and not os.path.exists(directory) and not read_only:
+            os.makedirs(directory)
+
+        self.done_bulletins = set()
+        self.partial = {}
+        self.records = 0
+        self._size = 0
+        self._pending = []
+
+        if os.path.exists(self.checkpoint_path):
+            with open(self.checkpoint_path, "rt") as fp:
+                checkpoint = json.load(fp)
+            self.done_bulletins = set(checkpoint["bulletins"])
+            self.partial = {int(id): set(contents)
+                            for id, contents in checkpoint["partial"].items()}
+            self.records = checkpoint["records"]
+            self._size = checkpoint["archive_bytes"]
+
+        if read_only:
+            return
+
+        # Descarto lo escrito después del último checkpoint
+        with open(self.path, "ab") as fp:
+            if fp.tell() > self._size:
+                print("WARNING: Descarto %s bytes sin checkpoint de %s" % (
+                    fp.tell() - self._size, self.path))
+                fp.truncate(self._size)
+
+        return
+
+    def IsArchived(self, bulletin_id: int, content_id: int) -> bool:
+        """Devuelvo True si la publicación ya está en el archivo."""
+        return (bulletin_id in self.done_bulletins
+                or content_id in self.partial.get(bulletin_id, ()))
+
+    def Add(self, record: dict) -> None:
+        """Agrego una publicación. Queda en memoria hasta el próximo
+        Flush.
+
+        Parámetros
+        ----------
+        record : dict
+            Publicación, como la devuelve Backfill.GetRecord.
+        """
+        self._pending.append(record)
+        return
+
+    def GetPending(self) -> int:
+        """Devuelvo la cantidad de publicaciones sin escribir."""
+        return len(self._pending)
+
+    def Flush(self, finished: list = ()) -> None:
+        """Escribo las publicaciones pendientes y actualizo el
+        checkpoint.
+
+        Parámetros
+        ----------
+        finished : list
+            IDs de boletines que quedaron completos.
+        """
+        if self._pending:
+            lines = "".join(json.dumps(record, ensure_ascii=False) + "\n"
+                            for record in self._pending)
+            data = self._Compress(lines.encode("utf-8"))
+            with open(self.path, "ab") as fp:
+                fp.write(data)
+                fp.flush()
+                os.fsync(fp.fileno())
+            self._size += len(data)
+            self.records += len(self._pending)
+            for record in self._pending:
+                self.partial.setdefault(record["bulletin_id"], set()).add(
+                    record["content_id"])
+            self._pending = []
+
+        # Una vez completo el boletín, alcanza con guardar su ID
+        for bulletin_id in finished:
+            self.done_bulletins.add(bulletin_id)
+            self.partial.pop(bulletin_id, None)
+
+        self._WriteCheckpoint()
+        return
+
+    def Read(self):
+        """Devuelvo un generador con las publicaciones archivadas hasta
+        el último checkpoint.
+        """
+        with open(self.path, "rb") as fp:
+            data = io.BytesIO(fp.read(self._size))
+        if self.zstd:
+            stream = zstandard.ZstdDecompressor().stream_reader(
+                data, read_across_frames=True)
+        else:
+            stream = gzip.GzipFile(fileobj=data)
+
+        with io.TextIOWrapper(stream, encoding="utf-8") as text:
+            for line in text:
+                yield json.loads(line)
+        return
+
+    def _Compress(self, data: bytes) -> bytes:
+        """Comprimo un bloque en el formato del archivo."""
+        if self.zstd:
+            return zstandard.ZstdCompressor(level=self.level).compress(data)
+        return gzip.compress(data, compresslevel=self.level)
+
+    def _WriteCheckpoint(self) -> None:
+        """Reescribo el checkpoint. Escribo a un archivo temporal y lo
+        renombro, así nunca queda a medio escribir.
+        """
+        checkpoint = {"archive_bytes": self._size,
+                      "records": self.records,
+                      "bulletins": sorted(self.done_bulletins),
+                      "partial": {str(id): sorted(contents)
+                                  for id, contents in self.partial.items()},
+                      "updated_at": time.time()}
+        with open(self.checkpoint_path + ".tmp", "wt") as fp:
+            json.dump(checkpoint, fp)
+            fp.flush()
+            os.fsync(fp.fileno())
+        os.replace(self.checkpoint_path + ".tmp", self.checkpoint_path)
+        return
+
+
+class Backfill:
+    """Archiva las publicaciones de varios boletines.
+
+    Las descargas se hacen en paralelo (ver SIBOM.IterPublicaciones),
+    encadenando los boletines para que el pool no se vacíe entre uno y
+    otro. Las tablas se guardan como HTML, sin dibujarlas.
+
+    Un boletín queda marcado como completo sólo si se archivaron todas
+    sus publicaciones; si alguna falló, en la próxima corrida se
+    descargan únicamente las que faltan.
+
+    Atributos
+    ---------
+    max_workers : int
+        Cantidad de descargas simultáneas pedida.
+    politeness_cap : int
+        Tope de descargas simultáneas, sin importar max_workers, para no
+        sobrecargar SIBOM.
+    flush_every : int
+        Cantidad de publicaciones por bloque comprimido (y por
+        checkpoint).
+    max_index_pages : int
+        Cantidad máxima de páginas índice a recorrer al buscar todos los
+        boletines del municipio.
+    """
+    max_workers = 4
+    politeness_cap = 8
+    flush_every = 50
+    max_index_pages = 5000
+
+    def __init__(self, sibom: SIBOM, archive: BackfillArchive, max_workers: int = None) -> None:
+        """
+        Parámetros
+        ----------
+        sibom : SIBOM
+            Instancia del municipio a archivar.
+        archive : BackfillArchive
+            Archivo donde guardar las publicaciones.
+        max_workers : int
+            Si no es None, reemplaza el valor por defecto.
+        """
+        self.sibom = sibom
+        self.archive = archive
+        if max_workers is not None:
+            self.max_workers = max_workers
+        self.failures = 0
+        return
+
+    def GetWorkers(self) -> int:
+        """Devuelvo la cantidad de descargas simultáneas a usar."""
+        return max(min(self.max_workers, self.politeness_cap), 1)
+
+    def GetAllBulletinIDs(self) -> list:
+        """Recorro las páginas índice de SIBOM y devuelvo, ordenados, los
+        IDs de todos los boletines del municipio.
+
+        Descargo de a GetWorkers() páginas a la vez, hasta llegar a una
+        página sin boletines.
+        """
+        ids = set()
+        workers = self.GetWorkers()
+        last = self.max_index_pages + 1
+
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            for first in range(1, last, workers):
+                pages = list(pool.map(self._ScanIndexPage,
+                                      range(first, min(first + workers, last))))
+                for rows in pages:
+                    for text, id in rows:
+                        if self.sibom.muni_regex.search(text):
+                            ids.add(id)
+                if any(len(rows) == 0 for rows in pages):
+                    break
+
+        return sorted(ids)
+
+    def Run(self, ids: list) -> dict:
+        """Archivo las publicaciones de los boletines indicados y
+        devuelvo un resumen de la corrida. Los boletines de otros
+        municipios (según el título de su página, ver
+        SIBOM.GetBulletin) se saltean sin archivarlos.
+
+        Parámetros
+        ----------
+        ids : list
+            IDs de los boletines a archivar.
+        """
+        start = time.time()
+        ids = [id for id in ids if id not in self.archive.done_bulletins]
+        # Boletín --> cantidad de URLs a descargar, una vez listadas todas
+        listed = {}
+        processed = dict.fromkeys(ids, 0)
+        failed = set()
+        # Boletines de otros municipios
+        other = set()
+        finished = []
+        # URLs pedidas y todavía no devueltas, en orden
+        urls = deque()
+        archived = 0
+
+        def Check(bulletin_id: int) -> None:
+            if (listed.get(bulletin_id) == processed[bulletin_id]
+                    and bulletin_id not in failed):
+                finished.append(bulletin_id)
+                # Para no agregarlo dos veces
+                listed[bulletin_id] = None
+            return
+
+        def IterURLs():
+            for bulletin_id in ids:
+                title, bulletin_urls = self.sibom.GetBulletin(bulletin_id)
+                # Un rango de IDs incluye los boletines de todos los
+                # municipios. Si no encontré el título, no descarto nada.
+                if title and not self.sibom.muni_regex.search(title):
+                    other.add(bulletin_id)
+                    continue
+
+                pending = 0
+                for url in bulletin_urls:
+                    if not self.archive.IsArchived(bulletin_id, self.GetContentID(url)):
+                        pending += 1
+                        urls.append(url)
+                        yield url
+                if len(bulletin_urls) == 0:
+                    # Vacío o inaccesible: lo dejo para la próxima corrida
+                    print("WARNING: No encontré publicaciones en el boletín %s" % (
+                        bulletin_id))
+                    failed.add(bulletin_id)
+                listed[bulletin_id] = pending
+                Check(bulletin_id)
+            return
+
+        for pub in self.sibom.IterPublicaciones(0, IterURLs(), self.GetWorkers()):
+            url = urls.popleft()
+            bulletin_id = self.GetBulletinID(url)
+            processed[bulletin_id] += 1
+
+            if pub.url == "":
+                print("ERROR: No pude procesar %s" % (url))
+                self.failures += 1
+                failed.add(bulletin_id)
+            else:
+                self.archive.Add(self.GetRecord(bulletin_id, pub))
+                archived += 1
+            Check(bulletin_id)
+
+            if self.archive.GetPending() >= self.flush_every or finished:
+                self.archive.Flush(finished)
+                finished.clear()
+
+        self.archive.Flush(finished)
+        elapsed = time.time() - start
+        return {"bulletins": len(ids) - len(other),
+                "other_muni": len(other),
+                "incomplete": len(failed),
+                "publications": archived,
+                "failures": self.failures,
+                "seconds": round(elapsed, 1),
+                "publications_per_second": round(archived / elapsed, 2) if elapsed else 0}
+
+    def GetRecord(self, bulletin_id: int, pub) -> dict:
+        """Devuelvo el registro a archivar de una publicación.
+
+        Parámetros
+        ----------
+        bulletin_id : int
+            ID del boletín.
+        pub : Publicacion
+            Publicación parseada, sin dibujar las tablas.
+        """
+        return {"bulletin_id": bulletin_id,
+                "content_id": self.GetContentID(pub.url),
+                "url": pub.url,
+                "titulo": pub.titulo,
+                "ciudad_fecha": pub.ciudad_fecha,
+                "articulos": pub.articulos,
+                "anexos": pub.anexos,
+                "cuits": pub.cuits,
+                "tablas": [str(tabla) for tabla in pub.tablas],
+                "fetched_at": round(time.time())}
+
+    def _ScanIndexPage(self, page: int) -> list:
+        """Devuelvo las filas (texto, ID de boletín) de una página
+        índice, o una lista vacía si no tiene o no se pudo acceder.
+        """
+        url = self.sibom.sibom_url + ("", "?page=%s" % (page))[page > 1]
+        text = self.sibom.http.GetText(url)
+        if text is None:
+            return []
+        scanner = BulletinIndexScanner()
+        scanner.feed(text)
+        return scanner.rows
+
+    @staticmethod
+    def GetContentID(url: str) -> int:
+        """".../bulletins/4047/contents/1477570" --> 1477570"""
+        return int(url.split("contents/")[1])
+
+    @staticmethod
+    def GetBulletinID(url: str) -> int:
+        """".../bulletins/4047/contents/1477570" --> 4047"""
+        return int(re.search(r"(\d+)/contents/", url).group(1))
+
+
+def ParseRange(text: str) -> list:
+    """"4000-4002" --> [4000, 4001, 4002]; "4047" --> [4047]"""
+    first, _, last = text.partition("-")
+    return list(range(int(first), int(last or first) + 1))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("bulletins", help='Rango de IDs (ej.: "4000-4047") o "all"')
+    parser.add_argument("--workers", type=int, default=Backfill.max_workers,
+                        help="Descargas simultáneas (máximo %s)" % (Backfill.politeness_cap))
+    parser.add_argument("--output", default="backfill/publicaciones.jsonl" +
+                        (".gz", ".zst")[zstandard is not None])
+    args = parser.parse_args()
+
+    s = SIBOM("@BoletinMGP", "General Pueyrredón", r"general pueyrred.n",
+              "assets/Montserrat-Regular.ttf", "assets/logo.png")
+    backfill = Backfill(s, BackfillArchive(args.output), args.workers)
+
+    if args.bulletins == "all":
+        ids = backfill.GetAllBulletinIDs()
+    else:
+        ids = ParseRange(args.bulletins)
+    print("Archivando %s boletines en %s (%s ya completos)..." % (
+        len(ids), backfill.archive.path,
+        len(backfill.archive.done_bulletins.intersection(ids))))
+
+    summary = backfill.Run(ids)
+    s.Close()
+    s.http.Close()
+    print(json.dumps(summary))
+    exit(1 if summary["incomplete"] else 0)
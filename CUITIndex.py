@@ -0,0 +1,292 @@
+"""Índice de CUITs mencionados en las publicaciones.
+
+Uso:
+    python CUITIndex.py 30-71234567-1 [--db cuits.sqlite3]
+    python CUITIndex.py --import backfill/publicaciones.jsonl.gz
+    python CUITIndex.py --invalid
+"""
+import argparse
+import os
+import re
+import sqlite3
+import threading
+import time
+
+months = ("enero", "febrero", "marzo", "abril", "mayo", "junio", "julio",
+          "agosto", "septiembre", "octubre", "noviembre", "diciembre")
+date_regex = re.compile(r"(\d{1,2})\s*º?\s+de\s+([a-z]+)\s+de\s+(\d{4})", re.I)
+
+
+class CUITIndex:
+    """Índice invertido (SQLite) de CUIT normalizado --> publicaciones
+    que lo mencionan, con el boletín, el content ID y la fecha.
+
+    El dígito verificador se valida en bloque: las publicaciones se
+    insertan sin validar y después un solo UPDATE calcula el módulo 11
+    de todos los CUITs nuevos dentro de SQLite (ver Validate).
+
+    Atributos
+    ---------
+    weights : tuple
+        Pesos de los primeros 10 dígitos para el dígito verificador.
+    batch_size : int
+        Cantidad de publicaciones por transacción en AddRecords.
+    """
+    weights = (5, 4, 3, 2, 7, 6, 5, 4, 3, 2)
+    batch_size = 1000
+
+    def __init__(self, path: str) -> None:
+        """
+        Parámetros
+        ----------
+        path : str
+            Path al archivo SQLite. Se crea el directorio si no existe.
+        """
+        directory = os.path.dirname(path)
+        if directory and not os.path.exists(directory):
+            os.makedirs(directory)
+
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        # La validez depende sólo del número, así que la guardo una vez
+        # por CUIT; las menciones se buscan por el prefijo de la clave
+        self._db.executescript(
+            "CREATE TABLE IF NOT EXISTS cuits ("
+            "cuit TEXT PRIMARY KEY, valid INTEGER) WITHOUT ROWID;"
+            "CREATE TABLE IF NOT EXISTS mentions ("
+            "cuit TEXT NOT NULL, content_id INTEGER NOT NULL, "
+            "bulletin_id INTEGER NOT NULL, fecha TEXT, url TEXT NOT NULL, "
+            "indexed_at REAL, PRIMARY KEY (cuit, content_id)) WITHOUT ROWID;"
+            "CREATE INDEX IF NOT EXISTS mentions_content ON mentions (content_id);")
+        self._db.commit()
+        return
+
+    def Add(self, pub) -> None:
+        """Indexo los CUITs de una publicación, reemplazando los que
+        tuviera de antes. Las publicaciones vacías se ignoran.
+
+        Parámetros
+        ----------
+        pub : Publicacion
+            Publicación tal como la devuelve SIBOM.ParsePublicacion.
+        """
+        if pub.url == "":
+            return
+        self.AddRecords([{"url": pub.url, "ciudad_fecha": pub.ciudad_fecha,
+                          "cuits": pub.cuits}])
+        return
+
+    def AddRecords(self, records) -> int:
+        """Indexo los CUITs de varias publicaciones, validándolos en
+        bloque cada batch_size publicaciones, y devuelvo cuántas
+        publicaciones procesé.
+
+        Parámetros
+        ----------
+        records : iterable
+            Dicts con url, ciudad_fecha y cuits (como los extrae
+            SIBOM.cuit_regex), como los de BackfillArchive.
+        """
+        count = 0
+        batch = []
+        for record in records:
+            batch.append(record)
+            if len(batch) >= self.batch_size:
+                count += self._Insert(batch)
+                batch = []
+        return count + self._Insert(batch)
+
+    def _Insert(self, records: list) -> int:
+        """Inserto las menciones de un grupo de publicaciones y valido
+        los CUITs nuevos. Si una publicación aparece más de una vez,
+        vale la última.
+        """
+        now = time.time()
+        mentions = {}
+        for record in records:
+            url = record["url"]
+            content_id = self.GetContentID(url)
+            bulletin_id = self.GetBulletinID(url)
+            fecha = self.ParseFecha(record["ciudad_fecha"])
+            # Un mismo CUIT puede aparecer varias veces en el texto
+            mentions[content_id] = [
+                (cuit, content_id, bulletin_id, fecha, url, now)
+                for cuit in set(filter(None, map(self.NormalizeCUIT, record["cuits"])))]
+        rows = [row for group in mentions.values() for row in group]
+
+        with self._lock:
+            try:
+                self._db.executemany(
+                    "DELETE FROM mentions WHERE content_id = ?",
+                    [(content_id,) for content_id in mentions])
+                self._db.executemany(
+                    "INSERT INTO mentions VALUES (?, ?, ?, ?, ?, ?)", rows)
+                self._db.executemany(
+                    "INSERT OR IGNORE INTO cuits (cuit) VALUES (?)",
+                    [(row[0],) for row in rows])
+                self._Validate(False)
+                self._db.commit()
+            except sqlite3.Error:
+                # No dejo la transacción abierta con el grupo a medias
+                self._db.rollback()
+                raise
+        return len(records)
+
+    def Remove(self, url: str) -> None:
+        """Saco las menciones de una publicación, por ejemplo si SIBOM
+        la quitó del boletín.
+        """
+        with self._lock:
+            self._db.execute("DELETE FROM mentions WHERE content_id = ?",
+                             (self.GetContentID(url),))
+            self._db.commit()
+        return
+
+    def Validate(self, all: bool = False) -> int:
+        """Calculo el dígito verificador de los CUITs todavía sin validar
+        (o de todos, si all es True) y devuelvo cuántos validé.
+        """
+        with self._lock:
+            count = self._Validate(all)
+            self._db.commit()
+        return count
+
+    def _Validate(self, all: bool) -> int:
+        """Ídem Validate, sin tomar el lock ni hacer commit."""
+        # Módulo 11: 11 - (suma ponderada % 11), con 11 --> 0; si da 10
+        # el número no es válido
+        total = " + ".join("substr(cuit, %s, 1) * %s" % (i + 1, weight)
+                           for i, weight in enumerate(self.weights))
+        cursor = self._db.execute(
+            "UPDATE cuits SET valid = ((11 - (%s) %% 11) %% 11 "
+            "= CAST(substr(cuit, 11, 1) AS INTEGER)) %s" % (
+                total, ("WHERE valid IS NULL", "")[all]))
+        return cursor.rowcount
+
+    def Lookup(self, cuit: str) -> list:
+        """Devuelvo las publicaciones que mencionan un CUIT, de la más
+        vieja a la más nueva. Cada una es un dict con bulletin_id,
+        content_id, fecha (AAAA-MM-DD, o None si no la pude leer) y url.
+
+        Parámetros
+        ----------
+        cuit : str
+            CUIT en cualquiera de los formatos que acepta NormalizeCUIT.
+        """
+        cuit = self.NormalizeCUIT(cuit)
+        if cuit is None:
+            return []
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT bulletin_id, content_id, fecha, url FROM mentions "
+                "WHERE cuit = ? ORDER BY bulletin_id, content_id", (cuit,)).fetchall()
+        return [{"bulletin_id": bulletin_id, "content_id": content_id,
+                 "fecha": fecha, "url": url}
+                for bulletin_id, content_id, fecha, url in rows]
+
+    def IsValid(self, cuit: str) -> bool:
+        """Devuelvo True si el CUIT tiene un dígito verificador válido.
+        Para validar muchos a la vez conviene AddRecords.
+        """
+        cuit = self.NormalizeCUIT(cuit)
+        if cuit is None:
+            return False
+        check = (11 - sum(int(digit) * weight for digit, weight in
+                          zip(cuit, self.weights)) % 11) % 11
+        return check == int(cuit[10])
+
+    def GetInvalid(self) -> list:
+        """Devuelvo una lista de (CUIT, cantidad de menciones) con los
+        CUITs cuyo dígito verificador no es válido, probablemente por un
+        error de tipeo en la publicación.
+        """
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT cuits.cuit, COUNT(*) FROM cuits JOIN mentions "
+                "ON mentions.cuit = cuits.cuit WHERE valid = 0 "
+                "GROUP BY cuits.cuit ORDER BY cuits.cuit").fetchall()
+        return rows
+
+    def Close(self) -> None:
+        """Cierro la base de datos."""
+        with self._lock:
+            self._db.close()
+        return
+
+    @staticmethod
+    def NormalizeCUIT(text: str) -> str:
+        """Devuelvo el CUIT como 11 dígitos, o None si no lo es.
+
+        "20 - 12345678 - 9" --> "20123456789"
+        "20-1234567-8" --> "20012345678" (DNI de 7 dígitos)
+        """
+        parts = [part.strip() for part in text.split("-")]
+        if len(parts) == 3 and all(part.isdigit() for part in parts):
+            if len(parts[0]) == 2 and len(parts[2]) == 1 and len(parts[1]) <= 8:
+                return parts[0] + parts[1].zfill(8) + parts[2]
+            return None
+        digits = re.sub(r"\D", "", text)
+        return digits if len(digits) == 11 else None
+
+    @staticmethod
+    def FormatCUIT(cuit: str) -> str:
+        """"20012345678" --> "20-01234567-8\""""
+        return "%s-%s-%s" % (cuit[:2], cuit[2:10], cuit[10])
+
+    @staticmethod
+    def ParseFecha(ciudad_fecha: str) -> str:
+        """"General Pueyrredón, 14 de marzo de 2026" --> "2026-03-14"
+
+        Devuelvo None si no encuentro la fecha.
+        """
+        match = date_regex.search(ciudad_fecha)
+        if match is None or match.group(2).lower() not in months:
+            return None
+        day, month, year = match.groups()
+        return "%s-%02d-%02d" % (year, months.index(month.lower()) + 1, int(day))
+
+    @staticmethod
+    def GetContentID(url: str) -> int:
+        """"/bulletins/4047/contents/1477570" --> 1477570"""
+        return int(url.rstrip("/").split("contents/")[1])
+
+    @staticmethod
+    def GetBulletinID(url: str) -> int:
+        """"/bulletins/4047/contents/1477570" --> 4047"""
+        return int(re.search(r"(\d+)/contents/", url).group(1))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("cuit", nargs="?", help="CUIT a buscar")
+    parser.add_argument("--db", default="cuits.sqlite3")
+    parser.add_argument("--import", dest="archive",
+                        help="Indexar las publicaciones de un archivo de Backfill.py")
+    parser.add_argument("--invalid", action="store_true",
+                        help="Listar los CUITs con dígito verificador inválido")
+    args = parser.parse_args()
+
+    index = CUITIndex(args.db)
+
+    if args.archive:
+        from Backfill import BackfillArchive
+        count = index.AddRecords(BackfillArchive(args.archive, read_only=True).Read())
+        print("Indexé los CUITs de %s publicaciones." % (count))
+
+    if args.cuit:
+        start = time.perf_counter()
+        results = index.Lookup(args.cuit)
+        for result in results:
+            print("%s  %s" % (result["fecha"] or "?" * 10, result["url"]))
+        print("%s publicaciones en %.1f ms" % (
+            len(results), (time.perf_counter() - start) * 1000))
+        if results and not index.IsValid(args.cuit):
+            print("WARNING: El dígito verificador de %s no es válido" % (args.cuit))
+
+    if args.invalid:
+        for cuit, count in index.GetInvalid():
+            print("%s  %s menciones" % (index.FormatCUIT(cuit), count))
+
+    index.Close()
@@ -0,0 +1,395 @@
+"""Detecta cambios en boletines ya publicados.
+
+Uso:
+    python ChangeDetector.py [cantidad de boletines] [--db fingerprints.sqlite3]
+        [--output cambios.jsonl]
+
+Revisa los últimos boletines procesados con GETs condicionales y
+muestra qué campos cambiaron en cada publicación modificada.
+"""
+import argparse
+import difflib
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from CUITIndex import CUITIndex
+from SIBOM import SIBOM, content_strainer, links_strainer
+from SearchIndex import SearchIndex
+from bs4 import BeautifulSoup
+
+
+class ChangeDetector:
+    """Guarda una huella de cada página ya procesada (validadores HTTP,
+    hash del HTML y hash de los campos de la Publicacion) y la usa para
+    detectar páginas que SIBOM modificó después de publicarlas.
+
+    Cada pasada hace un GET condicional por página (la del boletín y las
+    de sus publicaciones). Si nada cambió, SIBOM responde 304 sin
+    cuerpo; si responde 200 pero el HTML es idéntico, tampoco parseo
+    nada. Sólo las páginas con otro contenido se vuelven a parsear, y se
+    informa la diferencia en los campos de la Publicacion (un cambio en
+    el HTML que no afecta a ningún campo no se informa).
+
+    Atributos
+    ---------
+    fields : tuple
+        Campos de Publicacion que se comparan.
+    max_workers : int
+        Cantidad de GETs condicionales simultáneos.
+    unchanged : int
+        Cantidad de páginas sin cambios en la última pasada.
+    failures : int
+        Cantidad de páginas que no se pudieron revisar en la última
+        pasada.
+    """
+    fields = ("titulo", "ciudad_fecha", "articulos", "anexos", "cuits", "tablas")
+    max_workers = 4
+    unchanged = 0
+    failures = 0
+
+    def __init__(self, sibom: SIBOM, path: str) -> None:
+        """
+        Parámetros
+        ----------
+        sibom : SIBOM
+            Instancia del municipio. Si su HTTPClient tiene cache, tomo
+            de ahí los validadores al registrar cada publicación.
+        path : str
+            Path al archivo SQLite. Se crea el directorio si no existe.
+        """
+        directory = os.path.dirname(path)
+        if directory and not os.path.exists(directory):
+            os.makedirs(directory)
+
+        self.sibom = sibom
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        # La página de cada boletín también tiene su fila, sin campos:
+        # sirve para detectar publicaciones agregadas o quitadas
+        self._db.executescript(
+            "CREATE TABLE IF NOT EXISTS pages ("
+            "url TEXT PRIMARY KEY, bulletin_id INTEGER NOT NULL, "
+            "etag TEXT, last_modified TEXT, body_hash TEXT, "
+            "fingerprint TEXT, fields TEXT, checked_at REAL, changed_at REAL, "
+            "position INTEGER);"
+            "CREATE INDEX IF NOT EXISTS pages_bulletin ON pages (bulletin_id);")
+        # Las bases creadas antes de guardar la posición no tienen la
+        # columna
+        columns = [row[1] for row in self._db.execute("PRAGMA table_info(pages)")]
+        if "position" not in columns:
+            self._db.execute("ALTER TABLE pages ADD COLUMN position INTEGER")
+        self._db.commit()
+        return
+
+    def Record(self, pub) -> None:
+        """Guardo la huella de una publicación recién parseada. Las
+        publicaciones vacías se ignoran.
+
+        Parámetros
+        ----------
+        pub : Publicacion
+            Publicación tal como la devuelve SIBOM.ParsePublicacion.
+        """
+        if pub.url == "":
+            return
+        entry = None
+        if self.sibom.http.cache is not None:
+            entry = self.sibom.http.cache.Lookup(pub.url)
+        if entry is None:
+            # Sin validadores, la primera pasada descarga la página
+            self._Store(pub.url, "", "", "", self.GetFields(pub))
+        else:
+            self._Store(pub.url, entry.etag, entry.last_modified,
+                        self.GetHash(entry.body), self.GetFields(pub))
+        return
+
+    def GetRecentBulletins(self, n: int) -> list:
+        """Devuelvo los IDs de los últimos n boletines registrados."""
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT DISTINCT bulletin_id FROM pages "
+                "ORDER BY bulletin_id DESC LIMIT ?", (n,)).fetchall()
+        return [row[0] for row in rows]
+
+    def Check(self, ids: list) -> list:
+        """Reviso los boletines indicados y devuelvo una lista con los
+        cambios encontrados. Cada cambio es un dict con bulletin_id,
+        url, kind ("modified", "added" o "removed") y diff (campo -->
+        diferencia, ver Diff).
+
+        Parámetros
+        ----------
+        ids : list
+            IDs de los boletines a revisar.
+        """
+        self.unchanged = 0
+        self.failures = 0
+        changes = []
+        with ThreadPoolExecutor(max_workers=max(self.max_workers, 1)) as pool:
+            for bulletin_id in ids:
+                changes.extend(self._CheckBulletin(bulletin_id, pool))
+        return changes
+
+    def _CheckBulletin(self, bulletin_id: int, pool: ThreadPoolExecutor) -> list:
+        """Reviso un boletín: primero la lista de publicaciones, después
+        cada publicación.
+        """
+        changes = []
+        recorded = self._GetContentURLs(bulletin_id)
+
+        # Publicaciones agregadas o quitadas del boletín
+        url = self.sibom.GetBulletinURL(bulletin_id)
+        text, validators = self._Fetch(url)
+        if text is not None:
+            parsed = BeautifulSoup(text, features=self.sibom.html_parser,
+                                   parse_only=links_strainer)
+            urls = list(self.sibom._ParseURLs(bulletin_id, parsed))
+            current = set(urls)
+            known = set(recorded)
+            for removed in [url for url in recorded if url not in current]:
+                changes.append(self._Change(bulletin_id, removed, "removed",
+                                            self._GetStored(removed), {}))
+                self._Delete(removed)
+                # Que no aparezca más en las búsquedas
+                if self.sibom.search_index is not None:
+                    self.sibom.search_index.Remove(removed)
+                if self.sibom.cuit_index is not None:
+                    self.sibom.cuit_index.Remove(removed)
+            for added in urls:
+                if added not in known:
+                    # Sólo hacen falta los campos: no dibujo las tablas
+                    pub = self.sibom._ParseContenido(
+                        added, self.sibom._GetContenido(added), render=False)
+                    if pub.url != "":
+                        self.Record(pub)
+                        changes.append(self._Change(bulletin_id, added, "added",
+                                                    {}, self.GetFields(pub)))
+            recorded = [url for url in urls if url in known]
+            self._StoreBulletin(url, *validators, self.GetHash(text))
+            self._SetPositions(urls)
+
+        # Publicaciones modificadas
+        for url, (text, validators) in zip(recorded, pool.map(self._Fetch, recorded)):
+            if text is None:
+                continue
+            before = self._GetStored(url)
+            pub = self.sibom._ParseContenido(
+                url, BeautifulSoup(text, features=self.sibom.html_parser,
+                                   parse_only=content_strainer), render=False)
+            after = self.GetFields(pub)
+            if after != before:
+                changes.append(self._Change(bulletin_id, url, "modified", before, after))
+            self._Store(url, *validators, self.GetHash(text), after)
+
+        return changes
+
+    def _Fetch(self, url: str) -> tuple:
+        """Hago un GET condicional con los validadores guardados y
+        devuelvo (texto, (etag, last_modified)). El texto es None si la
+        página no cambió (304, o 200 con el mismo HTML) o si no la pude
+        descargar.
+        """
+        with self._lock:
+            row = self._db.execute(
+                "SELECT etag, last_modified, body_hash FROM pages WHERE url = ?",
+                (url,)).fetchone()
+        etag, last_modified, body_hash = row or ("", "", "")
+        headers = {}
+        if etag:
+            headers["If-None-Match"] = etag
+        if last_modified:
+            headers["If-Modified-Since"] = last_modified
+
+        resp = self.sibom.http.Get(url, headers=headers)
+        if resp is None or resp.status_code not in (200, 304):
+            print("ERROR: No pude revisar %s" % (url))
+            # Corre en varios hilos a la vez (ver Check)
+            with self._lock:
+                self.failures += 1
+            return None, (etag, last_modified)
+
+        if resp.status_code == 200:
+            etag = resp.headers.get("ETag", "")
+            last_modified = resp.headers.get("Last-Modified", "")
+            # El contenido de un decreto puede cambiar después de todo:
+            # actualizo el cache, que lo toma como inmutable
+            if self.sibom.http.cache is not None:
+                self.sibom.http.cache.Store(url, resp.text, etag, last_modified)
+            if self.GetHash(resp.text) != body_hash:
+                return resp.text, (etag, last_modified)
+
+        with self._lock:
+            self.unchanged += 1
+            self._db.execute(
+                "UPDATE pages SET etag = ?, last_modified = ?, checked_at = ? "
+                "WHERE url = ?", (etag, last_modified, time.time(), url))
+            self._db.commit()
+        return None, (etag, last_modified)
+
+    def _StoreBulletin(self, url: str, etag: str, last_modified: str, body_hash: str) -> None:
+        """Guardo los validadores y el hash de la página de un boletín."""
+        now = time.time()
+        with self._lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO pages VALUES (?, ?, ?, ?, ?, '', '', ?, ?, NULL)",
+                (url, self.GetBulletinID(url), etag, last_modified, body_hash, now, now))
+            self._db.commit()
+        return
+
+    def _Store(self, url: str, etag: str, last_modified: str, body_hash: str, fields: dict) -> None:
+        """Guardo la huella de una publicación."""
+        now = time.time()
+        data = json.dumps(fields, ensure_ascii=False)
+        with self._lock:
+            row = self._db.execute(
+                "SELECT fingerprint, changed_at, position FROM pages WHERE url = ?",
+                (url,)).fetchone()
+            fingerprint = self.GetHash(data)
+            changed_at = row[1] if row is not None and row[0] == fingerprint else now
+            position = row[2] if row is not None else None
+            self._db.execute(
+                "INSERT OR REPLACE INTO pages VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (url, self.GetBulletinID(url), etag, last_modified, body_hash,
+                 fingerprint, data, now, changed_at, position))
+            self._db.commit()
+        return
+
+    def _GetStored(self, url: str) -> dict:
+        """Devuelvo los campos guardados de una publicación."""
+        with self._lock:
+            row = self._db.execute(
+                "SELECT fields FROM pages WHERE url = ?", (url,)).fetchone()
+        return json.loads(row[0]) if row is not None and row[0] else {}
+
+    def _SetPositions(self, urls: list) -> None:
+        """Guardo la posición de cada publicación en la página del
+        boletín.
+        """
+        with self._lock:
+            self._db.executemany(
+                "UPDATE pages SET position = ? WHERE url = ?",
+                [(i, url) for i, url in enumerate(urls)])
+            self._db.commit()
+        return
+
+    def _GetContentURLs(self, bulletin_id: int) -> list:
+        """Devuelvo las URLs registradas de las publicaciones de un
+        boletín, en el orden del boletín. Las que todavía no tienen
+        posición (no se revisó el boletín) van al final, por content ID.
+        """
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT url, position FROM pages WHERE bulletin_id = ? AND url LIKE "
+                "'%/contents/%'", (bulletin_id,)).fetchall()
+        rows.sort(key=lambda row: (row[1] is None, row[1] or 0, self.GetContentID(row[0])))
+        return [row[0] for row in rows]
+
+    def _Delete(self, url: str) -> None:
+        """Olvido una página."""
+        with self._lock:
+            self._db.execute("DELETE FROM pages WHERE url = ?", (url,))
+            self._db.commit()
+        return
+
+    def _Change(self, bulletin_id: int, url: str, kind: str, before: dict, after: dict) -> dict:
+        """Armo el registro de un cambio."""
+        return {"bulletin_id": bulletin_id, "url": url, "kind": kind,
+                "diff": self.Diff(before, after)}
+
+    def Diff(self, before: dict, after: dict) -> dict:
+        """Devuelvo campo --> diferencia para los campos distintos. En
+        los de texto, la diferencia es {"before": ..., "after": ...}; en
+        los de listas (articulos, anexos, etc.), las líneas de un diff
+        unificado.
+        """
+        diff = {}
+        for field in self.fields:
+            a = before.get(field)
+            b = after.get(field)
+            if a == b:
+                continue
+            if isinstance(a, list) or isinstance(b, list):
+                diff[field] = list(difflib.unified_diff(
+                    a or [], b or [], "antes", "después", lineterm="", n=0))
+            else:
+                diff[field] = {"before": a, "after": b}
+        return diff
+
+    def GetFields(self, pub) -> dict:
+        """Devuelvo los campos comparables de una publicación. De las
+        tablas guardo sólo un hash.
+        """
+        fields = {field: getattr(pub, field) for field in self.fields}
+        fields["tablas"] = [self.GetHash(str(tabla)) for tabla in pub.tablas]
+        return fields
+
+    def Close(self) -> None:
+        """Cierro la base de datos."""
+        with self._lock:
+            self._db.close()
+        return
+
+    @staticmethod
+    def GetHash(text: str) -> str:
+        """Devuelvo el SHA-256 de un texto, en hexadecimal."""
+        return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+    @staticmethod
+    def GetContentID(url: str) -> int:
+        """".../bulletins/4047/contents/1477570" --> 1477570"""
+        return int(url.rstrip("/").split("contents/")[1])
+
+    @staticmethod
+    def GetBulletinID(url: str) -> int:
+        """".../bulletins/4047/contents/1477570" o ".../bulletins/4047?"
+        --> 4047
+        """
+        return int(url.split("bulletins/")[1].split("/")[0].rstrip("?"))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("n", nargs="?", type=int, default=5,
+                        help="Cantidad de boletines a revisar")
+    parser.add_argument("--db", default="fingerprints.sqlite3")
+    parser.add_argument("--search-db", default="search.sqlite3")
+    parser.add_argument("--cuit-db", default="cuits.sqlite3")
+    parser.add_argument("--output", help="Agregar los cambios como líneas JSON a este archivo")
+    args = parser.parse_args()
+
+    s = SIBOM("@BoletinMGP", "General Pueyrredón", r"general pueyrred.n",
+              "assets/Montserrat-Regular.ttf", "assets/logo.png")
+    detector = ChangeDetector(s, args.db)
+    # Las publicaciones modificadas también se reindexan
+    s.search_index = SearchIndex(args.search_db)
+    s.cuit_index = CUITIndex(args.cuit_db)
+    ids = detector.GetRecentBulletins(args.n)
+    requests = s.http.GetStats().requests
+    changes = detector.Check(ids)
+
+    for change in changes:
+        print("%s %s" % (change["kind"].upper(), change["url"]))
+        for field, diff in change["diff"].items():
+            if isinstance(diff, dict):
+                print("  %s: %r --> %r" % (field, diff["before"], diff["after"]))
+            else:
+                print("  %s:\n    %s" % (field, "\n    ".join(diff)))
+    if args.output and changes:
+        with open(args.output, "at", encoding="utf-8") as fp:
+            for change in changes:
+                fp.write(json.dumps(change, ensure_ascii=False) + "\n")
+
+    print("%s boletines revisados, %s cambios, %s requests (%s páginas sin cambios)." % (
+        len(ids), len(changes), s.http.GetStats().requests - requests,
+        detector.unchanged))
+    detector.Close()
+    s.search_index.Close()
+    s.cuit_index.Close()
+    s.Close()
+    s.http.Close()
@@ -0,0 +1,100 @@
+import itertools
+import threading
+import time
+
+
+class FakeStatus:
+    """Imita los objetos que devuelve tweepy (Status y Media)."""
+    id = 0
+    media_id = 0
+    text = ""
+    in_reply_to_status_id = None
+    media_ids = []
+    created_at = 0
+
+
+class FakeTwitterAPI:
+    """Imitación local de tweepy.API, para correr el bot sin conexión.
+
+    Sólo implementa lo que usa el bot (media_upload y update_status) y
+    guarda todo lo "publicado" en memoria.
+
+    Atributos
+    ---------
+    statuses : list[<FakeStatus>]
+        Tweets publicados, en orden.
+    uploads : list[<int>]
+        Tamaño, en bytes, de cada imagen subida.
+    latency : float
+        Segundos que tarda cada llamada, para simular la red.
+    fail_on : set
+        Números de llamada a update_status (empezando en 1) que deben
+        fallar con una excepción.
+    upload_fail_on : set
+        Ídem fail_on, para las llamadas a media_upload.
+    """
+    latency = 0
+    fail_on = set()
+    upload_fail_on = set()
+
+    def __init__(self, latency: float = 0, fail_on: set = None,
+                 upload_fail_on: set = None) -> None:
+        """
+        Parámetros
+        ----------
+        latency : float
+            Ídem atributo.
+        fail_on : set
+            Ídem atributo.
+        upload_fail_on : set
+            Ídem atributo.
+        """
+        self.latency = latency
+        self.fail_on = set(fail_on or [])
+        self.upload_fail_on = set(upload_fail_on or [])
+        self.statuses = []
+        self.uploads = []
+        self._ids = itertools.count(1)
+        self._calls = 0
+        self._upload_calls = 0
+        self._lock = threading.Lock()
+        return
+
+    def media_upload(self, filename: str = None, file=None, **kwargs) -> FakeStatus:
+        """Simulo la subida de una imagen, desde un archivo o un objeto
+        con read().
+        """
+        time.sleep(self.latency)
+        # Igual que tweepy: si no me pasan el archivo abierto, lo leo
+        if file is not None:
+            size = len(file.read())
+        else:
+            with open(filename, "rb") as fp:
+                size = len(fp.read())
+
+        media = FakeStatus()
+        with self._lock:
+            self._upload_calls += 1
+            if self._upload_calls in self.upload_fail_on:
+                raise Exception("FakeTwitterAPI: falla simulada")
+            media.media_id = next(self._ids)
+            self.uploads.append(size)
+        return media
+
+    def update_status(self, status: str = "", in_reply_to_status_id=None,
+                      media_ids: list = None, **kwargs) -> FakeStatus:
+        """Simulo la publicación de un tweet."""
+        time.sleep(self.latency)
+        with self._lock:
+            self._calls += 1
+            if self._calls in self.fail_on:
+                raise Exception("FakeTwitterAPI: falla simulada")
+
+            tweet = FakeStatus()
+            tweet.id = next(self._ids)
+            tweet.text = status
+            tweet.in_reply_to_status_id = in_reply_to_status_id or None
+            tweet.media_ids = list(media_ids or [])
+            tweet.created_at = time.time()
+            self.statuses.append(tweet)
+        return tweet
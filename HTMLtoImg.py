@@ -1,4 +1,8 @@
+import bisect
+import hashlib
 import io
+import itertools
+import json
 import re
 import textwrap
 import math
@@ -6,8 +10,224 @@ import time
 import glob
 import sys
 import os
+import threading
 from PIL import Image, ImageDraw, ImageFont
-from bs4 import BeautifulSoup
+from bs4 import BeautifulSoup, Tag
+from Metrics import metrics
+
+# lxml es bastante más rápido que html.parser, pero es opcional
+try:
+    import lxml  # noqa: F401
+    default_parser = "lxml"
+except ImportError:
+    default_parser = "html.parser"
+
+
+class FontResource:
+    """Una fuente ya cargada, junto con las métricas que se precalculan
+    una sola vez.
+
+    Atributos
+    ---------
+    font : ImageFont
+        Fuente TrueType cargada.
+    median_char_width : int
+        Ancho de "b", que representa el valor mediano de los
+        caracteres.
+    line_spacing : int
+        Distancia entre líneas, igual a la que usa PIL para el texto
+        multilínea.
+    advances : dict
+        Ancho, en píxeles, de cada caracter. Se va llenando a medida
+        que aparecen caracteres nuevos.
+    """
+    font = None
+    median_char_width = 1
+    line_spacing = 0
+    advances = {}
+    # Separación adicional entre líneas que usa PIL por defecto
+    spacing = 4
+
+    def Advance(self, char: str) -> int:
+        """Devuelvo el ancho de un caracter, midiéndolo sólo la primera
+        vez.
+        """
+        width = self.advances.get(char)
+        if width is None:
+            width = self.font.getsize(char)[0]
+            self.advances[char] = width
+        return width
+
+    def Measure(self, text: str) -> tuple:
+        """Devuelvo (ancho de la línea más larga sin cortar, ancho de la
+        palabra más larga), en píxeles. Son el ancho preferido y el
+        mínimo de una celda con ese texto.
+
+        Parámetros
+        ----------
+        text : str
+            Texto a medir. Los saltos de línea existentes se respetan.
+        """
+        space_width = self.Advance(" ")
+        widest_line = 0
+        widest_word = 0
+
+        for paragraph in text.split("\n"):
+            line_width = 0
+            words = 0
+            for word in paragraph.split(" "):
+                if len(word) == 0:
+                    continue
+                word_width = 0
+                for char in word:
+                    word_width += self.Advance(char)
+                widest_word = max(widest_word, word_width)
+                line_width += word_width + (0, space_width)[words > 0]
+                words += 1
+            widest_line = max(widest_line, line_width)
+
+        return widest_line, widest_word
+
+    def Wrap(self, text: str, width: int) -> tuple:
+        """Corto el texto según el ancho acumulado de sus caracteres,
+        en una sola pasada. Devuelvo (texto con los saltos de línea,
+        alto resultante en píxeles).
+
+        Parámetros
+        ----------
+        text : str
+            Texto a cortar. Los saltos de línea existentes se respetan.
+        width : int
+            Ancho máximo, en píxeles, de cada línea.
+        """
+        space_width = self.Advance(" ")
+        lines = []
+
+        for paragraph in text.split("\n"):
+            line = []
+            line_width = 0
+            for word in paragraph.split(" "):
+                if len(word) == 0:
+                    continue
+                word_width = 0
+                for char in word:
+                    word_width += self.Advance(char)
+
+                if len(line) > 0 and line_width + space_width + word_width <= width:
+                    line.append(word)
+                    line_width += space_width + word_width
+                    continue
+                if len(line) > 0:
+                    lines.append(" ".join(line))
+                if word_width <= width:
+                    line = [word]
+                    line_width = word_width
+                    continue
+
+                # La palabra sola no entra: la corto donde haga falta
+                piece = ""
+                line_width = 0
+                for char in word:
+                    char_width = self.Advance(char)
+                    if len(piece) > 0 and line_width + char_width > width:
+                        lines.append(piece)
+                        piece = ""
+                        line_width = 0
+                    piece += char
+                    line_width += char_width
+                line = [piece]
+            lines.append(" ".join(line))
+
+        height = len(lines) * self.line_spacing - self.spacing
+        return "\n".join(lines), height
+
+
+class ResourceCache:
+    """Cache de fuentes y logos compartido por todo el proceso.
+
+    Cada recurso se guarda junto con la fecha de modificación y el
+    tamaño del archivo: si alguno cambia, lo vuelvo a cargar.
+    """
+
+    def __init__(self) -> None:
+        self._fonts = {}
+        self._logos = {}
+        self._lock = threading.Lock()
+        return
+
+    def GetFont(self, font_name: str, size: int) -> FontResource:
+        """Devuelvo la fuente font_name en tamaño size.
+
+        Parámetros
+        ----------
+        font_name : str
+            Path hacia la fuente TrueType.
+        size : int
+            Tamaño de la fuente.
+        """
+        signature = self._Signature(font_name)
+        key = (font_name, size)
+
+        with self._lock:
+            cached = self._fonts.get(key)
+            if cached is not None and cached[0] == signature:
+                return cached[1]
+
+        res = FontResource()
+        res.font = ImageFont.truetype(font_name, size)
+        res.median_char_width = res.font.getsize("b")[0]
+        res.line_spacing = res.font.getsize("A")[1] + res.spacing
+        res.advances = {}
+
+        with self._lock:
+            self._fonts[key] = (signature, res)
+
+        return res
+
+    def GetLogo(self, path: str) -> Image.Image:
+        """Devuelvo el logo ya decodificado, o None si no existe.
+
+        Parámetros
+        ----------
+        path : str
+            Path hacia el logo.
+        """
+        if not os.path.exists(path):
+            return None
+        signature = self._Signature(path)
+
+        with self._lock:
+            cached = self._logos.get(path)
+            if cached is not None and cached[0] == signature:
+                return cached[1]
+
+        with Image.open(path) as fp:
+            logo = fp.copy()
+
+        with self._lock:
+            self._logos[path] = (signature, logo)
+
+        return logo
+
+    def Clear(self) -> None:
+        """Descarto todo lo cargado."""
+        with self._lock:
+            self._fonts = {}
+            self._logos = {}
+        return
+
+    def _Signature(self, path: str) -> tuple:
+        """Devuelvo (fecha de modificación, tamaño) del archivo, o None
+        si no existe (en cuyo caso PIL se encarga de avisar).
+        """
+        try:
+            st = os.stat(path)
+        except OSError:
+            return None
+        return (st.st_mtime_ns, st.st_size)
+
+
+resources = ResourceCache()
 
 
 class Cell:
@@ -29,7 +249,8 @@ class Cell:
     row : int
         Número de fila a la que pertenece la celda.
     col : int
-        Número de columna a la que pertenece la celda.
+        Número de columna donde empieza la celda, teniendo en cuenta
+        las celdas de filas anteriores que la ocupan con rowspan.
     """
     colspan = 1
     content = ""
@@ -47,6 +268,8 @@ class TableToIMG():
     ---------
     font : ImageFont
         Fuente a utilizar.
+    font_res : FontResource
+        La fuente junto con sus métricas precalculadas.
     caption : str
         Título de la tabla. Puede setearse manualmente, o utilizar el 
         que se encuentre en el HTML (este último tiene precedencia).
@@ -73,7 +296,9 @@ class TableToIMG():
         tener que compilarlo con cada ciclo.
     width_re : re
         Objeto de expresión regular utilizado para obtener el ancho de
-        una celda a partir del HTML. Ídem spaces_re.
+        una celda a partir del atributo style. Ídem spaces_re.
+    size_re : re
+        Ídem, para separar un tamaño de CSS en valor y unidad.
     total_col_count : int
         Cantidad total de columnas de la tabla. Se setea
         automáticamente.
@@ -83,6 +308,10 @@ class TableToIMG():
         Lista con las alturas de cada fila. Se setea automáticamente.
     col_widths : list[<int>]
         Ídem, con los anchos de cada columna.
+    row_offsets, col_offsets : list[<int>]
+        Sumas acumuladas de row_heights y col_widths: la fila i empieza
+        row_offsets[i] píxeles debajo del comienzo de la tabla, y
+        termina en row_offsets[i + 1]. Se setean automáticamente.
     cells : list[<Cell>]
         Lista de celdas.
     caption_box_height : int
@@ -105,14 +334,46 @@ class TableToIMG():
         texto y de fondo de la primera fila, respectivamente.
     img_format : str
         Formato del archivo de salida. Tiene que ser soportado por PIL.
+        Sólo se usa con encoding = "png".
+    encoding : str
+        Perfil de codificación (ver encoding_profiles), o "budget" para
+        usar el primero de budget_profiles cuyo resultado no supere
+        max_bytes.
+    max_bytes : int
+        Tamaño máximo de la imagen en el modo "budget". Por defecto, el
+        límite de Twitter para imágenes.
     draw_footer : bool
         Controla si dibujar o no el footer.
     footer_line_n : str
         Línea n del footer. La línea 2 utiliza el mismo tamaño de fuente
         que el resto de la tabla, mientras que 1 y 3 son un poco más
         pequeñas.
+    html_parser : str
+        Parser que utiliza BeautifulSoup cuando GetImage recibe HTML
+        como texto ("lxml" si está instalado, si no "html.parser").
+    glyph_wrap : bool
+        Si es True, corto el texto de las celdas según el ancho real de
+        cada caracter (ver FontResource.Wrap). Si es False, estimo la
+        cantidad de caracteres por línea con median_char_width.
+    render_cache : RenderCache
+        Cache de imágenes ya generadas. Si es None, siempre dibujo.
+    paginate : bool
+        Si es True, GetImages e IterPages dividen las tablas que no
+        entran en la imagen en varias páginas, repitiendo las filas de
+        encabezado (th) y numerando el título. Si es False, la imagen
+        crece hasta que entren todas las filas.
+    page_rows : int
+        Cantidad máxima de filas (sin contar el encabezado) por página.
+        Con 0 no hay límite.
+    page_height : int
+        Alto máximo, en píxeles, de la tabla en cada página. Con 0 uso
+        el área reservada para la tabla (table_height).
+    timings : dict
+        Segundos que tardó cada etapa (parse, layout, draw, encode) del
+        último dibujo. No se actualiza si la imagen sale del cache.
     """    
     font = None
+    font_res = None
     caption = ""
     d = None
     img = None
@@ -121,11 +382,14 @@ class TableToIMG():
     font_size = 24
     median_char_width = 1
     spaces_re = re.compile(r"(^\n)|(\n {2,})|(\n*$)|( {2,})", re.M)
-    width_re = re.compile(r"width:(.*);?", flags=re.I)
+    width_re = re.compile(r"(?:^|;)\s*width\s*:\s*([^;]+)", flags=re.I)
+    size_re = re.compile(r"^([\d.]+)\s*([a-z%]*)$", flags=re.I)
     total_col_count = 0
     total_row_count = 0
     row_heights = []
     col_widths = []
+    row_offsets = [0]
+    col_offsets = [0]
     cells = []
     caption_box_height = 100
     table_width = 1800
@@ -138,36 +402,198 @@ class TableToIMG():
     fg_color = (211, 211, 211)
     hd_color = (83, 149, 204)  # Azul
     img_format = "PNG"
+    encoding = "png"
+    max_bytes = 5 * 1024 * 1024
+    # Parámetros de PIL para cada perfil. "colors" indica que primero
+    # reduzco la imagen a una paleta: las tablas tienen sólo tres
+    # colores más el antialiasing. compress_type 3 es la estrategia
+    # Z_RLE de zlib, que con estas imágenes es mucho más rápida.
+    encoding_profiles = {
+        "png": {},
+        "png-rle": {"format": "PNG", "compress_level": 6, "compress_type": 3},
+        "png-palette": {"format": "PNG", "colors": 32, "compress_level": 6,
+                        "compress_type": 3},
+        "webp-lossless": {"format": "WEBP", "lossless": True, "quality": 50,
+                          "method": 4}
+    }
+    # En el modo "budget" pruebo los perfiles en este orden (de menor a
+    # mayor tiempo de codificación)
+    budget_profiles = ("png-palette", "png-rle", "webp-lossless")
     draw_footer = True
     footer_line_1 = ""
     footer_line_2 = ""
     footer_line_3 = ""
+    html_parser = default_parser
+    glyph_wrap = True
+    render_cache = None
+    paginate = False
+    page_rows = 0
+    page_height = 0
+    timings = {}
+    # Atributos que definen cómo se ve la imagen (ver GetStyle)
+    style_attrs = ("font_name", "logo", "font_size", "caption",
+                   "caption_box_height", "footer_box_height", "draw_borders",
+                   "bg_color", "fg_color", "hd_color", "img_format",
+                   "encoding", "max_bytes",
+                   "draw_footer", "footer_line_1", "footer_line_2",
+                   "footer_line_3", "html_parser", "glyph_wrap",
+                   "paginate", "page_rows", "page_height")
+
+    def GetStyle(self) -> dict:
+        """Devuelvo un dict con los atributos de estilo del objeto,
+        para poder recrearlo en otro proceso con SetStyle.
+        """
+        return {attr: getattr(self, attr) for attr in self.style_attrs}
+
+    def SetStyle(self, style: dict) -> None:
+        """Aplico los atributos de estilo devueltos por GetStyle.
 
+        Parámetros
+        ----------
+        style : dict
+            Atributos a aplicar. Las claves desconocidas se ignoran.
+        """
+        for attr in self.style_attrs:
+            if attr in style:
+                setattr(self, attr, style[attr])
+        return
 
-    def GetImage(self, raw_html: str, img_width: int, img_height: int) -> bytes:
+    def GetImage(self, raw_html, img_width: int, img_height: int) -> bytes:
         """Devuelvo los bytes de una imagen generada a partir de una
         tabla HTML.
 
         Parámetros
         ----------
-        raw_html
-            Tabla HTML a parsear
+        raw_html : str | Tag
+            Tabla HTML a parsear, o el tag de BeautifulSoup ya parseado
+            (así no hace falta serializarla y volver a parsearla).
         img_width
             Ancho de la imagen final
         img_height
             Altura mínima de la imagen final. Se modifica
             automáticamente si no llegasen a entrar todas las filas.
         """
+        if self.render_cache is None:
+            return self._Render(raw_html, img_width, img_height)
 
-        self._ResetObj()
-        self.img_height = img_height
-        self.img_width = img_width
-        self.table_height = img_height - self.caption_box_height - (0, self.footer_box_height)[self.draw_footer]
-        self.table_width = img_width - 100
-        self._CreateFontObj()
+        key = self.GetRenderKey(raw_html, img_width, img_height)
+        data = self.render_cache.Get(key)
+        if data is None:
+            data = self._Render(raw_html, img_width, img_height)
+            self.render_cache.Put(key, data)
 
-        self._ParseHTML(raw_html)
-        
+        return data
+
+    def GetImages(self, raw_html, img_width: int, img_height: int) -> list:
+        """Devuelvo una lista con los bytes de las imágenes de una
+        tabla: una sola si paginate es False, o una por página.
+
+        Parámetros
+        ----------
+        Ídem GetImage.
+        """
+        return list(self.IterPages(raw_html, img_width, img_height))
+
+    def IterPages(self, raw_html, img_width: int, img_height: int):
+        """Ídem GetImages, pero devuelvo un generador: cada página se
+        dibuja y codifica recién cuando se pide, así nunca hay más de
+        una en memoria sin comprimir.
+
+        Parámetros
+        ----------
+        Ídem GetImage.
+        """
+        if not self.paginate:
+            yield self.GetImage(raw_html, img_width, img_height)
+            return
+
+        key = None
+        if self.render_cache is not None:
+            key = self.GetRenderKey(raw_html, img_width, img_height)
+            pages = self.GetCachedImages(key)
+            if pages is not None:
+                yield from pages
+                return
+
+        pages = []
+        for data in self._RenderPages(raw_html, img_width, img_height):
+            pages.append(data)
+            yield data
+
+        if key is not None:
+            self.PutCachedImages(key, pages)
+        return
+
+    def GetCachedImages(self, key: str) -> list:
+        """Devuelvo las imágenes de una tabla guardadas en render_cache,
+        o None si falta alguna.
+
+        Con paginate, guardo cada página como "<key>/<n>" y la cantidad
+        de páginas en "<key>/pages".
+
+        Parámetros
+        ----------
+        key : str
+            Clave devuelta por GetRenderKey.
+        """
+        if not self.paginate:
+            data = self.render_cache.Get(key)
+            return [data] if data is not None else None
+
+        count = self.render_cache.Get(key + "/pages")
+        if count is None:
+            return None
+        pages = []
+        for i in range(0, int(count)):
+            data = self.render_cache.Get("%s/%s" % (key, i))
+            if data is None:
+                return None
+            pages.append(data)
+        return pages
+
+    def PutCachedImages(self, key: str, images: list) -> None:
+        """Guardo en render_cache las imágenes de una tabla (ver
+        GetCachedImages).
+
+        Parámetros
+        ----------
+        key : str
+            Clave devuelta por GetRenderKey.
+        images : list
+            Imágenes de la tabla, tal como las devuelve GetImages.
+        """
+        if not self.paginate:
+            self.render_cache.Put(key, images[0])
+            return
+
+        for i, data in enumerate(images):
+            self.render_cache.Put("%s/%s" % (key, i), data)
+        # La cantidad va al final: si está, están todas las páginas
+        self.render_cache.Put(key + "/pages", str(len(images)).encode())
+        return
+
+    def GetRenderKey(self, raw_html, img_width: int, img_height: int) -> str:
+        """Devuelvo un hash que identifica a la imagen que generaría
+        GetImage: el HTML de la tabla, las dimensiones, los atributos de
+        estilo, y la versión de los archivos de fuente y logo.
+
+        Parámetros
+        ----------
+        Ídem GetImage.
+        """
+        key = [str(raw_html), img_width, img_height, self.GetStyle(),
+               resources._Signature(self.font_name),
+               resources._Signature(self.logo)]
+        encoded = json.dumps(key, sort_keys=True, ensure_ascii=False)
+        return hashlib.sha256(encoded.encode("utf-8")).hexdigest()
+
+    def _Render(self, raw_html, img_width: int, img_height: int) -> bytes:
+        """Parseo la tabla, la dibujo y codifico la imagen. Ídem
+        GetImage, pero sin pasar por render_cache.
+        """
+        self._Prepare(raw_html, img_width, img_height)
+
+        start = time.perf_counter()
         self.img = Image.new(
             "RGB", (self.img_width, self.img_height), self.bg_color)
         self.d = ImageDraw.Draw(self.img)
@@ -176,25 +602,219 @@ class TableToIMG():
         self._DrawCells()
         if self.draw_footer:
             self._DrawFooter()
+        start = self._Lap("draw", start, pixels=self.img_width * self.img_height)
+
+        data = self._Encode(self.img)
+        self._Lap("encode", start, bytes=len(data))
+
+        return data
+
+    def _RenderPages(self, raw_html, img_width: int, img_height: int):
+        """Ídem _Render, pero divido la tabla en páginas (ver
+        _Paginate) y devuelvo un generador con los bytes de cada una.
+        Cada página se codifica y se libera antes de dibujar la
+        siguiente.
+        """
+        self._Prepare(raw_html, img_width, img_height)
+
+        limit = self.page_height or (img_height - self.caption_box_height - (
+            0, self.footer_box_height)[self.draw_footer])
+        pages, header_rows = self._Paginate(limit)
+        header_height = self.row_offsets[header_rows]
+
+        # Las celdas están ordenadas por fila
+        cell_rows = [cell.row for cell in self.cells]
+        header_cells = self.cells[:bisect.bisect_left(cell_rows, header_rows)]
+        caption = self.caption
+
+        try:
+            for n, (first, last) in enumerate(pages):
+                if len(pages) > 1:
+                    self.caption = "%s (%s/%s)" % (caption, n + 1, len(pages))
+                body = self.cells[bisect.bisect_left(cell_rows, first):
+                                  bisect.bisect_left(cell_rows, last)]
+                page_height = header_height + self.row_offsets[last] - self.row_offsets[first]
+                self.table_height = page_height
+                self.img_height = max(img_height, self.caption_box_height + page_height + (
+                    50, self.footer_box_height)[self.draw_footer])
+
+                start = time.perf_counter()
+                self.img = Image.new(
+                    "RGB", (self.img_width, self.img_height), self.bg_color)
+                self.d = ImageDraw.Draw(self.img)
+
+                self._DrawHeader()
+                self._DrawCells(header_cells)
+                # Subo las filas de la página hasta debajo del encabezado
+                self._DrawCells(body, self.row_offsets[first] - header_height)
+                if self.draw_footer:
+                    self._DrawFooter()
+                start = self._Lap("draw", start, pixels=self.img_width * self.img_height)
+
+                data = self._Encode(self.img)
+                self._Lap("encode", start, bytes=len(data))
+                self.img = None
+                self.d = None
+                yield data
+        finally:
+            self.caption = caption
+        return
+
+    def _Prepare(self, raw_html, img_width: int, img_height: int) -> None:
+        """Parseo la tabla y calculo sus dimensiones. Es la parte común
+        de _Render y _RenderPages.
+        """
+        self._ResetObj()
+        self.img_height = img_height
+        self.img_width = img_width
+        self.table_height = img_height - self.caption_box_height - (0, self.footer_box_height)[self.draw_footer]
+        self.table_width = img_width - 100
+        self._CreateFontObj()
+        self.timings = {}
+
+        start = time.perf_counter()
+        self._ParseHTML(raw_html)
+        start = self._Lap("parse", start, cells=len(self.cells))
+        self._LayoutCells()
+        self._Lap("layout", start, cells=len(self.cells))
+        return
+
+    def _Paginate(self, limit: int) -> tuple:
+        """Divido las filas de la tabla en páginas de a lo sumo
+        page_rows filas y limit píxeles de alto, sin cortar celdas con
+        rowspan. Devuelvo (lista de (primera fila, última fila + 1),
+        cantidad de filas de encabezado).
+
+        Las filas de encabezado son las primeras filas formadas sólo por
+        celdas th. Se repiten en cada página, salvo que ocupen más de la
+        mitad de limit.
+
+        Parámetros
+        ----------
+        limit : int
+            Alto máximo, en píxeles, de la tabla en cada página.
+        """
+        rows = self.total_row_count
+
+        # blocked[i] > 0 si alguna celda de arriba ocupa también la
+        # fila i, y entonces no puedo empezar una página ahí
+        blocked = [0] * (rows + 1)
+        header = {}
+        for cell in self.cells:
+            if cell.rowspan > 1:
+                blocked[cell.row + 1] += 1
+                blocked[cell.row + cell.rowspan] -= 1
+            header[cell.row] = header.get(cell.row, True) and cell.is_header
+        blocked = list(itertools.accumulate(blocked))
+
+        header_rows = 0
+        while header_rows < rows and header.get(header_rows, False):
+            header_rows += 1
+        while header_rows > 0 and blocked[header_rows]:
+            header_rows -= 1
+        if header_rows == rows or self.row_offsets[header_rows] > limit / 2:
+            header_rows = 0
+        body_limit = limit - self.row_offsets[header_rows]
+
+        pages = []
+        first = header_rows
+        while first < rows:
+            last = first + 1
+            while last < rows and (self.page_rows <= 0 or last - first < self.page_rows) \
+                    and self.row_offsets[last + 1] - self.row_offsets[first] <= body_limit:
+                last += 1
+
+            if last < rows and blocked[last]:
+                # Retrocedo hasta una fila libre y, si no hay ninguna,
+                # alargo la página hasta terminar la celda
+                back = last
+                while back > first + 1 and blocked[back]:
+                    back -= 1
+                if not blocked[back]:
+                    last = back
+                else:
+                    while last < rows and blocked[last]:
+                        last += 1
+
+            pages.append((first, last))
+            first = last
+
+        if len(pages) == 0:
+            # Tabla vacía, o formada sólo por el encabezado
+            pages.append((header_rows, rows))
+
+        return pages, header_rows
+
+    def _Lap(self, stage: str, start: float, **fields) -> float:
+        """Guardo en self.timings el tiempo transcurrido desde start y
+        devuelvo el momento actual, para medir la etapa siguiente.
+        También lo registro en metrics como "table_<etapa>", con los
+        datos de fields.
+        """
+        now = time.perf_counter()
+        self.timings[stage] = now - start
+        metrics.Record("table_" + stage, now - start, **fields)
+        return now
+
+    def _Encode(self, img: Image.Image) -> bytes:
+        """Codifico la imagen según self.encoding.
+
+        Parámetros
+        ----------
+        img : Image
+            Imagen a codificar.
+        """
+        if self.encoding != "budget":
+            return self._EncodeProfile(img, self.encoding)
+
+        smallest = None
+        for profile in self.budget_profiles:
+            data = self._EncodeProfile(img, profile)
+            if len(data) <= self.max_bytes:
+                return data
+            if smallest is None or len(data) < len(smallest):
+                smallest = data
+
+        print("WARNING: Ningún perfil entra en %s bytes" % (self.max_bytes),
+              file=sys.stderr)
+        return smallest
+
+    def _EncodeProfile(self, img: Image.Image, profile: str) -> bytes:
+        """Codifico la imagen con uno de los perfiles de
+        encoding_profiles.
+
+        Parámetros
+        ----------
+        img : Image
+            Imagen a codificar.
+        profile : str
+            Nombre del perfil.
+        """
+        params = dict(self.encoding_profiles[profile])
+        img_format = params.pop("format", self.img_format)
+        colors = params.pop("colors", 0)
+        if colors > 0:
+            img = img.quantize(colors=colors, method=Image.FASTOCTREE,
+                               dither=Image.NONE)
 
         imgByteArr = io.BytesIO()
-        self.img.save(imgByteArr, self.img_format)
+        img.save(imgByteArr, img_format, **params)
 
         return imgByteArr.getvalue()
     
     def _DrawFooter(self) -> None:
         """Dibujo el footer de la imagen.
         """
-        font_1 = ImageFont.truetype(self.font_name, self.font_size + 10)
-        font_2 = ImageFont.truetype(self.font_name, self.font_size)
+        font_1 = resources.GetFont(self.font_name, self.font_size + 10).font
+        font_2 = resources.GetFont(self.font_name, self.font_size).font
         x0 = 50
         y0 = self.img_height - self.footer_box_height + 50
         x1 = x0 + 100
         y1 = y0 + 100
 
         # Dibujo el logo
-        if os.path.exists(self.logo):
-            logo = Image.open(self.logo)
+        logo = resources.GetLogo(self.logo)
+        if logo is not None:
             self.img.paste(self.fg_color, (x0, y0, x1, y1), logo)
         else:
             print("WARNING: No existe el archivo '%s'" % (self.logo))
@@ -216,7 +836,7 @@ class TableToIMG():
         return
 
     def _DrawHeader(self) -> None:
-        header_font = ImageFont.truetype(self.font_name, self.font_size + 10)
+        header_font = resources.GetFont(self.font_name, self.font_size + 10).font
         header_text_dimensions = header_font.getsize_multiline(self.caption.upper())
 
         if header_text_dimensions[1] > self.caption_box_height:
@@ -237,35 +857,42 @@ class TableToIMG():
         self.total_row_count = 0
         self.row_heights = []
         self.col_widths = []
+        self.row_offsets = [0]
+        self.col_offsets = [0]
         self.cells = []
         return
 
     def _CreateFontObj(self) -> None:
-        """Creo el objeto de fuente según los atributos del objeto, y
-        calculo la media de ancho de los caracteres.
+        """Obtengo el objeto de fuente según los atributos del objeto, y
+        la media de ancho de los caracteres. Ambos se cargan una sola vez
+        por proceso (ver ResourceCache).
         """
-        # Creo la fuente
-        self.font = ImageFont.truetype(self.font_name, self.font_size)
-        # "b" representa el valor mediano de los caracteres
-        self.median_char_width = self.font.getsize("b")[0]
+        res = resources.GetFont(self.font_name, self.font_size)
+        self.font_res = res
+        self.font = res.font
+        self.median_char_width = res.median_char_width
         return
 
-    def _ParseHTML(self, raw_html: str) -> None:
-        """Parseo HTML y vuelco el resultado en self.cells.
+    def _ParseHTML(self, raw_html) -> None:
+        """Parseo HTML y vuelco el resultado en self.cells (ver
+        _LayoutCells para las dimensiones).
+
+        Ubico cada celda en la grilla en una sola pasada: llevo, para
+        cada columna, cuántas filas más queda ocupada por una celda con
+        rowspan, y salteo esas columnas al ubicar las celdas siguientes.
 
         Parámetros
         ----------
-        raw_html : str
-            Tabla HTML a parsear.
+        raw_html : str | Tag
+            Tabla HTML a parsear, o el tag ya parseado.
         """
         # Cuento cantidad de columnas, filas
         # Lleno el objeto Cell
-        # Agrego valores a row_heights, col_widths
         # Determino si es header
-        # Ajusto los anchos proporcionalmente
-        # Si el alto total de la tabla es demasiado, ajusto la dimensión
-        # de la imagen
-        parsed_html = BeautifulSoup(raw_html, features="html.parser")
+        if isinstance(raw_html, Tag):
+            parsed_html = raw_html
+        else:
+            parsed_html = BeautifulSoup(raw_html, features=self.html_parser)
         rows = parsed_html.find_all("tr")
         self.total_row_count = len(rows)
 
@@ -273,126 +900,220 @@ class TableToIMG():
         if caption_obj is not None:
             self.caption = caption_obj.text
 
-        i = 0
-        j = 0
-        last_i = 0
-        for row in rows:
-            self.row_heights.append(0)
-            cells = row.find_all(["td", "th"])
-
-            for cell in cells:
-                if i != last_i:
-                    # Cambiamos de fila
-                    self.total_col_count = max(self.total_col_count, j)
-                    j = 0
+        # Filas que todavía ocupa, en cada columna, una celda de arriba
+        occupied = []
+        for i, row in enumerate(rows):
+            j = 0
+            for cell in row.find_all(["td", "th"]):
+                while j < len(occupied) and occupied[j] > 0:
+                    j += 1
 
                 cell_obj = Cell()
-
-                if "colspan" in cell.attrs:
-                    cell_obj.colspan = int(cell.attrs["colspan"])
-                if "rowspan" in cell.attrs:
-                    cell_obj.rowspan = int(cell.attrs["rowspan"])
+                cell_obj.colspan = max(self._GetSpan(cell.attrs.get("colspan"), 1000), 1)
+                # rowspan="0" ocupa hasta la última fila
+                rowspan = self._GetSpan(cell.attrs.get("rowspan"), 65534)
+                cell_obj.rowspan = min(rowspan or self.total_row_count,
+                                       self.total_row_count - i)
                 if "width" in cell.attrs:
-                    cell.width = cell.attrs["width"]
+                    cell_obj.css_width = cell.attrs["width"]
                 if "style" in cell.attrs:
-                    if cell.attrs["style"].find("width") != -1:
-                        cell.width = self.width_re.findall(
-                            cell.attrs["style"])[0]
+                    width = self.width_re.search(cell.attrs["style"])
+                    if width is not None:
+                        cell_obj.css_width = width.group(1)
 
-                cell_obj.content = cell.text
+                cell_obj.content = self._CleanField(cell.text)
                 cell_obj.is_header = (cell.name == "th")
                 cell_obj.row = i
                 cell_obj.col = j
 
+                end = j + cell_obj.colspan
+                if end > len(occupied):
+                    occupied.extend([0] * (end - len(occupied)))
+                for col in range(j, end):
+                    occupied[col] = cell_obj.rowspan
+
                 self.cells.append(cell_obj)
+                j = end
 
-                j += 1
-                last_i = i
-            i += 1
-        
-        # Por si solo tenemos una fila
-        if j > self.total_col_count:
-            self.total_col_count = j
-        
-        # Inicializo las listas
-        self.col_widths = [0] * self.total_col_count
-        self.row_heights = [0] * self.total_row_count
-        
-        # Calculo las dimensiones de las celdas
-        last_i = 0
-        std_cell_width = int(self.table_width / self.total_col_count)
-        total_table_width = 0
-        accumulated_width = 0
-        for cell in self.cells:
-            if cell.row != last_i:
-                # Cambio de fila
-                total_table_width = max(total_table_width, accumulated_width)
-                accumulated_width = 0
-
-            width = self._ConvertToPx(cell.css_width)
-            if width == 0:
-                width = std_cell_width
-            # 1.3 convierte de pt a px
-            height = int(self.font_size * 1.3)
-            self.col_widths[cell.col] = max(
-                self.col_widths[cell.col], width)
-            self.row_heights[cell.row] = max(self.row_heights[cell.row], height)
-            accumulated_width += width
-
-        # Por si la tabla solo tiene una fila
-        if total_table_width == 0:
-            total_table_width = accumulated_width
+            # Paso a la fila siguiente
+            occupied = [max(n - 1, 0) for n in occupied]
+
+        self.total_col_count = len(occupied)
+
+        return
+
+    def _GetSpan(self, val: str, maximum: int) -> int:
+        """Convierto un atributo colspan o rowspan a entero. Si no es
+        válido devuelvo 1.
+
+        Parámetros
+        ----------
+        val : str
+            Valor del atributo, o None si no está.
+        maximum : int
+            Valor máximo permitido (según el estándar de HTML).
+        """
+        match = re.match(r"\s*(\d+)", val or "")
+        if match is None:
+            return 1
+        return min(int(match.group(1)), maximum)
+
+    def _LayoutCells(self) -> None:
+        """Calculo el ancho de cada columna y el alto de cada fila a
+        partir de self.cells, corto el texto de las celdas y, si hace
+        falta, agrando la imagen.
+
+        Las posiciones salen de sumas acumuladas (row_offsets,
+        col_offsets), así que todo es lineal en la cantidad de celdas.
+        """
+        self.col_widths = self._ResolveColumnWidths()
+        self.col_offsets = list(itertools.accumulate(self.col_widths, initial=0))
+
+        # 1.3 convierte de pt a px
+        self.row_heights = [int(self.font_size * 1.3)] * self.total_row_count
 
         # Formateo el texto y ajusto el alto de fila si corresponde
+        spanning = []
         for cell in self.cells:
-            cell.content = self._FormatField(
-                cell.content, self.col_widths[cell.col] * cell.colspan)
-            self.row_heights[cell.row] = max(
-                self.row_heights[cell.row], self._GetCellHeight(cell.content))
+            width = self.col_offsets[cell.col + cell.colspan] - self.col_offsets[cell.col]
+            if self.glyph_wrap:
+                cell.content, height = self._LayoutField(cell.content, width)
+            else:
+                cell.content = self._FormatField(cell.content, width)
+                height = self._GetCellHeight(cell.content)
+
+            if cell.rowspan == 1:
+                self.row_heights[cell.row] = max(self.row_heights[cell.row], height)
+            else:
+                spanning.append((cell, height))
+
+        # Si una celda con rowspan no entra en sus filas, agrando la última
+        for cell, height in spanning:
+            last = cell.row + cell.rowspan
+            available = sum(self.row_heights[cell.row:last])
+            if height > available:
+                self.row_heights[last - 1] += height - available
+
+        self.row_offsets = list(itertools.accumulate(self.row_heights, initial=0))
 
         # Si el alto total de la tabla supera el predeterminado:
-        if sum(self.row_heights) > self.table_height:
+        if self.row_offsets[-1] > self.table_height:
             # Redimensiono la imagen
-            self.table_height = sum(self.row_heights)
+            self.table_height = self.row_offsets[-1]
             self.img_height = self.caption_box_height + self.table_height + (50, self.footer_box_height)[self.draw_footer]
 
         return
 
+    def _ResolveColumnWidths(self) -> list:
+        """Devuelvo el ancho de cada columna.
+
+        Las columnas con ancho en el HTML (atributo width o estilo) lo
+        respetan. El resto se reparte el espacio que queda según su
+        contenido: si entra todo sin cortar, en proporción al texto más
+        largo de cada una; si no, cada una recibe al menos lo que ocupa
+        su palabra más larga y el resto se reparte según cuánto le
+        falta. Si aun así no entra, achico todo proporcionalmente.
+        """
+        cols = self.total_col_count
+        hints = [0] * cols
+        prefs = [0] * cols
+        mins = [0] * cols
+        spanning = []
+
+        for cell in self.cells:
+            hint = self._ConvertToPx(cell.css_width)
+            if cell.colspan > 1:
+                if hint > 0:
+                    spanning.append((cell, hint))
+                continue
+            hints[cell.col] = max(hints[cell.col], hint)
+            pref, word = self.font_res.Measure(cell.content)
+            prefs[cell.col] = max(prefs[cell.col], pref)
+            mins[cell.col] = max(mins[cell.col], word)
+
+        # Un ancho en una celda combinada se reparte entre sus columnas
+        for cell, hint in spanning:
+            for col in range(cell.col, cell.col + cell.colspan):
+                if hints[col] == 0:
+                    hints[col] = hint // cell.colspan
+
+        widths = list(hints)
+        free = [col for col in range(0, cols) if hints[col] == 0]
+        if free:
+            floor = 2 * self.median_char_width
+            for col in free:
+                mins[col] = max(mins[col], floor)
+                prefs[col] = max(prefs[col], mins[col])
+            min_total = sum(mins[col] for col in free)
+            pref_total = sum(prefs[col] for col in free)
+            available = max(self.table_width - sum(hints), min_total)
+
+            for col in free:
+                if available >= pref_total:
+                    widths[col] = available * prefs[col] / pref_total
+                elif pref_total > min_total:
+                    widths[col] = mins[col] + (available - min_total) * \
+                        (prefs[col] - mins[col]) / (pref_total - min_total)
+                else:
+                    widths[col] = mins[col]
+
+        total = sum(widths)
+        if total > self.table_width:
+            widths = [width * self.table_width / total for width in widths]
+
+        return [int(width) for width in widths]
+
     def _ConvertToPx(self, val: str) -> int:
         """Convierto un tamaño de CSS a un entero en px.
 
         Parámetros
         ----------
         val : str
-            Valor de CSS a convertir (ej.: "250pt")
+            Valor de CSS a convertir (ej.: "250pt"). Sin unidad, se
+            toma como px (así viene en el atributo width).
         """
         px = 0
+        val = val.strip()
 
         if not len(val) == 0:
-            if "%" in val:
-                px = int(val[:-1]) * self.table_width / 100
+            match = self.size_re.match(val)
+            if match is None:
+                print("WARNING: No entiendo el tamaño '%s'" % (val))
+                return 0
+
+            value = float(match.group(1))
+            unit = match.group(2).lower() or "px"
+            conversion_factors = {
+                "%": self.table_width / 100,
+                "px": 1,
+                "in": 96,
+                "pt": 1.3,
+                "pc": 16,
+                "cm": 38,
+                "mm": 3.8,
+                "em": self.font_size,
+                "vw": self.table_width / 100,
+                "vh": self.table_height / 100
+            }
+
+            if unit in conversion_factors:
+                px = value * conversion_factors[unit]
             else:
-                unit = val[-2:]  # "100px" --> "px"
-                value = int(val[:-2].split(".")[0])
-                conversion_factors = {
-                    "px": 1,
-                    "in": 96,
-                    "pt": 1.3,
-                    "pc": 16,
-                    "cm": 38,
-                    "mm": 3.8,
-                    "em": self.font_size,
-                    "vw": self.table_width,
-                    "vh": self.table_height
-                }
-
-                if unit in conversion_factors:
-                    px = value * conversion_factors[unit]
-                else:
-                    print("WARNING: No conozco la unidad '%s'" % (unit))
+                print("WARNING: No conozco la unidad '%s'" % (unit))
 
         return int(px)
 
+    def _CleanField(self, text: str) -> str:
+        """Elimino espacios de más del contenido de una celda.
+
+        Parámetros
+        ----------
+        text : str
+            Texto de la celda.
+        """
+        text = text.replace(u"\xa0", "")
+        return self.spaces_re.sub("", text)
+
     def _FormatField(self, text: str, width: int) -> str:
         """Elimino espacios de más, y hago el text wrap si es necesario.
 
@@ -403,14 +1124,35 @@ class TableToIMG():
         width : int
             Ancho (en píxeles) de la celda.
         """
-        text = text.replace(u"\xa0", "")
-        text = self.spaces_re.sub("", text)
+        text = self._CleanField(text)
         if self._GetCellWidth(text) > width:
             text = self._WrapText(text, width)
         return text
 
-    def _DrawCells(self) -> None:
-        """Dibujo las celdas de self.cells.
+    def _LayoutField(self, text: str, width: int) -> tuple:
+        """Ídem _FormatField, pero cortando según el ancho de cada
+        caracter. Devuelvo (texto, alto de la celda), así no hace falta
+        volver a medir el texto.
+
+        Parámetros
+        ----------
+        text : str
+            Texto de la celda, ya pasado por _CleanField.
+        width : int
+            Ancho (en píxeles) de la celda.
+        """
+        return self.font_res.Wrap(text, width)
+
+    def _DrawCells(self, cells: list = None, y_offset: int = 0) -> None:
+        """Dibujo las celdas de una tabla.
+
+        Parámetros
+        ----------
+        cells : list[<Cell>]
+            Celdas a dibujar. Si es None, dibujo todas las de self.cells.
+        y_offset : int
+            Píxeles que subo todas las celdas, para dibujar una página
+            que no empieza en la primera fila.
         """
         # Para cada celda:
         # Si isHeader:
@@ -418,20 +1160,14 @@ class TableToIMG():
         # Si DrawBorders:
         # Dibujo el borde de la celda
         # Dibujo el texto centrado en la celda
-        # Aumento los contadores de row, col
-        last_x = int((self.img_width - self.table_width) / 2)
-        last_y = self.caption_box_height
-        last_row = 0
-        for cell in self.cells:
-            if cell.row != last_row:
-                # Cambio de fila
-                last_x = int((self.img_width - self.table_width) / 2)
-                last_y = self.caption_box_height + sum(self.row_heights[0:cell.row])
-
-            x0 = last_x
-            y0 = last_y
-            x1 = x0 + self.col_widths[cell.col] * cell.colspan
-            y1 = y0 + self.row_heights[cell.row] * cell.rowspan
+        # La posición sale de row_offsets y col_offsets
+        left = int((self.img_width - self.table_width) / 2)
+        top = self.caption_box_height - y_offset
+        for cell in (self.cells if cells is None else cells):
+            x0 = left + self.col_offsets[cell.col]
+            y0 = top + self.row_offsets[cell.row]
+            x1 = left + self.col_offsets[cell.col + cell.colspan]
+            y1 = top + self.row_offsets[cell.row + cell.rowspan]
 
             if cell.is_header:
                 self.d.rectangle([x0, y0, x1, y1], fill=self.hd_color)
@@ -439,9 +1175,6 @@ class TableToIMG():
                 self.d.rectangle([x0, y0, x1, y1], outline=self.fg_color)
             self.d.text((x0, y0), cell.content,
                         fill=self.fg_color, font=self.font)
-
-            last_x = x1
-            last_row = cell.row
         return
 
     def _GetCellWidth(self, content: str) -> int:
@@ -495,6 +1228,76 @@ class TableToIMG():
         return cnt
 
 
+def GetImageExtension(data: bytes) -> str:
+    """Devuelvo la extensión que corresponde al formato de una imagen
+    ya codificada, según sus primeros bytes.
+
+    Parámetros
+    ----------
+    data : bytes
+        Imagen codificada.
+    """
+    data = bytes(data[:12])
+    extension = "png"
+    if data.startswith(b"RIFF") and data[8:12] == b"WEBP":
+        extension = "webp"
+    elif data.startswith(b"\xff\xd8"):
+        extension = "jpg"
+    elif data.startswith(b"GIF8"):
+        extension = "gif"
+    return extension
+
+
+def RenderTable(raw_html: str, img_width: int, img_height: int, style: dict) -> list:
+    """Genero las imágenes de una tabla (ver TableToIMG.GetImages) con
+    un TableToIMG nuevo, sin estado compartido. Pensado para usar con
+    ProcessPoolExecutor, por lo que todos los parámetros tienen que
+    poder serializarse.
+
+    Parámetros
+    ----------
+    raw_html : str
+        Tabla HTML a parsear.
+    img_width, img_height : int
+        Ídem TableToIMG.GetImage.
+    style : dict
+        Atributos de estilo, tal como los devuelve TableToIMG.GetStyle.
+    """
+    t = TableToIMG()
+    t.SetStyle(style)
+    return t.GetImages(raw_html, img_width, img_height)
+
+
+def InitRenderWorker(enabled: bool) -> None:
+    """Inicializo un proceso del pool de RenderTableInWorker. Los
+    procesos creados con fork heredan metrics tal cual (activado y con
+    el log abierto), pero lo que acumulan nunca llega al proceso
+    principal: si enabled es True sólo guardo los eventos, para
+    devolverlos con cada tabla; si no, desactivo las métricas.
+
+    Parámetros
+    ----------
+    enabled : bool
+        metrics.enabled en el proceso principal.
+    """
+    if enabled:
+        metrics.EnableBuffer()
+    else:
+        metrics.Disable()
+    return
+
+
+def RenderTableInWorker(raw_html: str, img_width: int, img_height: int,
+                        style: dict) -> tuple:
+    """Ídem RenderTable, pero devuelvo (imágenes, eventos): los eventos
+    de metrics de ese dibujo, para registrarlos en el proceso principal
+    con metrics.Record. Se usa en procesos iniciados con
+    InitRenderWorker.
+    """
+    images = RenderTable(raw_html, img_width, img_height, style)
+    return images, metrics.TakeEvents()
+
+
 if __name__ == "__main__":
     t = TableToIMG()
     t.font_name = "assets/Montserrat-Regular.ttf"
@@ -0,0 +1,137 @@
+import time
+
+from SQLiteLRU import SQLiteLRU
+
+
+class CacheEntry:
+    """Una respuesta guardada en el cache.
+
+    Atributos
+    ---------
+    url : str
+        URL completa (incluyendo la query string).
+    body : str
+        Cuerpo de la respuesta, ya decodificado.
+    etag : str
+        Valor del header ETag, o "" si el servidor no lo envió.
+    last_modified : str
+        Valor del header Last-Modified, o "".
+    complete : bool
+        False si body es sólo el principio de la respuesta, porque se
+        dejó de leer antes de terminar (ver HTTPClient.IterText).
+    """
+    url = ""
+    body = ""
+    etag = ""
+    last_modified = ""
+    complete = True
+
+    def ConditionalHeaders(self) -> dict:
+        """Devuelvo los headers para revalidar la entrada con un GET
+        condicional.
+        """
+        headers = {}
+        if self.etag:
+            headers["If-None-Match"] = self.etag
+        if self.last_modified:
+            headers["If-Modified-Since"] = self.last_modified
+        return headers
+
+
+class HTTPCache(SQLiteLRU):
+    """Cache persistente de respuestas HTTP, guardado en SQLite.
+
+    Cada entrada se identifica por su URL. La eliminación de las menos
+    usadas y la base de datos se manejan en SQLiteLRU.
+
+    Atributos
+    ---------
+    max_bytes : int
+        Tamaño máximo, en bytes, de la suma de los cuerpos guardados.
+    """
+    max_bytes = 256 * 1024 * 1024
+    table = "responses"
+    key = "url"
+    columns = ("url TEXT PRIMARY KEY, body TEXT NOT NULL, etag TEXT, "
+               "last_modified TEXT")
+
+    def __init__(self, path: str, max_bytes: int = None) -> None:
+        """
+        Parámetros
+        ----------
+        path : str
+            Path al archivo SQLite.
+        max_bytes : int
+            Si no es None, reemplaza el valor por defecto de max_bytes.
+        """
+        super().__init__(path, max_bytes)
+
+        # Los caches creados antes de CacheEntry.complete no tienen la
+        # columna. Los nuevos también la agregan acá, así queda después
+        # de size y last_used como en los anteriores.
+        columns = [row[1] for row in self._db.execute("PRAGMA table_info(responses)")]
+        if "complete" not in columns:
+            self._db.execute("ALTER TABLE responses ADD COLUMN "
+                             "complete INTEGER NOT NULL DEFAULT 1")
+            self._db.commit()
+
+        return
+
+    def Lookup(self, url: str) -> CacheEntry:
+        """Devuelvo la entrada guardada para url, o None si no existe.
+        Si existe, la marco como usada recientemente.
+
+        Parámetros
+        ----------
+        url : str
+            URL completa.
+        """
+        entry = None
+
+        with self._lock:
+            row = self._db.execute(
+                "SELECT body, etag, last_modified, complete, last_used "
+                "FROM responses WHERE url = ?", (url,)).fetchone()
+            if row is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+                entry = CacheEntry()
+                entry.url = url
+                entry.body, entry.etag, entry.last_modified, complete = row[:4]
+                entry.complete = bool(complete)
+                entry.etag = entry.etag or ""
+                entry.last_modified = entry.last_modified or ""
+                self._Touch(url, row[4])
+
+        return entry
+
+    def Store(self, url: str, body: str, etag: str = "", last_modified: str = "",
+              complete: bool = True) -> None:
+        """Guardo (o reemplazo) una respuesta y, si hace falta,
+        elimino las entradas menos usadas.
+
+        Parámetros
+        ----------
+        url : str
+            URL completa.
+        body : str
+            Cuerpo de la respuesta.
+        etag, last_modified : str
+            Headers de validación devueltos por el servidor.
+        complete : bool
+            False si body es sólo el principio de la respuesta.
+        """
+        size = len(body.encode("utf-8"))
+        if size > self.max_bytes:
+            return
+
+        with self._lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (url, body, etag or "", last_modified or "", size, time.time(),
+                 int(complete)))
+            self._Evict()
+            self._db.commit()
+
+        return
@@ -0,0 +1,346 @@
+import random
+import sys
+import threading
+import time
+import requests
+from requests.adapters import HTTPAdapter
+from HTTPCache import HTTPCache
+
+
+class HTTPStats:
+    """Contadores del tráfico hecho a través de un HTTPClient.
+
+    Atributos
+    ---------
+    requests : int
+        Cantidad de requests enviados (incluyendo reintentos).
+    retries : int
+        Cantidad de reintentos por errores 5xx, timeouts o errores de
+        conexión.
+    failures : int
+        Cantidad de URLs que no pude obtener luego de agotar los
+        reintentos.
+    connections : int
+        Cantidad de conexiones TCP nuevas que tuvo que abrir el pool.
+    reused_connections : int
+        Cantidad de requests que reutilizaron una conexión keep-alive.
+    bytes : int
+        Bytes recibidos en el cuerpo de las respuestas.
+    cache_hits : int
+        Respuestas servidas desde el cache sin hacer ningún request.
+    not_modified : int
+        Revalidaciones que el servidor respondió con 304.
+    """
+    requests = 0
+    retries = 0
+    failures = 0
+    connections = 0
+    reused_connections = 0
+    bytes = 0
+    cache_hits = 0
+    not_modified = 0
+
+    def AsDict(self) -> dict:
+        """Devuelvo los contadores como un dict, para loguearlos."""
+        return {
+            "requests": self.requests,
+            "retries": self.retries,
+            "failures": self.failures,
+            "connections": self.connections,
+            "reused_connections": self.reused_connections,
+            "bytes": self.bytes,
+            "cache_hits": self.cache_hits,
+            "not_modified": self.not_modified
+        }
+
+
+class HTTPClient:
+    """Capa de transporte para acceder a SIBOM.
+
+    Mantiene una sesión keep-alive con un pool de conexiones de tamaño
+    fijo, reintenta ante errores 5xx y timeouts con backoff exponencial
+    y jitter, y lleva la cuenta de lo que se transfirió.
+
+    Atributos
+    ---------
+    pool_size : int
+        Cantidad máxima de conexiones abiertas por host. Conviene que
+        sea al menos igual a la cantidad de descargas simultáneas.
+    max_retries : int
+        Cantidad de reintentos luego del primer intento fallido.
+    backoff_factor : float
+        Segundos de espera base. Antes del reintento n espero un valor
+        aleatorio entre 0 y backoff_factor * 2 ** n ("full jitter").
+    max_backoff : float
+        Tope, en segundos, de la espera entre reintentos.
+    connect_timeout, read_timeout : float
+        Timeouts, en segundos, para establecer la conexión y para
+        esperar cada lectura del cuerpo de la respuesta.
+    retry_statuses : tuple
+        Códigos de estado HTTP que provocan un reintento.
+    user_agent : str
+        User-Agent enviado en cada request.
+    cache : HTTPCache
+        Cache persistente utilizado por GetText. Si es None, no uso
+        cache.
+    """
+    pool_size = 10
+    max_retries = 3
+    backoff_factor = 0.5
+    max_backoff = 30
+    connect_timeout = 5
+    read_timeout = 30
+    retry_statuses = (500, 502, 503, 504)
+    user_agent = "SIBOM-bot (+https://github.com/nmontesoro/SIBOM)"
+    cache = None
+
+    def __init__(self, pool_size: int = None, max_retries: int = None,
+                 cache: HTTPCache = None) -> None:
+        """
+        Parámetros
+        ----------
+        pool_size : int
+            Si no es None, reemplaza el valor por defecto de pool_size.
+        max_retries : int
+            Si no es None, reemplaza el valor por defecto de
+            max_retries.
+        cache : HTTPCache
+            Cache persistente a utilizar en GetText.
+        """
+        self.cache = cache
+        if pool_size is not None:
+            self.pool_size = pool_size
+        if max_retries is not None:
+            self.max_retries = max_retries
+
+        self.stats = HTTPStats()
+        self._lock = threading.Lock()
+        self._adapter = HTTPAdapter(
+            pool_connections=self.pool_size, pool_maxsize=self.pool_size)
+        self.session = requests.Session()
+        self.session.headers["User-Agent"] = self.user_agent
+        self.session.mount("http://", self._adapter)
+        self.session.mount("https://", self._adapter)
+
+        return
+
+    def Get(self, url: str, params: dict = None, headers: dict = None,
+            stream: bool = False) -> requests.Response:
+        """Hago un GET, reintentando si hace falta. Devuelvo la
+        respuesta (sea cual sea su código de estado), o None si no pude
+        obtener ninguna.
+
+        Parámetros
+        ----------
+        url : str
+            URL a la cual acceder.
+        params : dict
+            Parámetros a agregar a la query string.
+        headers : dict
+            Headers adicionales para este request.
+        stream : bool
+            Si es True, no leo el cuerpo de la respuesta: queda a cargo
+            de quien llama (y no se suma a stats.bytes).
+        """
+        resp = None
+
+        for attempt in range(0, self.max_retries + 1):
+            if attempt > 0:
+                self._Backoff(attempt)
+
+            self._Count("requests")
+            try:
+                resp = self.session.get(
+                    url, params=params, headers=headers, stream=stream,
+                    timeout=(self.connect_timeout, self.read_timeout))
+                if not stream:
+                    self._Count("bytes", len(resp.content))
+            except (requests.ConnectionError, requests.Timeout) as e:
+                print("WARNING: %s (%s)" % (url, e.__class__.__name__),
+                      file=sys.stderr)
+                resp = None
+            else:
+                if resp.status_code not in self.retry_statuses:
+                    break
+                if attempt < self.max_retries:
+                    resp.close()
+
+        if resp is None or resp.status_code in self.retry_statuses:
+            self._Count("failures")
+
+        return resp
+
+    def GetText(self, url: str, params: dict = None, immutable: bool = False) -> str:
+        """Devuelvo el cuerpo de la respuesta a un GET, o None si no
+        obtuve un 200. Si hay cache, revalido lo guardado con un GET
+        condicional y sólo descargo el cuerpo si cambió.
+
+        Parámetros
+        ----------
+        url : str
+            URL a la cual acceder.
+        params : dict
+            Parámetros a agregar a la query string.
+        immutable : bool
+            Si es True y la URL está en el cache, la devuelvo sin
+            revalidarla (nunca expira).
+        """
+        if self.cache is None:
+            resp = self.Get(url, params=params)
+            return resp.text if resp is not None and resp.status_code == 200 else None
+
+        full_url = requests.Request("GET", url, params=params).prepare().url
+        entry = self.cache.Lookup(full_url)
+        if entry is not None and not entry.complete:
+            # Sólo tengo el principio (ver IterText): la descargo entera
+            entry = None
+
+        if entry is not None and immutable:
+            self._Count("cache_hits")
+            return entry.body
+
+        headers = entry.ConditionalHeaders() if entry is not None else None
+        resp = self.Get(full_url, headers=headers)
+        text = None
+
+        if resp is None:
+            pass
+        elif resp.status_code == 304 and entry is not None:
+            self._Count("not_modified")
+            text = entry.body
+        elif resp.status_code == 200:
+            text = resp.text
+            self.cache.Store(full_url, text, resp.headers.get("ETag", ""),
+                             resp.headers.get("Last-Modified", ""))
+
+        return text
+
+    def IterText(self, url: str, params: dict = None, chunk_size: int = 8192):
+        """Devuelvo un generador con el cuerpo de la respuesta,
+        decodificado, a medida que va llegando. Si quien lo consume
+        deja de iterar, cierro la conexión sin leer el resto.
+
+        Si hay cache, hago un GET condicional: ante un 304 recorro el
+        cuerpo guardado, y ante un 200 lo guardo con sus validadores
+        (ETag, Last-Modified). Si no se terminó de leer, guardo sólo lo
+        leído, así la próxima vez también se revalida; si entonces
+        hace falta más que eso, pido el resto. Si no obtengo respuesta,
+        no devuelvo nada.
+
+        Parámetros
+        ----------
+        url : str
+            URL a la cual acceder.
+        params : dict
+            Parámetros a agregar a la query string.
+        chunk_size : int
+            Tamaño, en bytes, de cada lectura.
+        """
+        entry = None
+        if self.cache is not None:
+            url = requests.Request("GET", url, params=params).prepare().url
+            params = None
+            entry = self.cache.Lookup(url)
+
+        headers = entry.ConditionalHeaders() if entry is not None else None
+        resp = self.Get(url, params=params, headers=headers, stream=True)
+        # Caracteres del principio que ya devolví desde el cache
+        skip = 0
+
+        if resp is None:
+            return
+        if resp.status_code == 304 and entry is not None:
+            resp.close()
+            self._Count("not_modified")
+            for i in range(0, len(entry.body), chunk_size):
+                yield entry.body[i:i + chunk_size]
+            if entry.complete:
+                return
+            # Sólo tenía el principio: pido la respuesta entera y
+            # salteo lo que ya devolví
+            skip = len(entry.body)
+            resp = self.Get(url, params=params, stream=True)
+            if resp is None:
+                return
+        if resp.status_code != 200:
+            print("WARNING: %s devolvió %s" % (url, resp.status_code),
+                  file=sys.stderr)
+            resp.close()
+            return
+
+        if resp.encoding is None:
+            resp.encoding = "utf-8"
+        chunks = []
+        complete = False
+        try:
+            for chunk in resp.iter_content(chunk_size=chunk_size, decode_unicode=True):
+                self._Count("bytes", len(chunk))
+                if self.cache is not None:
+                    chunks.append(chunk)
+                if skip >= len(chunk):
+                    skip -= len(chunk)
+                    continue
+                chunk, skip = chunk[skip:], 0
+                yield chunk
+            complete = True
+        finally:
+            resp.close()
+            etag = resp.headers.get("ETag", "")
+            last_modified = resp.headers.get("Last-Modified", "")
+            # Un cuerpo incompleto sin validadores no me sirve de nada
+            if self.cache is not None and (complete or etag or last_modified):
+                self.cache.Store(url, "".join(chunks), etag, last_modified, complete)
+
+        return
+
+    def GetStats(self) -> HTTPStats:
+        """Actualizo los contadores de conexiones a partir de los pools
+        de urllib3 y devuelvo self.stats.
+        """
+        pools = self._adapter.poolmanager.pools
+        connections = 0
+        for key in pools.keys():
+            pool = pools.get(key)
+            if pool is not None:
+                connections += pool.num_connections
+
+        with self._lock:
+            self.stats.connections = connections
+            self.stats.reused_connections = max(
+                self.stats.requests - connections, 0)
+
+        return self.stats
+
+    def Close(self) -> None:
+        """Cierro todas las conexiones del pool y el cache."""
+        self.session.close()
+        if self.cache is not None:
+            self.cache.Close()
+        return
+
+    def _Backoff(self, attempt: int) -> None:
+        """Espero antes de reintentar, con backoff exponencial y jitter.
+
+        Parámetros
+        ----------
+        attempt : int
+            Número de reintento (empieza en 1).
+        """
+        self._Count("retries")
+        delay = min(self.backoff_factor * 2 ** attempt, self.max_backoff)
+        time.sleep(random.uniform(0, delay))
+        return
+
+    def _Count(self, counter: str, amount: int = 1) -> None:
+        """Incremento un contador de self.stats de forma thread-safe.
+
+        Parámetros
+        ----------
+        counter : str
+            Nombre del atributo de HTTPStats a incrementar.
+        amount : int
+            Cantidad a sumar.
+        """
+        with self._lock:
+            setattr(self.stats, counter, getattr(self.stats, counter) + amount)
+        return
@@ -0,0 +1,101 @@
+import io
+import os
+import random
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from HTMLtoImg import GetImageExtension
+from Metrics import metrics
+
+
+class MediaUploader:
+    """Sube las imágenes de los tweets en paralelo.
+
+    Submit devuelve enseguida, así se pueden ir subiendo las imágenes
+    del próximo tweet mientras se publica el actual. Cada imagen se
+    reintenta con backoff exponencial si falla.
+
+    Atributos
+    ---------
+    max_workers : int
+        Cantidad máxima de imágenes subiéndose a la vez.
+    max_retries : int
+        Cantidad de reintentos por imagen luego del primer intento.
+    backoff_factor : float
+        Segundos de espera base entre reintentos (ver HTTPClient).
+    """
+    max_workers = 4
+    max_retries = 3
+    backoff_factor = 1
+
+    def __init__(self, api, max_workers: int = None, sleep=time.sleep) -> None:
+        """
+        Parámetros
+        ----------
+        api : tweepy.API
+            API de Twitter (o FakeTwitterAPI).
+        max_workers : int
+            Si no es None, reemplaza el valor por defecto.
+        sleep : callable
+            Función de espera entre reintentos.
+        """
+        self.api = api
+        if max_workers is not None:
+            self.max_workers = max_workers
+        self.sleep = sleep
+        self.retries = 0
+        self._pool = ThreadPoolExecutor(max_workers=max(self.max_workers, 1))
+        return
+
+    def Submit(self, media: list) -> list:
+        """Empiezo a subir las imágenes de un tweet y devuelvo una lista
+        de futures, en el mismo orden.
+
+        Parámetros
+        ----------
+        media : list
+            Imágenes del tweet, como paths o en memoria (bytes), tal
+            como las devuelve Tweet.GetMedia.
+        """
+        return [self._pool.submit(self._Upload, item) for item in media]
+
+    def Result(self, futures: list) -> list:
+        """Espero a que terminen las subidas de un tweet y devuelvo los
+        media IDs en orden. Si alguna imagen no se pudo subir, levanto
+        la excepción del último intento.
+        """
+        return [future.result() for future in futures]
+
+    def Close(self) -> None:
+        """Espero a que terminen las subidas pendientes y libero el
+        pool.
+        """
+        self._pool.shutdown()
+        return
+
+    def _Upload(self, item) -> int:
+        """Subo una imagen, reintentando si falla, y devuelvo su media
+        ID.
+        """
+        in_memory = isinstance(item, (bytes, bytearray, memoryview))
+        name = "imagen.%s" % (GetImageExtension(item)) if in_memory else item
+
+        for attempt in range(0, self.max_retries + 1):
+            try:
+                with metrics.Span("upload", attempt=attempt) as span:
+                    if in_memory:
+                        # tweepy usa el nombre sólo para deducir el tipo
+                        span.Set(bytes=len(item))
+                        media = self.api.media_upload(
+                            filename=name, file=io.BytesIO(item))
+                    else:
+                        span.Set(bytes=os.path.getsize(item))
+                        media = self.api.media_upload(item)
+                return media.media_id
+            except Exception as e:
+                if attempt == self.max_retries:
+                    raise
+                print("WARNING: Falló la subida de %s (%s), reintento" % (
+                    name, e), file=sys.stderr)
+                self.retries += 1
+                self.sleep(random.uniform(0, self.backoff_factor * 2 ** attempt))
@@ -0,0 +1,290 @@
+import json
+import os
+import sys
+import threading
+import time
+
+# resource sólo existe en Unix; sin él no informo el uso de memoria
+try:
+    import resource
+except ImportError:
+    resource = None
+
+
+class Span:
+    """Mide una etapa del proceso. Se usa como context manager (ver
+    Metrics.Span).
+
+    Atributos
+    ---------
+    stage : str
+        Nombre de la etapa (ej.: "fetch", "encode").
+    fields : dict
+        Datos adicionales del evento (ej.: url, bytes, cells).
+    """
+
+    def __init__(self, metrics, stage: str, fields: dict) -> None:
+        self.metrics = metrics
+        self.stage = stage
+        self.fields = fields
+        self._start = 0
+        return
+
+    def Set(self, **fields) -> None:
+        """Agrego datos al evento, por ejemplo la cantidad de bytes una
+        vez que se conoce.
+        """
+        self.fields.update(fields)
+        return
+
+    def __enter__(self):
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> bool:
+        if exc_type is not None:
+            self.fields["error"] = exc_type.__name__
+        self.metrics.Record(
+            self.stage, time.perf_counter() - self._start, **self.fields)
+        return False
+
+
+class _NullSpan:
+    """Span que no hace nada, para cuando las métricas están
+    desactivadas.
+    """
+
+    def Set(self, **fields) -> None:
+        return
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> bool:
+        return False
+
+
+_null_span = _NullSpan()
+
+
+class Metrics:
+    """Junta tiempos y contadores de cada etapa del proceso (descarga,
+    parseo, dibujo de tablas, subida de imágenes, etc.).
+
+    Cada evento se puede escribir como una línea JSON, y al final de la
+    corrida se puede generar un resumen en el formato textfile de
+    Prometheus. Desactivado (el valor por defecto), Span devuelve
+    siempre el mismo objeto vacío y Record vuelve enseguida.
+
+    Atributos
+    ---------
+    enabled : bool
+        Si es False, no registro nada.
+    prefix : str
+        Prefijo de los nombres de las métricas de Prometheus.
+    summable : tuple
+        Campos numéricos de los eventos que se suman por etapa.
+    """
+    enabled = False
+    prefix = "sibom"
+    summable = ("bytes", "cells", "tables", "pixels")
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._log = None
+        self._buffer = None
+        self.Reset()
+        return
+
+    def Enable(self, log_path: str = None) -> None:
+        """Activo las métricas.
+
+        Parámetros
+        ----------
+        log_path : str
+            Si no es None, agrego cada evento como una línea JSON a este
+            archivo. Se crea el directorio si no existe.
+        """
+        if log_path:
+            directory = os.path.dirname(log_path)
+            if directory and not os.path.exists(directory):
+                os.makedirs(directory)
+            self._log = open(log_path, "at", encoding="utf-8")
+        self.enabled = True
+        return
+
+    def EnableBuffer(self) -> None:
+        """Activo las métricas, pero en lugar de acumular los eventos los
+        guardo tal cual para que los devuelva TakeEvents. Pensado para
+        los procesos de un pool, cuyos totales nunca llegarían al
+        proceso principal: éste registra los eventos con Record.
+        """
+        self.Disable()
+        self._buffer = []
+        self.enabled = True
+        return
+
+    def TakeEvents(self) -> list:
+        """Devuelvo los eventos guardados desde la llamada anterior
+        (ver EnableBuffer), como tuplas (stage, seconds, fields).
+        """
+        with self._lock:
+            events = self._buffer or []
+            if self._buffer is not None:
+                self._buffer = []
+        return events
+
+    def Disable(self) -> None:
+        """Desactivo las métricas y cierro el log."""
+        self.enabled = False
+        self._buffer = None
+        with self._lock:
+            if self._log is not None:
+                self._log.close()
+                self._log = None
+        return
+
+    def Reset(self) -> None:
+        """Borro lo acumulado y empiezo una nueva corrida."""
+        with self._lock:
+            self.stages = {}
+            self.started_at = time.time()
+        return
+
+    def Span(self, stage: str, **fields):
+        """Devuelvo un context manager que mide el bloque como una etapa.
+
+        with metrics.Span("fetch", url=url) as span:
+            text = ...
+            span.Set(bytes=len(text))
+
+        Parámetros
+        ----------
+        stage : str
+            Nombre de la etapa.
+        **fields
+            Datos adicionales del evento.
+        """
+        if not self.enabled:
+            return _null_span
+        return Span(self, stage, fields)
+
+    def Record(self, stage: str, seconds: float, **fields) -> None:
+        """Registro una etapa ya medida.
+
+        Parámetros
+        ----------
+        stage : str
+            Nombre de la etapa.
+        seconds : float
+            Duración.
+        **fields
+            Datos adicionales del evento. Los de self.summable se
+            acumulan en el resumen.
+        """
+        if not self.enabled:
+            return
+        if self._buffer is not None:
+            with self._lock:
+                self._buffer.append((stage, seconds, fields))
+            return
+
+        rss = self.GetPeakRSS()
+        with self._lock:
+            totals = self.stages.setdefault(
+                stage, {"count": 0, "seconds": 0.0, "max_seconds": 0.0, "errors": 0})
+            totals["count"] += 1
+            totals["seconds"] += seconds
+            totals["max_seconds"] = max(totals["max_seconds"], seconds)
+            totals["errors"] += "error" in fields
+            for key in self.summable:
+                if key in fields:
+                    totals[key] = totals.get(key, 0) + fields[key]
+
+            if self._log is not None:
+                event = {"ts": round(time.time(), 6), "stage": stage,
+                         "duration_s": round(seconds, 6)}
+                event.update(fields)
+                if rss:
+                    event["peak_rss_bytes"] = rss
+                self._log.write(json.dumps(event, ensure_ascii=False) + "\n")
+                self._log.flush()
+        return
+
+    def GetSummary(self) -> dict:
+        """Devuelvo los totales de cada etapa y el pico de memoria."""
+        with self._lock:
+            stages = {stage: dict(totals) for stage, totals in self.stages.items()}
+        return {"started_at": self.started_at,
+                "duration_s": time.time() - self.started_at,
+                "peak_rss_bytes": self.GetPeakRSS(),
+                "stages": stages}
+
+    def WritePrometheus(self, path: str) -> None:
+        """Escribo el resumen de la corrida en el formato textfile de
+        Prometheus (ver node_exporter --collector.textfile.directory).
+
+        Escribo a un archivo temporal y lo renombro, así el exporter
+        nunca lee un archivo a medio escribir.
+
+        Parámetros
+        ----------
+        path : str
+            Path del archivo .prom.
+        """
+        summary = self.GetSummary()
+        p = self.prefix
+        series = [
+            ("stage_count_total", "counter", "Cantidad de veces que se ejecutó la etapa.", "count"),
+            ("stage_seconds_total", "counter", "Segundos totales en la etapa.", "seconds"),
+            ("stage_seconds_max", "gauge", "Duración máxima de la etapa.", "max_seconds"),
+            ("stage_errors_total", "counter", "Cantidad de ejecuciones que fallaron.", "errors"),
+            ("stage_bytes_total", "counter", "Bytes procesados en la etapa.", "bytes"),
+            ("stage_cells_total", "counter", "Celdas de tablas procesadas.", "cells"),
+            ("stage_tables_total", "counter", "Tablas procesadas.", "tables"),
+            ("stage_pixels_total", "counter", "Píxeles dibujados.", "pixels")]
+
+        lines = []
+        for name, kind, help, key in series:
+            values = [(stage, totals[key]) for stage, totals in
+                      sorted(summary["stages"].items()) if key in totals]
+            if not values:
+                continue
+            lines.append("# HELP %s_%s %s" % (p, name, help))
+            lines.append("# TYPE %s_%s %s" % (p, name, kind))
+            for stage, value in values:
+                lines.append('%s_%s{stage="%s"} %s' % (p, name, stage, value))
+
+        lines.append("# HELP %s_run_duration_seconds Duración de la corrida." % (p))
+        lines.append("# TYPE %s_run_duration_seconds gauge" % (p))
+        lines.append("%s_run_duration_seconds %s" % (p, summary["duration_s"]))
+        lines.append("# HELP %s_run_timestamp_seconds Comienzo de la corrida." % (p))
+        lines.append("# TYPE %s_run_timestamp_seconds gauge" % (p))
+        lines.append("%s_run_timestamp_seconds %s" % (p, summary["started_at"]))
+        if summary["peak_rss_bytes"]:
+            lines.append("# HELP %s_peak_rss_bytes Pico de memoria residente." % (p))
+            lines.append("# TYPE %s_peak_rss_bytes gauge" % (p))
+            lines.append("%s_peak_rss_bytes %s" % (p, summary["peak_rss_bytes"]))
+
+        directory = os.path.dirname(path)
+        if directory and not os.path.exists(directory):
+            os.makedirs(directory)
+        with open(path + ".tmp", "wt", encoding="utf-8") as fp:
+            fp.write("\n".join(lines) + "\n")
+        os.replace(path + ".tmp", path)
+        return
+
+    @staticmethod
+    def GetPeakRSS() -> int:
+        """Devuelvo el pico de memoria residente del proceso, en bytes,
+        o 0 si no lo puedo obtener.
+        """
+        if resource is None:
+            return 0
+        rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # En Linux ru_maxrss está en KB, en macOS en bytes
+        return rss if sys.platform == "darwin" else rss * 1024
+
+
+# Una sola instancia por proceso, compartida por todos los módulos
+metrics = Metrics()
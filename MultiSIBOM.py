@@ -0,0 +1,183 @@
+import json
+import os
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from HTTPCache import HTTPCache
+from HTTPClient import HTTPClient
+from SIBOM import SIBOM, BulletinIndexScanner
+
+
+class MultiSIBOM:
+    """Atiende varios municipios desde un mismo proceso.
+
+    Recorre las páginas índice de SIBOM una sola vez por consulta y
+    compara cada div "row bulletin-index" contra el muni_regex de todos
+    los municipios registrados. Todas las instancias de SIBOM comparten
+    el mismo HTTPClient (pool de conexiones y cache), pero cada una
+    tiene su propio generador de imágenes.
+
+    Atributos
+    ---------
+    sibom_url : str
+        URL base del índice de boletines.
+    max_pages : int
+        Cantidad máxima de páginas índice a recorrer.
+    max_pipelines : int
+        Cantidad máxima de municipios procesándose a la vez.
+    http : HTTPClient
+        Cliente HTTP compartido.
+    """
+    sibom_url = SIBOM.sibom_url
+    max_pages = 5
+    max_pipelines = 4
+    http = None
+
+    def __init__(self, http: HTTPClient = None) -> None:
+        """
+        Parámetros
+        ----------
+        http : HTTPClient
+            Cliente HTTP a compartir. Si es None, creo uno con el cache
+            por defecto de SIBOM.
+        """
+        if http is None:
+            cache = HTTPCache(SIBOM.cache_path) if SIBOM.cache_path else None
+            http = HTTPClient(pool_size=SIBOM.max_workers, cache=cache)
+        self.http = http
+        self._munis = []
+
+        return
+
+    def Register(self, tw_handle: str, muni_display: str, muni_regex: str,
+                 font_name: str, logo: str, pipeline=None) -> SIBOM:
+        """Registro un municipio y devuelvo su instancia de SIBOM.
+
+        Los parámetros son los mismos que los de SIBOM.__init__, más:
+
+        pipeline : callable
+            Función a llamar como pipeline(sibom, id) cuando aparece un
+            boletín nuevo del municipio. Si es None, sólo se informa el
+            ID en el resultado de Poll.
+        """
+        sibom = SIBOM(tw_handle, muni_display, muni_regex, font_name, logo,
+                      http=self.http)
+        sibom.sibom_url = self.sibom_url
+        self._munis.append((sibom, pipeline))
+
+        return sibom
+
+    def LoadConfig(self, filename: str, pipeline=None) -> None:
+        """Registro los municipios listados en un archivo JSON. Cada
+        elemento de la lista debe tener las claves tw_handle,
+        muni_display, muni_regex, font_name y logo.
+
+        Parámetros
+        ----------
+        filename : str
+            Path al archivo de configuración.
+        pipeline : callable
+            Ídem Register. Se usa para todos los municipios del archivo.
+        """
+        with open(filename, "rt") as fp:
+            config = json.load(fp)
+
+        for muni in config:
+            self.Register(muni["tw_handle"], muni["muni_display"],
+                          muni["muni_regex"], muni["font_name"], muni["logo"],
+                          pipeline)
+        return
+
+    def GetLatestIDs(self) -> dict:
+        """Devuelvo un dict {muni_display: id} con el último boletín de
+        cada municipio registrado. Los que no aparecen en las primeras
+        max_pages páginas quedan con id 0.
+
+        Cada página se descarga una sola vez, y dejo de recorrer apenas
+        encontré todos los municipios.
+        """
+        ids = {}
+        for sibom, _ in self._munis:
+            ids[sibom.muni_display] = 0
+        pending = [sibom for sibom, _ in self._munis]
+
+        for i in range(1, self.max_pages + 1):
+            if len(pending) == 0:
+                break
+
+            url = self.sibom_url + ("", "?page=%s" % (i))[i > 1]
+            scanner = BulletinIndexScanner()
+            read = 0
+            chunks = self.http.IterText(url)
+
+            try:
+                for chunk in chunks:
+                    scanner.feed(chunk)
+                    # Sólo miro las filas que llegaron con este pedazo
+                    for text, id in scanner.rows[read:]:
+                        for sibom in pending:
+                            if sibom.muni_regex.search(text):
+                                ids[sibom.muni_display] = id
+                        pending = [
+                            s for s in pending if ids[s.muni_display] == 0]
+                    read = len(scanner.rows)
+                    if len(pending) == 0:
+                        break
+            finally:
+                chunks.close()
+
+        return ids
+
+    def Poll(self, last_ids: dict) -> dict:
+        """Busco boletines nuevos y los despacho al pipeline de cada
+        municipio. Devuelvo un dict {muni_display: id} sólo con los
+        municipios que tienen un boletín nuevo.
+
+        Parámetros
+        ----------
+        last_ids : dict
+            Último ID procesado de cada municipio, indexado por
+            muni_display.
+        """
+        latest = self.GetLatestIDs()
+        new_ids = {}
+        jobs = []
+
+        for sibom, pipeline in self._munis:
+            id = latest[sibom.muni_display]
+            if id != 0 and id != last_ids.get(sibom.muni_display, 0):
+                new_ids[sibom.muni_display] = id
+                if pipeline is not None:
+                    jobs.append((pipeline, sibom, id))
+
+        with ThreadPoolExecutor(max_workers=max(self.max_pipelines, 1)) as pool:
+            futures = [pool.submit(job[0], job[1], job[2]) for job in jobs]
+            for (_, sibom, id), future in zip(jobs, futures):
+                try:
+                    future.result()
+                except Exception as e:
+                    print("ERROR: %s, boletín %s: %s" % (
+                        sibom.muni_display, id, e), file=sys.stderr)
+                    del new_ids[sibom.muni_display]
+
+        return new_ids
+
+
+if __name__ == "__main__":
+    # Uso: python MultiSIBOM.py munis.json [ids.json]
+    ids_file = sys.argv[2] if len(sys.argv) > 2 else "ids.json"
+    last_ids = {}
+    if os.path.exists(ids_file):
+        with open(ids_file, "rt") as fp:
+            last_ids = json.load(fp)
+
+    def Imprimir(sibom: SIBOM, id: int) -> None:
+        urls = sibom.GetAllURLs(id)
+        print("%s: boletín %s, %s publicaciones" % (
+            sibom.muni_display, id, len(urls)))
+
+    m = MultiSIBOM()
+    m.LoadConfig(sys.argv[1], Imprimir)
+    last_ids.update(m.Poll(last_ids))
+
+    with open(ids_file, "wt") as fp:
+        json.dump(last_ids, fp, indent=4, ensure_ascii=False)
@@ -0,0 +1,369 @@
+import queue
+import threading
+import time
+from MediaUploader import MediaUploader
+from Metrics import metrics
+
+
+class TokenBucket:
+    """Limita la cantidad de tweets por ventana de tiempo.
+
+    El balde arranca lleno con capacity fichas y se va rellenando a
+    razón de rate / window fichas por segundo. Cada tweet consume una.
+
+    Atributos
+    ---------
+    rate : int
+        Cantidad de tweets permitidos por ventana.
+    window : float
+        Duración de la ventana, en segundos.
+    capacity : int
+        Cantidad máxima de tweets que pueden salir seguidos.
+    """
+    rate = 300
+    window = 3 * 60 * 60
+    capacity = 300
+
+    def __init__(self, rate: int = None, window: float = None, capacity: int = None,
+                 clock=time.monotonic, sleep=time.sleep) -> None:
+        """
+        Parámetros
+        ----------
+        rate, window, capacity
+            Si no son None, reemplazan los valores por defecto.
+        clock, sleep : callable
+            Reloj y función de espera. Se pueden reemplazar para
+            pruebas.
+        """
+        if rate is not None:
+            self.rate = rate
+        if window is not None:
+            self.window = window
+        self.capacity = capacity if capacity is not None else self.rate
+        self.clock = clock
+        self.sleep = sleep
+        self.tokens = float(self.capacity)
+        self._last = self.clock()
+        return
+
+    def Acquire(self) -> float:
+        """Espero hasta que haya una ficha disponible, la consumo, y
+        devuelvo cuántos segundos tuve que esperar.
+        """
+        waited = 0.0
+        while True:
+            now = self.clock()
+            self.tokens = min(self.capacity,
+                              self.tokens + (now - self._last) * self.rate / self.window)
+            self._last = now
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return waited
+            delay = (1 - self.tokens) * self.window / self.rate
+            self.sleep(delay)
+            waited += delay
+
+
+class PostingScheduler:
+    """Publica los hilos respetando los tiempos entre tweets, mientras
+    en otro hilo se van descargando y parseando las publicaciones
+    siguientes. Las imágenes de cada tweet se dibujan y suben mientras
+    se publica el anterior.
+
+    En lugar de dormir después de cada tweet, calculo a partir de qué
+    momento puede salir el próximo: si para entonces ya está listo (el
+    productor trabajó durante la espera), sale sin demoras adicionales.
+
+    Atributos
+    ---------
+    tweet_gap : float
+        Segundos mínimos entre dos tweets, para no llenar el timeline
+        de los seguidores y evitar que marquen la cuenta como spam.
+    thread_gap : float
+        Segundos adicionales entre el último tweet de un hilo y el
+        primero del siguiente.
+    prefetch : int
+        Cantidad de publicaciones que el productor puede tener listas
+        por adelantado.
+    place_id : str
+        ID de lugar de Twitter a incluir en cada tweet.
+    max_attempts : int
+        Cantidad de corridas en las que se intenta un mismo tweet (o la
+        descarga de una publicación) antes de saltearlo, para que un
+        error que se repite siempre no trabe al bot.
+    permanent_codes : tuple
+        Códigos de error de Twitter que no tiene sentido reintentar: el
+        tweet se saltea en el primer intento (186: demasiado largo, 187:
+        repetido, como los "Comuníquese, publíquese..." de siempre).
+    """
+    tweet_gap = 15
+    thread_gap = 15
+    prefetch = 2
+    place_id = None
+    max_attempts = 3
+    permanent_codes = (186, 187)
+
+    def __init__(self, api, state=None, bucket: TokenBucket = None,
+                 clock=time.monotonic, sleep=time.sleep) -> None:
+        """
+        Parámetros
+        ----------
+        api : tweepy.API
+            API de Twitter (o FakeTwitterAPI).
+        state : StateStore
+            Si no es None, registro cada tweet enviado y salteo los que
+            ya se habían enviado.
+        bucket : TokenBucket
+            Límite de tweets por ventana. Si es None, uso uno con los
+            valores por defecto.
+        clock, sleep : callable
+            Reloj y función de espera. Se pueden reemplazar para
+            pruebas.
+        """
+        self.api = api
+        self.state = state
+        self.clock = clock
+        self.sleep = sleep
+        self.bucket = bucket if bucket is not None else TokenBucket(
+            clock=clock, sleep=sleep)
+        self.uploader = MediaUploader(api, sleep=sleep)
+        self._not_before = 0
+        return
+
+    def Run(self, pubs, count: int = None) -> bool:
+        """Publico un hilo por cada publicación y devuelvo True si se
+        completaron todos.
+
+        Si un hilo queda incompleto (falló un tweet, o no pude descargar
+        la publicación), no publico ninguna de las publicaciones
+        siguientes: quedan para la próxima corrida, así el boletín sale
+        en orden. Lo que falla max_attempts veces se saltea (ver _Skip).
+
+        Parámetros
+        ----------
+        pubs : iterable
+            Pares (url, Publicacion), por ejemplo
+            zip(urls, sibom.IterPublicaciones(id, urls)).
+        count : int
+            Cantidad total de publicaciones, sólo para mostrar el
+            avance.
+        """
+        ready = queue.Queue(maxsize=max(self.prefetch, 1))
+        stop = threading.Event()
+        producer = threading.Thread(
+            target=self._Produce, args=(pubs, ready, stop), daemon=True)
+        producer.start()
+
+        completed = True
+        i = 1
+        while True:
+            item = ready.get()
+            if item is None:
+                break
+            if isinstance(item, BaseException):
+                raise item
+
+            url, pub, tweets = item
+            print("Procesando URL %s de %s" % (i, count or "?"))
+            i += 1
+            if pub.url == "":
+                if self._Skip(url, -1, "No pude descargar la publicación"):
+                    print("ERROR: No pude procesar %s después de %s intentos, "
+                          "la salteo" % (url, self.max_attempts))
+                    if self.state:
+                        self.state.SetStage(url, "done")
+                    continue
+                print("ERROR: No pude procesar %s, dejo el resto para la "
+                      "próxima corrida" % (url))
+                completed = False
+                break
+            if not self._PostThread(url, tweets):
+                print("ERROR: Quedó incompleto el hilo de %s, dejo el resto "
+                      "para la próxima corrida" % (url))
+                completed = False
+                break
+
+        # Si corté antes, vacío la cola para que el productor vea stop
+        stop.set()
+        while item is not None and not isinstance(item, BaseException):
+            item = ready.get()
+        producer.join()
+        return completed
+
+    def RunBulletin(self, sibom, bulletin_id: int) -> bool:
+        """Publico lo que falta de un boletín y, si se completó, lo marco
+        como terminado en self.state. Devuelvo True si quedó terminado.
+
+        Si no pude obtener la lista de publicaciones (o vino vacía), no
+        lo marco como terminado, así se reintenta en la próxima corrida.
+
+        Parámetros
+        ----------
+        sibom : SIBOM
+            Instancia del municipio.
+        bulletin_id : int
+            ID del boletín.
+        """
+        muni = sibom.muni_display
+        urls = sibom.GetAllURLs(bulletin_id)
+        if len(urls) == 0:
+            print("ERROR: No pude obtener las publicaciones del boletín %s, "
+                  "lo dejo para la próxima corrida" % (bulletin_id))
+            return False
+
+        # Si el boletín ya estaba registrado, conserva el avance guardado
+        self.state.StartBulletin(muni, bulletin_id, urls)
+        pending = self.state.GetPendingURLs(bulletin_id)
+        # Mientras se publica un hilo, se van preparando los siguientes
+        if not self.Run(zip(pending, sibom.IterPublicaciones(bulletin_id, pending)),
+                        len(pending)):
+            return False
+
+        if len(self.state.GetPendingURLs(bulletin_id)) > 0:
+            return False
+        self.state.FinishBulletin(muni, bulletin_id)
+        return True
+
+    def Close(self) -> None:
+        """Espero a que terminen las subidas pendientes."""
+        self.uploader.Close()
+        return
+
+    def _Produce(self, pubs, ready: queue.Queue, stop: threading.Event) -> None:
+        """Descargo y parseo cada publicación y la dejo en ready con un
+        generador de sus tweets, hasta que se terminen o se active stop.
+        Las imágenes se dibujan recién al publicar el hilo, de a un tweet
+        por adelantado (ver _PostThread), así nunca están todas en
+        memoria. Al terminar dejo None, o la excepción si hubo un error.
+        """
+        try:
+            for url, pub in pubs:
+                if stop.is_set():
+                    break
+                if self.state and pub.url != "":
+                    self._SetPackMode(url, pub)
+                tweets = pub.IterTweets() if pub.url != "" else iter([])
+                ready.put((url, pub, tweets))
+            ready.put(None)
+        except BaseException as e:
+            ready.put(e)
+        return
+
+    def _SetPackMode(self, url: str, pub) -> None:
+        """Si el hilo ya se empezó a publicar, lo sigo armando igual que
+        entonces (juntando o no los artículos), aunque haya cambiado
+        SIBOM.pack_tweets, para que las posiciones de los tweets
+        coincidan con las ya enviadas. Si todavía no se envió ningún
+        tweet, registro el modo actual.
+        """
+        if len(self.state.GetPostedTweets(url)) > 0:
+            # None: se empezó antes de que existiera Publicacion.pack
+            pub.pack = self.state.GetPacked(url) or False
+        else:
+            self.state.SetPacked(url, pub.pack)
+        return
+
+    def _PostThread(self, url: str, tweets) -> bool:
+        """Publico un hilo. Devuelvo True si se enviaron todos los
+        tweets.
+
+        Si un tweet falla, dejo el resto del hilo para la próxima
+        corrida, así no se publica fuera de orden. Si el error es
+        permanente, o ya falló max_attempts veces, lo salteo y sigo con
+        el resto del hilo.
+
+        Parámetros
+        ----------
+        url : str
+            URL de la publicación.
+        tweets : iterable
+            Tweets del hilo, por ejemplo Publicacion.IterTweets(). Leo
+            uno solo por adelantado.
+        """
+        posted = self.state.GetPostedTweets(url) if self.state else {}
+        skipped = self.state.GetSkippedTweets(url) if self.state else set()
+        last_tweet_id = ""
+        completed = True
+        uploads = {}
+
+        for j, (tweet, following) in enumerate(self._ReadAhead(tweets)):
+            print("\n    Tweet %s... " % (j + 1), end="")
+            if j in posted:
+                # Ya lo había enviado en una corrida anterior
+                last_tweet_id = posted[j]
+                print("Ya enviado")
+                continue
+            if j in skipped:
+                print("Salteado")
+                continue
+
+            # Las imágenes de este tweet y del siguiente se suben
+            # mientras espero y mientras se publica este.
+            for k, item in ((j, tweet), (j + 1, following)):
+                if item is not None and k not in posted and k not in skipped \
+                        and k not in uploads:
+                    uploads[k] = self.uploader.Submit(item.GetMedia())
+
+            self._Wait()
+            try:
+                with metrics.Span("upload_wait", url=url, position=j):
+                    media_ids = self.uploader.Result(uploads.pop(j))
+                with metrics.Span("post", url=url, position=j,
+                                  bytes=len(tweet.content.encode("utf-8"))):
+                    last_tweet = self.api.update_status(
+                        status=tweet.content, in_reply_to_status_id=last_tweet_id,
+                        media_ids=media_ids, place_id=self.place_id)
+                last_tweet_id = last_tweet.id
+                if self.state:
+                    self.state.RecordTweet(url, j, last_tweet_id)
+                print("Enviado")
+            except Exception as e:
+                if self._Skip(url, j, e):
+                    print("ERROR: %s. Salteo el tweet" % (e))
+                else:
+                    print("ERROR!")
+                    completed = False
+            self._not_before = self.clock() + self.tweet_gap
+            if not completed:
+                break
+
+        if completed and self.state:
+            self.state.SetStage(url, "done")
+        self._not_before += self.thread_gap
+
+        return completed
+
+    def _Skip(self, url: str, position: int, error) -> bool:
+        """Registro un intento fallido y devuelvo True si hay que
+        saltear el tweet (o la publicación, si position es -1) en lugar
+        de reintentarlo en la próxima corrida.
+        """
+        attempts = self.state.RecordFailure(url, position, str(error)) if self.state else 1
+        # tweepy 3 tiene api_code; tweepy 4, api_codes
+        codes = getattr(error, "api_codes", None) or [getattr(error, "api_code", None)]
+        skip = attempts >= self.max_attempts or any(
+            code in self.permanent_codes for code in codes)
+        if skip and self.state and position >= 0:
+            self.state.SkipTweet(url, position)
+        return skip
+
+    @staticmethod
+    def _ReadAhead(items):
+        """Devuelvo pares (elemento, siguiente), leyendo un solo
+        elemento por adelantado. Para el último, siguiente es None.
+        """
+        items = iter(items)
+        item = next(items, None)
+        while item is not None:
+            following = next(items, None)
+            yield item, following
+            item = following
+        return
+
+    def _Wait(self) -> None:
+        """Espero a que pueda salir el próximo tweet."""
+        delay = self._not_before - self.clock()
+        if delay > 0:
+            self.sleep(delay)
+        self.bucket.Acquire()
+        return
@@ -0,0 +1,67 @@
+import sqlite3
+import time
+
+from SQLiteLRU import SQLiteLRU
+
+
+class RenderCache(SQLiteLRU):
+    """Cache persistente de imágenes ya generadas, guardado en SQLite.
+
+    Las entradas se identifican por un hash del HTML de la tabla y de
+    todo lo que influye en cómo se dibuja (ver TableToIMG.GetRenderKey),
+    así que una tabla que se repite entre publicaciones se dibuja una
+    sola vez. La eliminación de las menos usadas, los contadores y la
+    base de datos se manejan en SQLiteLRU.
+
+    Atributos
+    ---------
+    max_bytes : int
+        Tamaño máximo, en bytes, de la suma de las imágenes guardadas.
+    """
+    max_bytes = 512 * 1024 * 1024
+    table = "images"
+    key = "key"
+    columns = "key TEXT PRIMARY KEY, data BLOB NOT NULL"
+
+    def Get(self, key: str) -> bytes:
+        """Devuelvo la imagen guardada con esa clave, o None.
+
+        Parámetros
+        ----------
+        key : str
+            Clave devuelta por TableToIMG.GetRenderKey.
+        """
+        with self._lock:
+            row = self._db.execute(
+                "SELECT data, last_used FROM images WHERE key = ?",
+                (key,)).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+
+            self.hits += 1
+            self._Touch(key, row[1])
+
+        return bytes(row[0])
+
+    def Put(self, key: str, data: bytes) -> None:
+        """Guardo una imagen y, si hace falta, elimino las menos usadas.
+
+        Parámetros
+        ----------
+        key : str
+            Clave devuelta por TableToIMG.GetRenderKey.
+        data : bytes
+            Imagen ya codificada.
+        """
+        if len(data) > self.max_bytes:
+            return
+
+        with self._lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO images VALUES (?, ?, ?, ?)",
+                (key, sqlite3.Binary(data), len(data), time.time()))
+            self._Evict()
+            self._db.commit()
+
+        return
@@ -1,21 +1,121 @@
-import requests
 import sys
 import re
 import os
-import textwrap
 import string
+import unicodedata
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from functools import partial
+from html.parser import HTMLParser
 from random import choices
-from HTMLtoImg import TableToIMG
-from bs4 import BeautifulSoup
+from HTMLtoImg import TableToIMG, InitRenderWorker, RenderTableInWorker, GetImageExtension, default_parser
+from HTTPCache import HTTPCache
+from HTTPClient import HTTPClient
+from Metrics import metrics
+from RenderCache import RenderCache
+from bs4 import BeautifulSoup, SoupStrainer
 
 art_regex = re.compile(r"^\s*?art.culo\s*?(\d+).*?(?=\w)", flags=re.I)
 spaces_regex = re.compile(r" {2,}")
+# Las únicas partes de un decreto que usa ParsePublicacion. Uso una
+# regex sobre el atributo completo porque puede tener otras clases.
+content_strainer = SoupStrainer(attrs={"class": re.compile(
+    r"(^|\s)(title|city-and-date|col-md-9|annex-name)(\s|$)")})
+links_strainer = SoupStrainer(
+    "a", attrs={"class": re.compile(r"(^|\s)content-link(\s|$)")})
+# Para GetBulletin: los links y el título, que dice de qué municipio es
+bulletin_strainer = SoupStrainer(["a", "h2"])
+# Twitter cuenta cualquier URL como 23 caracteres, tenga o no protocolo.
+# Es una aproximación de la regex de twitter-text: con protocolo, es URL
+# todo lo que sigue hasta el próximo espacio; sin protocolo, el dominio
+# tiene que terminar en uno de los TLD que aparecen en los boletines. La
+# puntuación del final ("ver https://...).") no es parte de la URL.
+url_regex = re.compile(
+    r"(?<![\w@.])(?:https?://\S*[^\s.,;:!?)'\"»]|[\w-]+(?:\.[\w-]+)*"
+    r"\.(?:com|org|net|gob|gov|edu|info|io|ar)\b(?::\d+)?"
+    r"(?:[/?#](?:\S*[^\s.,;:!?)'\"»])?)?)", flags=re.I)
+tweet_max_length = 280
+url_length = 23
+# Caracteres que pesan 2: todos menos los rangos 0-4351, 8192-8205,
+# 8208-8223 y 8242-8247 (ver twitter-text, config v3). Los emojis
+# compuestos quedan contados de más, nunca de menos.
+heavy_regex = re.compile("[^\u0000-\u10ff\u2000-\u200d\u2010-\u201f\u2032-\u2037]")
+
+
+def GetWeightedLength(text: str) -> int:
+    """Devuelvo el largo de un texto tal como lo cuenta Twitter: en NFC,
+    cada URL vale url_length y los caracteres de heavy_regex (CJK,
+    emojis, etc.) valen 2.
+
+    Parámetros
+    ----------
+    text : str
+        Texto del tweet.
+    """
+    text = unicodedata.normalize("NFC", text)
+    # Toda URL tiene un punto o una barra
+    if "." not in text and "/" not in text:
+        return _GetCharsWeight(text)
+
+    length = 0
+    start = 0
+    for match in url_regex.finditer(text):
+        length += _GetCharsWeight(text[start:match.start()]) + url_length
+        start = match.end()
+    return length + _GetCharsWeight(text[start:])
+
+
+def _GetCharsWeight(text: str) -> int:
+    """Ídem GetWeightedLength, para un texto sin URLs."""
+    if text.isascii():
+        return len(text)
+    return len(text) + len(heavy_regex.findall(text))
+
+
+def WrapWeighted(text: str, width: int) -> list:
+    """Ídem textwrap.wrap, pero midiendo con GetWeightedLength. Las
+    palabras más largas que width se cortan, salvo las URLs, que siempre
+    valen url_length.
+
+    Parámetros
+    ----------
+    text : str
+        Texto a dividir.
+    width : int
+        Largo máximo de cada línea.
+    """
+    lines = []
+    line = []
+    length = 0
+    for word in unicodedata.normalize("NFC", text).split():
+        weight = GetWeightedLength(word)
+        while weight > width:
+            # Corto la palabra donde llene el resto de la línea
+            room = width - length - (1 if line else 0)
+            cut = 0
+            while cut < len(word) and _GetCharsWeight(word[cut]) <= room:
+                room -= _GetCharsWeight(word[cut])
+                cut += 1
+            if cut > 0:
+                line.append(word[:cut])
+                word = word[cut:]
+            lines.append(" ".join(line))
+            line, length = [], 0
+            weight = GetWeightedLength(word)
+        if line and length + 1 + weight > width:
+            lines.append(" ".join(line))
+            line, length = [], 0
+        length += weight + (1 if line else 0)
+        line.append(word)
+    if line:
+        lines.append(" ".join(line))
+    return lines
 
 
 class Tweet:
     """Una clase para hacer más legible el código"""
 
-    def __init__(self, content="", media_filenames=[]) -> None:
+    def __init__(self, content="", media_filenames=[], media=None) -> None:
         """
         Parámetros
         ----------
@@ -24,9 +124,19 @@ class Tweet:
         media_filenames : list
             Una lista conteniendo los paths hacia las imágenes a incluir
             en el tweet
+        media : list
+            Una lista con las imágenes a incluir en el tweet, en
+            memoria (bytes). Se suben directamente, sin pasar por disco.
         """
         self.content = content
         self.media_filenames = media_filenames
+        self.media = media if media is not None else []
+
+    def GetMedia(self) -> list:
+        """Devuelvo las imágenes del tweet, ya sea en memoria o como
+        paths.
+        """
+        return self.media if len(self.media) > 0 else self.media_filenames
 
 
 class Publicacion:
@@ -40,54 +150,151 @@ class Publicacion:
         self.tablas = []
         self.cuits = []
         self.anexos = []
-
-    def GetTweets(self) -> list:
+        # Si es True, junto artículos cortos consecutivos en un mismo
+        # tweet (ver _IterTextos)
+        self.pack = False
+        # Función que devuelve las imágenes (páginas) de una tabla. La
+        # setea SIBOM cuando se generan recién al armar los tweets.
+        self.render = None
+
+    def GetTweets(self, media_dir: str = None) -> list:
         """Devuelvo una lista de objetos Tweet basados en el contenido 
         de la publicación
-        """
-        if not os.path.exists("temp"):
-            os.mkdir("temp")
 
-        fill = "..."
-        max_chars = 280 - len(fill)
-        tweets = []
-        first_tweet = self.ciudad_fecha + "\n" + self.titulo + \
-            "\nFuente: %s" % (self.url) + \
-            ("", " (ver anexos)")[len(self.anexos) > 0]
-        first_tweet += "\nRecordá que esta cuenta no está afiliada al Municipio!"
-        tweets.append(Tweet(first_tweet))
+        Parámetros
+        ----------
+        media_dir : str
+            Ídem IterTweets.
+        """
+        return list(self.IterTweets(media_dir))
 
-        for text in self.articulos:
-            text = self._FormatText(text)
-            text_sub = textwrap.wrap(text, max_chars)
-            n = len(text_sub)
+    def IterImagenes(self):
+        """Devuelvo un generador con las imágenes de las tablas (una o
+        más por tabla, si se paginan). Si no se generaron todavía, las
+        voy dibujando de a una a medida que se piden, sin guardarlas.
+        """
+        if len(self.imagenes) > 0 or self.render is None:
+            yield from self.imagenes
+        else:
+            for tabla in self.tablas:
+                yield from self.render(tabla)
 
-            for i in range(0, n):
-                if i != n - 1:
-                    text_sub[i] += fill
-                tweets.append(Tweet(text_sub[i], []))
+    def IterTweets(self, media_dir: str = None):
+        """Ídem GetTweets, pero devuelvo un generador: las imágenes de
+        cada tweet se generan recién cuando se pide ese tweet.
 
-        media_filenames = []
-        for i in range(0, len(self.imagenes)):
-            filename = "temp/%s.png" % (self._GetRandomString())
-            with open(filename, "wb") as fp:
-                fp.write(self.imagenes[i])
+        Parámetros
+        ----------
+        media_dir : str
+            Si es None, las imágenes quedan en memoria (Tweet.media). Si
+            no, las escribo en ese directorio (Tweet.media_filenames);
+            borrarlo queda a cargo de quien llama, por ejemplo usando
+            tempfile.TemporaryDirectory.
+        """
+        yield Tweet(self._GetPrimerTexto())
+
+        for text in self._IterTextos():
+            yield Tweet(text, [])
+
+        media = []
+        for i, imagen in enumerate(self.IterImagenes()):
+            if media_dir is not None:
+                filename = os.path.join(media_dir, "%s.%s" % (
+                    self._GetRandomString(), GetImageExtension(imagen)))
+                with open(filename, "wb") as fp:
+                    fp.write(imagen)
+                media.append(filename)
+            else:
+                media.append(imagen)
 
             # Separo cada 4 imágenes, que es el máximo que se puede
             # subir por cada Tweet.
-            media_filenames.append(filename)
             if (i+1) % 4 == 0:
-                tweets.append(Tweet(media_filenames=media_filenames))
-                media_filenames = []
+                yield self._MediaTweet(media, media_dir is not None)
+                media = []
 
-        if len(media_filenames) != 0 and len(media_filenames) % 4 != 0:
+        if len(media) != 0 and len(media) % 4 != 0:
             # El último Tweet tiene menos de 4 imágenes, pero no está
             # vacío.
-            tweets.append(Tweet(media_filenames=media_filenames))
+            yield self._MediaTweet(media, media_dir is not None)
+
+        return
+
+    def _GetPrimerTexto(self) -> str:
+        """Devuelvo el texto del primer tweet: fecha, título y fuente. Si
+        no entra en un tweet (ver GetWeightedLength), acorto el título.
+        """
+        fill = "..."
+        before = self.ciudad_fecha + "\n"
+        after = "\nFuente: %s" % (self.url) + \
+            ("", " (ver anexos)")[len(self.anexos) > 0]
+        after += "\nRecordá que esta cuenta no está afiliada al Municipio!"
+
+        titulo = self.titulo
+        if GetWeightedLength(before + titulo + after) > tweet_max_length:
+            width = tweet_max_length - GetWeightedLength(before + after) - len(fill)
+            parts = WrapWeighted(titulo, width) if width > 0 else []
+            titulo = parts[0] + fill if len(parts) > 0 else ""
+
+        return before + titulo + after
+
+    def _IterTextos(self):
+        """Devuelvo un generador con el texto de cada tweet de los
+        artículos, medido como lo mide Twitter (ver GetWeightedLength).
+
+        Los artículos que no entran en un tweet se dividen, terminando
+        cada parte menos la última con "...". Si self.pack es True, los
+        artículos consecutivos se juntan (separados por un salto de
+        línea) mientras entren en un tweet; un artículo que entra entero
+        en un tweet nunca se corta para aprovechar el espacio que queda
+        en el anterior.
+        """
+        fill = "..."
+        pending = ""
+
+        for text in self.articulos:
+            # Mido el texto como va a quedar: con un espacio entre palabras
+            text = " ".join(self._FormatText(text).split())
+            # Si no entra en un tweet, dejo lugar para el "..." de cada parte
+            width = tweet_max_length
+            if GetWeightedLength(text) > width:
+                width -= len(fill)
+            parts = WrapWeighted(text, width)
+            if len(parts) == 0:
+                continue
+
+            if pending != "":
+                if len(parts) == 1 and GetWeightedLength(
+                        pending + "\n" + parts[0]) <= tweet_max_length:
+                    pending += "\n" + parts[0]
+                    continue
+                yield pending
+                pending = ""
+
+            for part in parts[:-1]:
+                yield part + fill
+            if self.pack:
+                pending = parts[-1]
+            else:
+                yield parts[-1]
+
+        if pending != "":
+            yield pending
+        return
 
-        # os.rmdir("temp")
+    def _MediaTweet(self, media: list, on_disk: bool) -> Tweet:
+        """Armo un Tweet sólo con imágenes.
 
-        return tweets
+        Parámetros
+        ----------
+        media : list
+            Paths o bytes de las imágenes.
+        on_disk : bool
+            True si media contiene paths.
+        """
+        if on_disk:
+            return Tweet(media_filenames=media)
+        return Tweet(media=media)
 
     def _FormatText(self, text: str) -> str:
         """Quito espacios innecesarios y hago un formateo básico del
@@ -109,17 +316,109 @@ class Publicacion:
         return "".join(choices(string.ascii_letters + string.digits, k=10))
 
 
+class BulletinIndexScanner(HTMLParser):
+    """Parser incremental de las páginas índice de SIBOM.
+
+    Sólo presta atención a los div "row bulletin-index": junta su texto
+    y el action de su form, y al cerrarse cada uno lo compara con
+    muni_regex. Se le puede ir pasando el HTML de a pedazos con feed(),
+    y dejar de hacerlo apenas id sea distinto de 0.
+
+    Atributos
+    ---------
+    id : int
+        ID del boletín del municipio buscado, o 0 si todavía no
+        apareció.
+    rows : list[(<str>, <int>)]
+        Texto e ID de boletín de cada div ya leído, en orden. Sirve
+        para buscar varios municipios en una sola pasada.
+    """
+    id = 0
+    rows = []
+
+    def __init__(self, muni_regex: re.Pattern = None) -> None:
+        """
+        Parámetros
+        ----------
+        muni_regex : re.Pattern
+            Expresión regular que identifica al municipio. Si es None,
+            sólo junto rows.
+        """
+        super().__init__()
+        self.muni_regex = muni_regex
+        self.id = 0
+        self.rows = []
+        self._depth = 0
+        self._text = []
+        self._action = None
+        return
+
+    def handle_starttag(self, tag: str, attrs: list) -> None:
+        if self._depth == 0:
+            if tag == "div":
+                classes = (dict(attrs).get("class") or "").split()
+                if "row" in classes and "bulletin-index" in classes:
+                    self._depth = 1
+                    self._text = []
+                    self._action = None
+        elif tag == "div":
+            self._depth += 1
+        elif tag == "form" and self._action is None:
+            self._action = dict(attrs).get("action")
+        return
+
+    def handle_endtag(self, tag: str) -> None:
+        if self._depth > 0 and tag == "div":
+            self._depth -= 1
+            if self._depth == 0 and self._action:
+                text = "".join(self._text)
+                # "/bulletins/(id)" --> (id)
+                id = int(self._action.split("/")[2])
+                self.rows.append((text, id))
+                if self.id == 0 and self.muni_regex is not None:
+                    if self.muni_regex.search(text):
+                        self.id = id
+        return
+
+    def handle_data(self, data: str) -> None:
+        if self._depth > 0:
+            self._text.append(data)
+        return
+
+
 class SIBOM:
     sibom_url = "https://sibom.slyt.gba.gov.ar/bulletins/"
-    img_gen = TableToIMG()
+    img_gen = None
+    http = None
     muni_display = ""
     muni = ""
     tw_handle = ""
     muni_regex = None
+    max_workers = 8
+    cache_path = "cache/http.sqlite3"
+    render_cache_path = "cache/render.sqlite3"
+    stream_index = True
+    stream_chunk_size = 8192
+    html_parser = default_parser
+    targeted_parsing = True
+    img_encoding = "budget"  # Ver TableToIMG.encoding
+    # Las tablas largas se dividen en páginas de hasta este alto (ver
+    # TableToIMG.paginate), en lugar de una sola imagen gigante que
+    # Twitter achica hasta que no se puede leer
+    img_paginate = True
+    img_page_height = 2000
+    # Juntar artículos cortos en un mismo tweet (ver Publicacion.pack)
+    pack_tweets = True
+    render_workers = 0  # Procesos para dibujar tablas (0: secuencial)
+    state = None  # StateStore donde registrar el avance de cada publicación
+    search_index = None  # SearchIndex donde indexar cada publicación parseada
+    cuit_index = None  # CUITIndex donde indexar los CUITs de cada publicación
+    fingerprints = None  # ChangeDetector donde guardar la huella de cada publicación
+    _render_pool = None
     cuit_regex = re.compile(
         r"([23]\d *?- *?\d{7,8} *?- *?\d)", flags=re.I | re.M | re.S)
 
-    def __init__(self, tw_handle: str, muni_display: str, muni_regex: str, font_name: str, logo: str) -> None:
+    def __init__(self, tw_handle: str, muni_display: str, muni_regex: str, font_name: str, logo: str, http: HTTPClient = None) -> None:
         """
         Parámetros
         ----------
@@ -136,68 +435,159 @@ class SIBOM:
             Path a una fuente TrueType a utilizar para las imágenes.
         logo : str
             Path al logo del municipio a utilizar (PNG, 100x100).
+        http : HTTPClient
+            Cliente HTTP a utilizar. Permite que varias instancias
+            compartan el pool de conexiones y el cache. Si es None,
+            creo uno nuevo.
         """
 
         self.tw_handle = tw_handle
         self.muni_display = muni_display
         self.muni_regex = re.compile(muni_regex, re.IGNORECASE)
+        # Cada instancia necesita su propio generador, si no los
+        # footers y logos de distintos municipios se pisan entre sí.
+        self.img_gen = TableToIMG()
         self.img_gen.footer_line_1 = "Twitter: %s (cuenta no afiliada al municipio)" % (
             self.tw_handle)
         self.img_gen.footer_line_2 = "Municipalidad de %s" % (
             self.muni_display)
         self.img_gen.font_name = font_name
         self.img_gen.logo = logo
+        self.img_gen.encoding = self.img_encoding
+        self.img_gen.paginate = self.img_paginate
+        self.img_gen.page_height = self.img_page_height
+        if self.render_cache_path:
+            self.img_gen.render_cache = RenderCache(self.render_cache_path)
+        if http is None:
+            cache = HTTPCache(self.cache_path) if self.cache_path else None
+            http = HTTPClient(pool_size=self.max_workers, cache=cache)
+        self.http = http
 
         return
 
-    def _GetURL(self, url: str, **kwargs) -> BeautifulSoup:
+    def _GetURL(self, url: str, parse_only: SoupStrainer = None, **kwargs) -> BeautifulSoup:
         """Hago el request y devuelvo el objeto parseado por BS
 
         Parámetros
         ----------
         url : str
             URL a la cual acceder
+        parse_only : SoupStrainer
+            Si no es None y targeted_parsing es True, sólo armo el árbol
+            de las partes de la página que coincidan.
         **kwargs
-            Cualquier otro parámetro que se desee pasar a requests.get
+            Parámetros a agregar a la query string.
         """
-        # TODO: Reintentar un par de veces si falla
         parsed = None
-        resp = requests.get(url, kwargs)
-
-        if resp.status_code != 200:
+        # Una vez publicado, el contenido de un decreto no cambia: si
+        # está en el cache no hace falta ni revalidarlo.
+        with metrics.Span("fetch", url=url) as span:
+            text = self.http.GetText(
+                url, params=kwargs, immutable="/contents/" in url)
+            span.Set(bytes=len(text or ""))
+
+        if text is None:
             print("ERROR: No pude acceder a %s" % (url))
         else:
-            parsed = BeautifulSoup(resp.text, features="html.parser")
+            if not self.targeted_parsing:
+                parse_only = None
+            with metrics.Span("parse", url=url, bytes=len(text)):
+                parsed = BeautifulSoup(
+                    text, features=self.html_parser, parse_only=parse_only)
 
         return parsed
 
+    def _GetContenido(self, url: str) -> BeautifulSoup:
+        """Descargo un decreto o resolución, parseando sólo lo que
+        utiliza _ParseContenido.
+
+        Parámetros
+        ----------
+        url : str
+            URL del decreto o resolución.
+        """
+        parsed = self._GetURL(url, parse_only=content_strainer)
+        if parsed and self.state is not None:
+            self.state.SetStage(url, "fetched")
+        return parsed
+
     def GetLatestID(self) -> int:
         """Devuelvo el ID del último boletín oficial dado un municipio.
 
         Si no lo encuentro en las primeras cinco páginas, o no puedo
         acceder por algún motivo, devuelvo 0.
+
+        Si stream_index es True, recorro cada página a medida que se
+        descarga y dejo de leerla apenas encuentro el municipio, en
+        lugar de armar el árbol completo con BeautifulSoup.
         """
         id = 0
 
         for i in range(1, 6):
             url = self.sibom_url + ("", "?page=%s" % (i))[i > 1]
-            parsed = self._GetURL(url)
-
-            if parsed:
-                divs = parsed.find_all(class_="row bulletin-index")
-
-                if divs is not None:
-                    for div in divs:
-                        if self.muni_regex.search(div.text):
-                            # Encontré el div, obtengo el id
-                            id = div.find("form").attrs["action"]
-                            # "/bulletins/(id)" --> (id)
-                            id = int(id.split("/")[2])
-                            break
-                    if id != 0:
+
+            if self.stream_index:
+                id = self._ScanIndexStream(url)
+            else:
+                id = self._ScanIndex(url)
+
+            if id != 0:
+                break
+        return id
+
+    def _ScanIndex(self, url: str) -> int:
+        """Descargo una página índice completa, y devuelvo el ID del
+        boletín del municipio o 0 si no está.
+
+        Parámetros
+        ----------
+        url : str
+            URL de la página índice.
+        """
+        id = 0
+        parsed = self._GetURL(url)
+
+        if parsed:
+            divs = parsed.find_all(class_="row bulletin-index")
+
+            if divs is not None:
+                for div in divs:
+                    if self.muni_regex.search(div.text):
+                        # Encontré el div, obtengo el id
+                        id = div.find("form").attrs["action"]
+                        # "/bulletins/(id)" --> (id)
+                        id = int(id.split("/")[2])
                         break
         return id
 
+    def _ScanIndexStream(self, url: str) -> int:
+        """Ídem _ScanIndex, pero parseando la página a medida que llega
+        y cortando la descarga apenas aparece el municipio.
+
+        Parámetros
+        ----------
+        url : str
+            URL de la página índice.
+        """
+        scanner = BulletinIndexScanner(self.muni_regex)
+        chunks = self.http.IterText(url, chunk_size=self.stream_chunk_size)
+
+        # Descarga y parseo se intercalan, así que los mido juntos
+        with metrics.Span("fetch", url=url, streamed=True) as span:
+            size = 0
+            try:
+                for chunk in chunks:
+                    size += len(chunk)
+                    scanner.feed(chunk)
+                    if scanner.id != 0:
+                        break
+            finally:
+                # Cierra la conexión si no terminé de leer
+                chunks.close()
+            span.Set(bytes=size)
+
+        return scanner.id
+
     def GetAllURLs(self, id: int) -> list:
         """Devuelvo las URL de decretos, resoluciones, etc. de un BO
 
@@ -206,18 +596,64 @@ class SIBOM:
         id : int
             El ID del boletín oficial al que se desea acceder.
         """
-        url = self.sibom_url + "%s?" % (id)
-        urls = []
-        parsed = self._GetURL(url)
+        return list(self.IterURLs(id))
+
+    def IterURLs(self, id: int):
+        """Ídem GetAllURLs, pero devuelvo un generador.
+
+        Parámetros
+        ----------
+        id : int
+            El ID del boletín oficial al que se desea acceder.
+        """
+        parsed = self._GetURL(self.GetBulletinURL(id), parse_only=links_strainer)
 
         if parsed:
-            objs = parsed.find_all("a", class_="content-link")
-            for obj in objs:
-                # "/bulletins/4047/contents/1477570" --> "1477570"
-                bulletin_id = obj.attrs["href"].split("contents/")[1]
-                url = self.sibom_url + "%s/contents/%s" % (id, bulletin_id)
-                urls.append(url)
-        return urls
+            yield from self._ParseURLs(id, parsed)
+        return
+
+    def GetBulletin(self, id: int) -> tuple:
+        """Devuelvo el título de la página de un boletín ("Boletín
+        Oficial Municipal de ...") y las URL de sus publicaciones (ver
+        GetAllURLs). Sirve para saber si un ID es de este municipio.
+
+        Si no pude acceder a la página devuelvo (None, []), y si no
+        encontré el título, ("", URLs).
+
+        Parámetros
+        ----------
+        id : int
+            El ID del boletín oficial al que se desea acceder.
+        """
+        parsed = self._GetURL(self.GetBulletinURL(id), parse_only=bulletin_strainer)
+        if not parsed:
+            return None, []
+
+        title = parsed.find("h2")
+        title = title.get_text(" ", strip=True) if title is not None else ""
+        return title, list(self._ParseURLs(id, parsed))
+
+    def GetBulletinURL(self, id: int) -> str:
+        """Devuelvo la URL de la página de un boletín."""
+        return self.sibom_url + "%s?" % (id)
+
+    def _ParseURLs(self, id: int, parsed: BeautifulSoup):
+        """Devuelvo un generador con las URL de las publicaciones de la
+        página de un boletín ya descargada.
+
+        Parámetros
+        ----------
+        id : int
+            El ID del boletín oficial.
+        parsed : BeautifulSoup
+            Página del boletín.
+        """
+        objs = parsed.find_all("a", class_="content-link")
+        for obj in objs:
+            # "/bulletins/4047/contents/1477570" --> "1477570"
+            bulletin_id = obj.attrs["href"].split("contents/")[1]
+            yield self.sibom_url + "%s/contents/%s" % (id, bulletin_id)
+        return
 
     def ParsePublicacion(self, url: str) -> Publicacion:
         """Accedo a una URL y devuelvo los datos parseados
@@ -227,37 +663,229 @@ class SIBOM:
         url : str
             URL del decreto o resolución requerido.
         """
-        pub = Publicacion()
-        pub.tablas = []
-        parsed = self._GetURL(url)
+        return self._ParseContenido(url, self._GetContenido(url))
 
-        if parsed:
-            pub.titulo = parsed.find(class_="title").text
-            pub.url = url
-            pub.ciudad_fecha = parsed.find(class_="city-and-date").text
+    def ParsePublicaciones(self, urls: list, max_workers: int = None) -> list:
+        """Descargo en paralelo varias URL y devuelvo las publicaciones
+        parseadas, en el mismo orden que urls.
+
+        Sólo las descargas se hacen en paralelo: el parseo y la
+        generación de imágenes siguen siendo secuenciales (img_gen no
+        es thread-safe), pero se van haciendo a medida que llegan las
+        páginas, mientras el resto se sigue descargando.
+
+        Parámetros
+        ----------
+        urls : list
+            URLs de los decretos o resoluciones, tal como las devuelve
+            GetAllURLs.
+        max_workers : int
+            Cantidad máxima de descargas simultáneas. Si es None, uso
+            self.max_workers.
+        """
+        pubs = []
+        for url, parsed in self._IterContenidos(urls, max_workers):
+            pubs.append(self._ParseContenido(url, parsed))
+
+        return pubs
+
+    def IterPublicaciones(self, id: int, urls: list = None, max_workers: int = None):
+        """Devuelvo un generador con las publicaciones de un boletín, en
+        orden, a medida que se van descargando.
 
-            contenido = parsed.find(class_="col-md-9")
+        A diferencia de ParsePublicaciones, las tablas no se dibujan
+        acá: se dibujan recién cuando se piden los tweets con imágenes
+        (ver Publicacion.IterTweets). Así se puede empezar a publicar
+        apenas está lista la primera, y no quedan todas las imágenes en
+        memoria.
 
-            pub.cuits = self.cuit_regex.findall(contenido.text)
-            # pub.tablas = contenido.find_all("table")
-            pub.tablas = contenido.find_all(self._MatchTables)
+        Parámetros
+        ----------
+        id : int
+            El ID del boletín oficial.
+        urls : list
+            Si no es None, sólo proceso estas URLs (por ejemplo, las que
+            quedaron pendientes). Si no, uso IterURLs(id).
+        max_workers : int
+            Ídem ParsePublicaciones.
+        """
+        if urls is None:
+            urls = self.IterURLs(id)
+
+        for url, parsed in self._IterContenidos(urls, max_workers):
+            yield self._ParseContenido(url, parsed, render=False)
 
-            pub.anexos = []
-            for anexo in parsed.find_all(class_="annex-name"):
-                pub.anexos.append(anexo.text)
+        return
+
+    def _IterContenidos(self, urls, max_workers: int = None):
+        """Descargo en paralelo las URLs y devuelvo un generador de
+        (url, página parseada), en el mismo orden que urls.
 
-            for art in contenido.find_all(self._MatchParagraphs, recursive=False):
-                pub.articulos.append(art.text)
+        Nunca tengo más de 2 * max_workers páginas descargadas y sin
+        consumir, para que la memoria no crezca con el tamaño del
+        boletín.
+
+        Parámetros
+        ----------
+        urls : iterable
+            URLs de los decretos o resoluciones.
+        max_workers : int
+            Cantidad máxima de descargas simultáneas. Si es None, uso
+            self.max_workers.
+        """
+        if max_workers is None:
+            max_workers = self.max_workers
+        max_workers = max(max_workers, 1)
+        pending = deque()
+
+        with ThreadPoolExecutor(max_workers=max_workers) as pool:
+            for url in urls:
+                pending.append((url, pool.submit(self._GetContenido, url)))
+                if len(pending) >= 2 * max_workers:
+                    url, future = pending.popleft()
+                    yield url, future.result()
+            while len(pending) > 0:
+                url, future = pending.popleft()
+                yield url, future.result()
+
+        return
+
+    def _ParseContenido(self, url: str, parsed: BeautifulSoup, render: bool = True) -> Publicacion:
+        """Armo la publicación a partir de una página ya descargada.
+
+        Parámetros
+        ----------
+        url : str
+            URL del decreto o resolución.
+        parsed : BeautifulSoup
+            Página devuelta por _GetURL. Si es None, devuelvo una
+            publicación vacía.
+        render : bool
+            Si es False, no dibujo las tablas: dejo en pub.render la
+            función para hacerlo más tarde.
+        """
+        pub = Publicacion()
+        pub.tablas = []
+        pub.pack = self.pack_tweets
+
+        if parsed:
+            with metrics.Span("extract", url=url) as span:
+                pub.titulo = parsed.find(class_="title").text
+                pub.url = url
+                pub.ciudad_fecha = parsed.find(class_="city-and-date").text
+
+                contenido = parsed.find(class_="col-md-9")
+
+                pub.cuits = self.cuit_regex.findall(contenido.text)
+                # pub.tablas = contenido.find_all("table")
+                pub.tablas = contenido.find_all(self._MatchTables)
+
+                pub.anexos = []
+                for anexo in parsed.find_all(class_="annex-name"):
+                    pub.anexos.append(anexo.text)
+
+                for art in contenido.find_all(self._MatchParagraphs, recursive=False):
+                    pub.articulos.append(art.text)
+                span.Set(tables=len(pub.tablas))
+
+            if self.state is not None:
+                self.state.SetStage(url, "parsed")
+            if self.search_index is not None:
+                self.search_index.Add(pub)
+            if self.cuit_index is not None:
+                self.cuit_index.Add(pub)
+            if self.fingerprints is not None:
+                self.fingerprints.Record(pub)
+
+            if not render:
+                pub.render = partial(self._RenderTabla, pub)
+                return pub
 
             self.img_gen.caption = pub.titulo
             self.img_gen.footer_line_3 = "Datos extraídos de SIBOM. Fuente: %s" % (
                 url)
-            for tabla in pub.tablas:
-                pub.imagenes.append(
-                    self.img_gen.GetImage(str(tabla), 1920, 1080))
+            if self.render_workers > 0 and len(pub.tablas) > 1:
+                pub.imagenes = self._RenderParallel(pub.tablas)
+            else:
+                for tabla in pub.tablas:
+                    pub.imagenes.extend(
+                        self.img_gen.GetImages(tabla, 1920, 1080))
+
+            if self.state is not None:
+                self.state.SetStage(url, "rendered")
 
         return pub
 
+    def _RenderTabla(self, pub: Publicacion, tabla: BeautifulSoup):
+        """Dibujo una tabla de una publicación, con el título y la
+        fuente de esa publicación. Devuelvo un generador con los bytes
+        de cada página (ver TableToIMG.IterPages).
+
+        Parámetros
+        ----------
+        pub : Publicacion
+            Publicación a la que pertenece la tabla.
+        tabla : BeautifulSoup
+            Tabla a dibujar.
+        """
+        self.img_gen.caption = pub.titulo
+        self.img_gen.footer_line_3 = "Datos extraídos de SIBOM. Fuente: %s" % (
+            pub.url)
+        yield from self.img_gen.IterPages(tabla, 1920, 1080)
+
+    def _RenderParallel(self, tablas: list) -> list:
+        """Genero las imágenes de varias tablas en un pool de procesos
+        y devuelvo los bytes en el mismo orden (todas las páginas de una
+        tabla antes que las de la siguiente).
+
+        Como el dibujo y la codificación del PNG usan CPU, con varios
+        procesos se aprovechan todos los núcleos. El pool se crea la
+        primera vez y se reutiliza hasta llamar a Close.
+
+        Parámetros
+        ----------
+        tablas : list
+            Tablas (tags de BeautifulSoup) a dibujar.
+        """
+        if self._render_pool is None:
+            self._render_pool = ProcessPoolExecutor(
+                max_workers=self.render_workers, initializer=InitRenderWorker,
+                initargs=(metrics.enabled,))
+
+        style = self.img_gen.GetStyle()
+        cache = self.img_gen.render_cache
+        paginas = [None] * len(tablas)
+        keys = [None] * len(tablas)
+        futures = {}
+
+        for i, tabla in enumerate(tablas):
+            if cache is not None:
+                keys[i] = self.img_gen.GetRenderKey(tabla, 1920, 1080)
+                paginas[i] = self.img_gen.GetCachedImages(keys[i])
+            if paginas[i] is None:
+                futures[i] = self._render_pool.submit(
+                    RenderTableInWorker, str(tabla), 1920, 1080, style)
+
+        # Las etapas de cada tabla se miden en los otros procesos, que
+        # me devuelven los eventos para registrarlos acá
+        with metrics.Span("table_render", tables=len(futures)) as span:
+            for i, future in futures.items():
+                paginas[i], events = future.result()
+                for stage, seconds, fields in events:
+                    metrics.Record(stage, seconds, **fields)
+                if cache is not None:
+                    self.img_gen.PutCachedImages(keys[i], paginas[i])
+            span.Set(bytes=sum(len(data) for i in futures for data in paginas[i]))
+
+        return [data for imagenes in paginas for data in imagenes]
+
+    def Close(self) -> None:
+        """Libero el pool de procesos de _RenderParallel, si existe."""
+        if self._render_pool is not None:
+            self._render_pool.shutdown()
+            self._render_pool = None
+        return
+
     def _MatchParagraphs(self, tag: BeautifulSoup) -> bool:
         """Devuelvo True si un tag HTML corresponde a un artículo de una
         resolución o decreto. Utilizado con BeautifulSoup.
@@ -318,7 +946,7 @@ if __name__ == "__main__":
         for url in urls:
             print("\t" + url)
             pub = s.ParsePublicacion(url)
-            tweets = pub.GetTweets()
+            tweets = pub.GetTweets(media_dir=str(id))
             filename = pub.titulo.replace("/", "")
             with open("%s/%s.txt" % (id, filename), "wt") as fp:
                 for tw in tweets:
@@ -327,24 +955,3 @@ if __name__ == "__main__":
                     if len(tw.media_filenames) > 0:
                         fp.write(str(tw.media_filenames) +
                                  "\n" + "-" * 20 + "\n")
-
-    # for id in [3987]:  # [3970,3987,4009,4012,4016,4047]:
-    #     print("Procesando %s..." % id)
-
-    #     urls = s.GetAllURLs(id)
-
-    #     if not os.path.exists(str(id)):
-    #         os.mkdir(str(id))
-
-    #     for url in urls:
-    #         print("\t" + url)
-    #         pub = s.ParsePublicacion(url)
-    #         tweets = pub.GetTweets()
-    #         filename = pub.titulo.replace("/", "")
-    #         with open("%s/%s.txt" % (id, filename), "wt") as fp:
-    #             for tw in tweets:
-    #                 if len(tw.content) > 0:
-    #                     fp.write(tw.content + "\n" + "-" * 20 + "\n")
-    #                 if len(tw.media_filenames) > 0:
-    #                     fp.write(str(tw.media_filenames) +
-    #                              "\n" + "-" * 20 + "\n")
@@ -0,0 +1,134 @@
+import os
+import sqlite3
+import threading
+import time
+
+
+class SQLiteLRU:
+    """Base de los caches persistentes en SQLite (HTTPCache y
+    RenderCache): una tabla con una clave, el tamaño de cada entrada y
+    cuándo se usó por última vez. Cuando se supera max_bytes elimino las
+    entradas usadas hace más tiempo (LRU).
+
+    Las subclases definen table, key y columns (sin size ni last_used,
+    que agrego yo), y llaman a _Touch al encontrar una entrada y a
+    _Evict después de guardar una.
+
+    Atributos
+    ---------
+    path : str
+        Path al archivo SQLite. Se crea el directorio si no existe.
+    max_bytes : int
+        Tamaño máximo, en bytes, de la suma de las entradas guardadas.
+    touch_interval : float
+        Segundos que tienen que pasar para volver a actualizar cuándo
+        se usó una entrada. Para elegir qué eliminar alcanza con saber
+        el día, y así la mayoría de las búsquedas no escriben nada.
+    hits, misses : int
+        Cantidad de búsquedas que encontraron (o no) la entrada.
+    evictions : int
+        Cantidad de entradas eliminadas para respetar max_bytes.
+    """
+    path = ""
+    max_bytes = 256 * 1024 * 1024
+    touch_interval = 24 * 60 * 60
+    table = ""
+    key = ""
+    columns = ""
+    hits = 0
+    misses = 0
+    evictions = 0
+
+    def __init__(self, path: str, max_bytes: int = None) -> None:
+        """
+        Parámetros
+        ----------
+        path : str
+            Path al archivo SQLite.
+        max_bytes : int
+            Si no es None, reemplaza el valor por defecto de max_bytes.
+        """
+        self.path = path
+        if max_bytes is not None:
+            self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+        directory = os.path.dirname(path)
+        if directory and not os.path.exists(directory):
+            os.makedirs(directory)
+
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS %s (%s, size INTEGER NOT NULL, "
+            "last_used REAL NOT NULL)" % (self.table, self.columns))
+        self._db.execute(
+            "CREATE INDEX IF NOT EXISTS %s_last_used ON %s (last_used)" % (
+                self.table, self.table))
+        self._db.commit()
+
+        return
+
+    def GetStats(self) -> dict:
+        """Devuelvo los contadores y el tamaño actual del cache."""
+        with self._lock:
+            count, size = self._db.execute(
+                "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM %s" % (
+                    self.table)).fetchone()
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "entries": count,
+            "bytes": size
+        }
+
+    def Size(self) -> int:
+        """Devuelvo el tamaño total, en bytes, de lo guardado."""
+        return self.GetStats()["bytes"]
+
+    def Close(self) -> None:
+        """Cierro la base de datos."""
+        with self._lock:
+            self._db.close()
+        return
+
+    def _Touch(self, key: str, last_used: float) -> None:
+        """Marco una entrada como usada recientemente, si la última vez
+        fue hace más de touch_interval. Asume que se tiene self._lock.
+        """
+        now = time.time()
+        if now - last_used < self.touch_interval:
+            return
+        self._db.execute(
+            "UPDATE %s SET last_used = ? WHERE %s = ?" % (self.table, self.key),
+            (now, key))
+        self._db.commit()
+        return
+
+    def _Evict(self) -> None:
+        """Elimino las entradas usadas hace más tiempo hasta que el
+        tamaño total no supere max_bytes. Asume que se tiene self._lock.
+        """
+        total = self._db.execute(
+            "SELECT COALESCE(SUM(size), 0) FROM %s" % (self.table)).fetchone()[0]
+        if total <= self.max_bytes:
+            return
+
+        rows = self._db.execute(
+            "SELECT %s, size FROM %s ORDER BY last_used" % (
+                self.key, self.table)).fetchall()
+        evicted = []
+        for key, size in rows:
+            if total <= self.max_bytes:
+                break
+            evicted.append((key,))
+            total -= size
+
+        self._db.executemany(
+            "DELETE FROM %s WHERE %s = ?" % (self.table, self.key), evicted)
+        self.evictions += len(evicted)
+        return
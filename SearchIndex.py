@@ -0,0 +1,230 @@
+"""Índice de búsqueda de texto completo sobre las publicaciones.
+
+Uso:
+    python SearchIndex.py "texto a buscar" [--limit N] [--db search.sqlite3]
+    python SearchIndex.py --import backfill/publicaciones.jsonl.gz
+
+La consulta usa la sintaxis de FTS5 de SQLite: varias palabras tienen
+que aparecer todas, "entre comillas" busca la frase, OR y NOT combinan,
+prefijo* busca por prefijo y titulo:decreto limita a un campo (titulo,
+ciudad_fecha, articulos o anexos). No distingue mayúsculas ni acentos.
+"""
+import argparse
+import os
+import re
+import sqlite3
+import threading
+import time
+
+
+class SearchIndex:
+    """Índice de texto completo (SQLite FTS5) de las publicaciones
+    parseadas, para buscar sin volver a descargar nada.
+
+    Se indexan titulo, ciudad_fecha, articulos y anexos. El tokenizer
+    ignora los acentos, como SIBOM.muni_regex ("pueyrredon" encuentra
+    "Pueyrredón"). Cada publicación se identifica por su content ID, así
+    que volver a indexarla reemplaza la versión anterior.
+
+    Atributos
+    ---------
+    fields : tuple
+        Campos de texto indexados, en el orden de la tabla.
+    snippet_tokens : int
+        Cantidad aproximada de palabras de cada fragmento de resultado.
+    batch_size : int
+        Cantidad de publicaciones por transacción en AddRecords.
+    """
+    fields = ("titulo", "ciudad_fecha", "articulos", "anexos")
+    snippet_tokens = 16
+    batch_size = 1000
+
+    def __init__(self, path: str) -> None:
+        """
+        Parámetros
+        ----------
+        path : str
+            Path al archivo SQLite. Se crea el directorio si no existe.
+        """
+        directory = os.path.dirname(path)
+        if directory and not os.path.exists(directory):
+            os.makedirs(directory)
+
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        # remove_diacritics 2 también saca los acentos de letras que
+        # Unicode descompone en más de un carácter. El índice de prefijos
+        # de 2 y 3 letras evita recorrer todo el vocabulario en
+        # búsquedas como "lic*".
+        self._db.execute(
+            "CREATE VIRTUAL TABLE IF NOT EXISTS publications USING fts5("
+            "url UNINDEXED, bulletin_id UNINDEXED, indexed_at UNINDEXED, "
+            "%s, prefix = '2 3', tokenize = 'unicode61 remove_diacritics 2')" % (
+                ", ".join(self.fields)))
+        self._db.commit()
+        return
+
+    def Add(self, pub) -> None:
+        """Indexo una publicación (o la reemplazo si ya estaba). Las
+        publicaciones vacías (que no se pudieron descargar) se ignoran.
+
+        Parámetros
+        ----------
+        pub : Publicacion
+            Publicación tal como la devuelve SIBOM.ParsePublicacion.
+        """
+        if pub.url == "":
+            return
+        self.AddRecords([{"url": pub.url, "titulo": pub.titulo,
+                          "ciudad_fecha": pub.ciudad_fecha,
+                          "articulos": pub.articulos, "anexos": pub.anexos}])
+        return
+
+    def AddRecords(self, records) -> int:
+        """Indexo varias publicaciones en una sola transacción y devuelvo
+        cuántas indexé. Hago un commit cada batch_size publicaciones,
+        para no tener todo el archivo en memoria.
+
+        Parámetros
+        ----------
+        records : iterable
+            Dicts con url, titulo, ciudad_fecha, articulos y anexos (las
+            dos últimas, listas de str), como los de BackfillArchive.
+        """
+        count = 0
+        rows = []
+        now = time.time()
+        for record in records:
+            rows.append((self.GetContentID(record["url"]), record["url"],
+                         self.GetBulletinID(record["url"]), now,
+                         record["titulo"], record["ciudad_fecha"],
+                         "\n".join(record["articulos"]),
+                         "\n".join(record["anexos"])))
+            if len(rows) >= self.batch_size:
+                count += self._Insert(rows)
+                rows = []
+        return count + self._Insert(rows)
+
+    def _Insert(self, rows: list) -> int:
+        """Inserto (o reemplazo) filas ya armadas y devuelvo cuántas
+        publicaciones distintas indexé. Si una publicación aparece más de
+        una vez, vale la última.
+        """
+        unique = list({row[0]: row for row in rows}.values())
+        with self._lock:
+            try:
+                # FTS5 no admite INSERT OR REPLACE con rowid explícito
+                self._db.executemany(
+                    "DELETE FROM publications WHERE rowid = ?",
+                    [(row[0],) for row in unique])
+                self._db.executemany(
+                    "INSERT INTO publications (rowid, url, bulletin_id, indexed_at, "
+                    "%s) VALUES (?, ?, ?, ?, ?, ?, ?, ?)" % (", ".join(self.fields)),
+                    unique)
+                self._db.commit()
+            except sqlite3.Error:
+                # No dejo la transacción abierta con el grupo a medias
+                self._db.rollback()
+                raise
+        return len(unique)
+
+    def Remove(self, url: str) -> None:
+        """Saco una publicación del índice, por ejemplo si SIBOM la
+        quitó del boletín.
+        """
+        with self._lock:
+            self._db.execute("DELETE FROM publications WHERE rowid = ?",
+                             (self.GetContentID(url),))
+            self._db.commit()
+        return
+
+    def Search(self, query: str, limit: int = 20) -> list:
+        """Devuelvo las publicaciones que coinciden con la consulta,
+        de la más a la menos relevante.
+
+        Cada resultado es un dict con url, bulletin_id, titulo,
+        ciudad_fecha y snippet (el fragmento donde aparece la consulta,
+        con las coincidencias entre [corchetes]).
+
+        Parámetros
+        ----------
+        query : str
+            Consulta en la sintaxis de FTS5. Si no es válida (por
+            ejemplo, "S.A." o "ruta 2-88"), busco cada palabra tal cual.
+        limit : int
+            Cantidad máxima de resultados.
+        """
+        sql = ("SELECT url, bulletin_id, titulo, ciudad_fecha, "
+               "snippet(publications, -1, '[', ']', '…', %s) FROM publications "
+               "WHERE publications MATCH ? ORDER BY rank LIMIT ?" % (
+                   self.snippet_tokens))
+        if query.strip() == "":
+            return []
+
+        with self._lock:
+            try:
+                rows = self._db.execute(sql, (query, limit)).fetchall()
+            except sqlite3.OperationalError:
+                rows = self._db.execute(
+                    sql, (self.QuoteQuery(query), limit)).fetchall()
+
+        return [{"url": url, "bulletin_id": bulletin_id, "titulo": titulo,
+                 "ciudad_fecha": ciudad_fecha, "snippet": snippet}
+                for url, bulletin_id, titulo, ciudad_fecha, snippet in rows]
+
+    def GetCount(self) -> int:
+        """Devuelvo la cantidad de publicaciones indexadas."""
+        with self._lock:
+            row = self._db.execute("SELECT COUNT(*) FROM publications").fetchone()
+        return row[0]
+
+    def Close(self) -> None:
+        """Cierro la base de datos."""
+        with self._lock:
+            self._db.close()
+        return
+
+    @staticmethod
+    def QuoteQuery(query: str) -> str:
+        """'Pérez S.A.' --> '"Pérez" "S.A."'"""
+        return " ".join('"%s"' % (term.replace('"', '""'))
+                        for term in query.split())
+
+    @staticmethod
+    def GetContentID(url: str) -> int:
+        """"/bulletins/4047/contents/1477570" --> 1477570"""
+        return int(url.rstrip("/").split("contents/")[1])
+
+    @staticmethod
+    def GetBulletinID(url: str) -> int:
+        """"/bulletins/4047/contents/1477570" --> 4047"""
+        return int(re.search(r"(\d+)/contents/", url).group(1))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("query", nargs="?", help="Consulta (ver sintaxis arriba)")
+    parser.add_argument("--db", default="search.sqlite3")
+    parser.add_argument("--limit", type=int, default=20)
+    parser.add_argument("--import", dest="archive",
+                        help="Indexar las publicaciones de un archivo de Backfill.py")
+    args = parser.parse_args()
+
+    index = SearchIndex(args.db)
+
+    if args.archive:
+        from Backfill import BackfillArchive
+        count = index.AddRecords(BackfillArchive(args.archive, read_only=True).Read())
+        print("Indexé %s publicaciones (%s en total)." % (count, index.GetCount()))
+
+    if args.query:
+        start = time.perf_counter()
+        results = index.Search(args.query, args.limit)
+        for result in results:
+            print("%s\n%s\n%s\n" % (result["titulo"], result["url"], result["snippet"]))
+        print("%s resultados en %.1f ms" % (
+            len(results), (time.perf_counter() - start) * 1000))
+
+    index.Close()
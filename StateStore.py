@@ -0,0 +1,291 @@
+import os
+import sqlite3
+import threading
+import time
+
+
+class StateStore:
+    """Guarda el avance del bot en SQLite, para poder retomar un
+    boletín exactamente donde quedó si el proceso se interrumpe.
+
+    De cada boletín guardo si ya se terminó de publicar; de cada
+    publicación (identificada por su content ID de SIBOM), la última
+    etapa alcanzada y si sus artículos se juntan en los tweets (ver
+    Publicacion.pack); de cada tweet enviado, su posición dentro del
+    hilo y el ID de estado que devolvió Twitter; y de cada tweet (o
+    descarga) que falló, cuántas veces falló y si se decidió saltearlo.
+
+    Atributos
+    ---------
+    stages : tuple
+        Etapas posibles de una publicación, en orden.
+    """
+    stages = ("pending", "fetched", "parsed", "rendered", "done")
+
+    def __init__(self, path: str) -> None:
+        """
+        Parámetros
+        ----------
+        path : str
+            Path al archivo SQLite. Se crea el directorio si no existe.
+        """
+        directory = os.path.dirname(path)
+        if directory and not os.path.exists(directory):
+            os.makedirs(directory)
+
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        # Con WAL, NORMAL no pierde consistencia ante un corte, y evita
+        # un fsync por cada tweet.
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.executescript(
+            "CREATE TABLE IF NOT EXISTS bulletins ("
+            "muni TEXT NOT NULL, bulletin_id INTEGER NOT NULL, "
+            "done INTEGER NOT NULL DEFAULT 0, started_at REAL, "
+            "finished_at REAL, PRIMARY KEY (muni, bulletin_id));"
+            "CREATE TABLE IF NOT EXISTS contents ("
+            "content_id INTEGER PRIMARY KEY, bulletin_id INTEGER NOT NULL, "
+            "position INTEGER NOT NULL, url TEXT NOT NULL, "
+            "stage TEXT NOT NULL, updated_at REAL, packed INTEGER);"
+            "CREATE INDEX IF NOT EXISTS contents_bulletin "
+            "ON contents (bulletin_id, position);"
+            "CREATE TABLE IF NOT EXISTS tweets ("
+            "content_id INTEGER NOT NULL, position INTEGER NOT NULL, "
+            "status_id INTEGER NOT NULL, posted_at REAL, "
+            "PRIMARY KEY (content_id, position));"
+            "CREATE TABLE IF NOT EXISTS failures ("
+            "content_id INTEGER NOT NULL, position INTEGER NOT NULL, "
+            "attempts INTEGER NOT NULL, skipped INTEGER NOT NULL DEFAULT 0, "
+            "last_error TEXT, failed_at REAL, PRIMARY KEY (content_id, position));")
+        # Las bases creadas antes de Publicacion.pack no tienen la columna
+        columns = [row[1] for row in self._db.execute("PRAGMA table_info(contents)")]
+        if "packed" not in columns:
+            self._db.execute("ALTER TABLE contents ADD COLUMN packed INTEGER")
+        self._db.commit()
+
+        return
+
+    def GetLastBulletin(self, muni: str) -> int:
+        """Devuelvo el ID del último boletín empezado para un municipio,
+        o 0 si no hay ninguno.
+
+        Parámetros
+        ----------
+        muni : str
+            Nombre del municipio (SIBOM.muni_display).
+        """
+        with self._lock:
+            row = self._db.execute(
+                "SELECT MAX(bulletin_id) FROM bulletins WHERE muni = ?",
+                (muni,)).fetchone()
+        return row[0] or 0
+
+    def IsBulletinDone(self, muni: str, bulletin_id: int) -> bool:
+        """Devuelvo True si el boletín ya se terminó de publicar."""
+        with self._lock:
+            row = self._db.execute(
+                "SELECT done FROM bulletins WHERE muni = ? AND bulletin_id = ?",
+                (muni, bulletin_id)).fetchone()
+        return row is not None and row[0] == 1
+
+    def StartBulletin(self, muni: str, bulletin_id: int, urls: list) -> None:
+        """Registro un boletín y sus publicaciones. Si ya estaba
+        registrado no modifico el avance guardado.
+
+        Parámetros
+        ----------
+        muni : str
+            Nombre del municipio.
+        bulletin_id : int
+            ID del boletín.
+        urls : list
+            URLs de las publicaciones, tal como las devuelve
+            GetAllURLs.
+        """
+        now = time.time()
+        with self._lock:
+            self._db.execute(
+                "INSERT OR IGNORE INTO bulletins (muni, bulletin_id, started_at) "
+                "VALUES (?, ?, ?)", (muni, bulletin_id, now))
+            self._db.executemany(
+                "INSERT OR IGNORE INTO contents (content_id, bulletin_id, position, "
+                "url, stage, updated_at) VALUES (?, ?, ?, ?, 'pending', ?)",
+                [(self.GetContentID(url), bulletin_id, i, url, now)
+                 for i, url in enumerate(urls)])
+            self._db.commit()
+        return
+
+    def FinishBulletin(self, muni: str, bulletin_id: int, done: bool = True) -> None:
+        """Marco un boletín como terminado. Si el boletín no estaba
+        registrado, lo registro (sirve para importar el viejo archivo
+        "id").
+        """
+        now = time.time()
+        with self._lock:
+            self._db.execute(
+                "INSERT OR IGNORE INTO bulletins (muni, bulletin_id, started_at) "
+                "VALUES (?, ?, ?)", (muni, bulletin_id, now))
+            self._db.execute(
+                "UPDATE bulletins SET done = ?, finished_at = ? "
+                "WHERE muni = ? AND bulletin_id = ?",
+                (int(done), now, muni, bulletin_id))
+            self._db.commit()
+        return
+
+    def GetPendingURLs(self, bulletin_id: int) -> list:
+        """Devuelvo, en orden, las URLs de las publicaciones del boletín
+        que todavía no se terminaron de publicar.
+        """
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT url FROM contents WHERE bulletin_id = ? "
+                "AND stage != 'done' ORDER BY position",
+                (bulletin_id,)).fetchall()
+        return [row[0] for row in rows]
+
+    def GetStage(self, url: str) -> str:
+        """Devuelvo la etapa de una publicación, o None si no está
+        registrada.
+        """
+        with self._lock:
+            row = self._db.execute(
+                "SELECT stage FROM contents WHERE content_id = ?",
+                (self.GetContentID(url),)).fetchone()
+        return row[0] if row is not None else None
+
+    def SetStage(self, url: str, stage: str) -> None:
+        """Actualizo la etapa de una publicación. Nunca retrocedo: si ya
+        estaba en una etapa posterior, la dejo como está.
+
+        Parámetros
+        ----------
+        url : str
+            URL de la publicación.
+        stage : str
+            Una de las etapas de self.stages.
+        """
+        order = self.stages.index(stage)
+        with self._lock:
+            row = self._db.execute(
+                "SELECT stage FROM contents WHERE content_id = ?",
+                (self.GetContentID(url),)).fetchone()
+            if row is not None and self.stages.index(row[0]) < order:
+                self._db.execute(
+                    "UPDATE contents SET stage = ?, updated_at = ? "
+                    "WHERE content_id = ?",
+                    (stage, time.time(), self.GetContentID(url)))
+                self._db.commit()
+        return
+
+    def GetPacked(self, url: str) -> bool:
+        """Devuelvo True si los tweets de la publicación se armaron
+        juntando artículos, False si no, o None si no lo registré.
+        """
+        with self._lock:
+            row = self._db.execute(
+                "SELECT packed FROM contents WHERE content_id = ?",
+                (self.GetContentID(url),)).fetchone()
+        return bool(row[0]) if row is not None and row[0] is not None else None
+
+    def SetPacked(self, url: str, packed: bool) -> None:
+        """Registro si los tweets de la publicación se arman juntando
+        artículos, para retomar el hilo de la misma forma.
+        """
+        with self._lock:
+            self._db.execute(
+                "UPDATE contents SET packed = ? WHERE content_id = ?",
+                (int(packed), self.GetContentID(url)))
+            self._db.commit()
+        return
+
+    def GetPostedTweets(self, url: str) -> dict:
+        """Devuelvo un dict {posición en el hilo: status ID} con los
+        tweets ya enviados de una publicación.
+        """
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT position, status_id FROM tweets WHERE content_id = ?",
+                (self.GetContentID(url),)).fetchall()
+        return dict(rows)
+
+    def RecordTweet(self, url: str, position: int, status_id: int) -> None:
+        """Registro un tweet enviado.
+
+        Parámetros
+        ----------
+        url : str
+            URL de la publicación a la que pertenece el tweet.
+        position : int
+            Posición del tweet dentro del hilo (empieza en 0).
+        status_id : int
+            ID devuelto por Twitter.
+        """
+        with self._lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO tweets VALUES (?, ?, ?, ?)",
+                (self.GetContentID(url), position, status_id, time.time()))
+            self._db.commit()
+        return
+
+    def RecordFailure(self, url: str, position: int, error: str) -> int:
+        """Registro un intento fallido y devuelvo cuántas veces falló.
+
+        Parámetros
+        ----------
+        url : str
+            URL de la publicación.
+        position : int
+            Posición del tweet dentro del hilo, o -1 si lo que falló fue
+            la descarga de la publicación.
+        error : str
+            Descripción del error.
+        """
+        content_id = self.GetContentID(url)
+        with self._lock:
+            self._db.execute(
+                "INSERT INTO failures (content_id, position, attempts, last_error, "
+                "failed_at) VALUES (?, ?, 1, ?, ?) ON CONFLICT (content_id, position) "
+                "DO UPDATE SET attempts = attempts + 1, last_error = excluded.last_error, "
+                "failed_at = excluded.failed_at",
+                (content_id, position, error, time.time()))
+            row = self._db.execute(
+                "SELECT attempts FROM failures WHERE content_id = ? AND position = ?",
+                (content_id, position)).fetchone()
+            self._db.commit()
+        return row[0]
+
+    def SkipTweet(self, url: str, position: int) -> None:
+        """Marco un tweet que falló como salteado: no se vuelve a
+        intentar.
+        """
+        with self._lock:
+            self._db.execute(
+                "UPDATE failures SET skipped = 1 WHERE content_id = ? AND position = ?",
+                (self.GetContentID(url), position))
+            self._db.commit()
+        return
+
+    def GetSkippedTweets(self, url: str) -> set:
+        """Devuelvo las posiciones de los tweets salteados de una
+        publicación.
+        """
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT position FROM failures WHERE content_id = ? AND skipped = 1",
+                (self.GetContentID(url),)).fetchall()
+        return {row[0] for row in rows}
+
+    def Close(self) -> None:
+        """Cierro la base de datos."""
+        with self._lock:
+            self._db.close()
+        return
+
+    @staticmethod
+    def GetContentID(url: str) -> int:
+        """Devuelvo el content ID de una URL de SIBOM.
+
+        "/bulletins/4047/contents/1477570" --> 1477570
+        """
+        return int(url.rstrip("/").split("contents/")[1])
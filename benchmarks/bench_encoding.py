@@ -0,0 +1,43 @@
+"""Compara tiempo de codificación y tamaño de cada perfil de
+TableToIMG.encoding_profiles.
+
+Uso: python benchmarks/bench_encoding.py fuente.ttf [filas ...]
+"""
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+from HTMLtoImg import TableToIMG  # noqa: E402
+
+
+def Tabla(filas: int) -> str:
+    """Devuelvo una tabla inventada con la cantidad de filas pedida."""
+    html = "<table><tr><th>Item</th><th>Proveedor</th><th>CUIT</th><th>Monto</th></tr>"
+    for i in range(0, filas):
+        html += "<tr><td>%s</td><td>Proveedor %s SRL, con domicilio en calle %s</td>" \
+                "<td>20-%08d-%s</td><td>$ %s,00</td></tr>" % (
+                    i, i, i * 7, i * 1234, i % 10, i * 1500)
+    return html + "</table>"
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2:
+        print(__doc__)
+        exit(1)
+
+    t = TableToIMG()
+    t.font_name = sys.argv[1]
+    t.caption = "Benchmark"
+    filas = [int(f) for f in sys.argv[2:]] or [20, 200]
+
+    for n in filas:
+        t.GetImage(Tabla(n), 1920, 1080)
+        img = t.img
+        print("%s filas (%sx%s)" % (n, img.width, img.height))
+        for profile in list(t.encoding_profiles) + ["budget"]:
+            t.encoding = profile
+            start = time.perf_counter()
+            data = t._Encode(img)
+            ms = (time.perf_counter() - start) * 1000
+            print("\t%-15s %10s bytes %8.1f ms" % (profile, len(data), ms))
@@ -0,0 +1,80 @@
+"""Compara el manejo de las imágenes de los tweets: escribirlas en
+temp/ para que tweepy las vuelva a leer (como se hacía antes) contra
+subirlas directamente desde memoria.
+
+Uso: python benchmarks/bench_media.py [cantidad de imágenes]
+
+Mide bytes escritos y leídos, y cantidad de syscalls de lectura y
+escritura, usando /proc/self/io (sólo Linux).
+"""
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+from FakeTwitter import FakeTwitterAPI  # noqa: E402
+from MediaUploader import MediaUploader  # noqa: E402
+from SIBOM import Publicacion  # noqa: E402
+
+
+def LeerIO() -> dict:
+    """Devuelvo los contadores de /proc/self/io."""
+    contadores = {}
+    with open("/proc/self/io", "rt") as fp:
+        for line in fp:
+            key, value = line.split(":")
+            contadores[key] = int(value)
+    return contadores
+
+
+def Publicar(pub: Publicacion, media_dir: str) -> int:
+    """Armo los tweets y subo sus imágenes. Devuelvo la cantidad de
+    imágenes subidas.
+    """
+    api = FakeTwitterAPI()
+    uploader = MediaUploader(api)
+    for tweet in pub.IterTweets(media_dir):
+        uploader.Result(uploader.Submit(tweet.GetMedia()))
+    uploader.Close()
+    return len(api.uploads)
+
+
+def Medir(pub: Publicacion, media_dir: str) -> dict:
+    """Devuelvo la diferencia de los contadores de E/S al publicar."""
+    antes = LeerIO()
+    start = time.perf_counter()
+    n = Publicar(pub, media_dir)
+    ms = (time.perf_counter() - start) * 1000
+    despues = LeerIO()
+    res = {key: despues[key] - antes[key] for key in antes}
+    res["imágenes"] = n
+    res["ms"] = round(ms, 1)
+    return res
+
+
+if __name__ == "__main__":
+    if not os.path.exists("/proc/self/io"):
+        print("Necesito /proc/self/io (Linux)")
+        exit(1)
+
+    cantidad = int(sys.argv[1]) if len(sys.argv) > 1 else 16
+    pub = Publicacion()
+    pub.url = "https://sibom.slyt.gba.gov.ar/bulletins/1/contents/1"
+    # Imágenes de 500 KB, parecido a una tabla de 1920x1080
+    pub.imagenes = [b"\x89PNG" + os.urandom(500 * 1024) for _ in range(0, cantidad)]
+
+    directorio = tempfile.mkdtemp()
+    try:
+        disco = Medir(pub, directorio)
+        uso = sum(os.path.getsize(os.path.join(directorio, f))
+                  for f in os.listdir(directorio))
+    finally:
+        shutil.rmtree(directorio)
+    memoria = Medir(pub, None)
+
+    print("%-28s %14s %14s" % ("", "temp/ (antes)", "en memoria"))
+    for key in ("imágenes", "wchar", "rchar", "syscw", "syscr", "ms"):
+        print("%-28s %14s %14s" % (key, disco[key], memoria[key]))
+    print("%-28s %14s %14s" % ("uso de disco (bytes)", uso, 0))
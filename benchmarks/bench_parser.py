@@ -0,0 +1,94 @@
+"""Compara el parseo de un decreto con html.parser (como se hacía antes)
+contra el parser configurable con parseo dirigido.
+
+Uso: python benchmarks/bench_parser.py [archivo.html ...]
+
+Si no se pasan archivos, genero un decreto sintético con navegación,
+artículos y tablas anidadas parecido a los de SIBOM.
+"""
+import os
+import sys
+import time
+from bs4 import BeautifulSoup
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+from SIBOM import SIBOM, content_strainer  # noqa: E402
+
+
+def PaginaSintetica(articulos: int = 40, tablas: int = 6, filas: int = 30) -> str:
+    """Devuelvo el HTML de un decreto inventado."""
+    nav = "".join('<li><a href="/bulletins/?page=%s">Página %s</a></li>' % (i, i)
+                  for i in range(0, 300))
+    arts = "".join("<p>Artículo %sº.- Apruébase lo actuado en el expediente "
+                   "N° %s-2026, CUIT 20-12345678-9. %s</p>" % (i, i, "Texto " * 40)
+                   for i in range(1, articulos + 1))
+    filas_html = "".join("<tr><td>Item %s</td><td>Proveedor %s SRL</td>"
+                         "<td>$ %s,00</td></tr>" % (i, i, i * 1000)
+                         for i in range(0, filas))
+    tabla = "<table><tr><td><table><tr><th>Item</th><th>Proveedor</th>" \
+            "<th>Monto</th></tr>%s</table></td></tr></table>" % (filas_html)
+    return "<html><head><title>SIBOM</title></head><body><nav><ul>%s</ul></nav>" \
+           '<div class="row"><div class="col-md-3"><ul>%s</ul></div>' \
+           '<div class="title">Decreto 123/2026</div>' \
+           '<div class="city-and-date">General Pueyrredón, 1 de marzo de 2026</div>' \
+           '<div class="col-md-9">%s%s</div>' \
+           '<div class="annex-name">Anexo I</div></div><footer>%s</footer>' \
+           "</body></html>" % (nav, nav, arts, tabla * tablas, nav)
+
+
+def Extraer(parsed: BeautifulSoup, reparse: bool) -> int:
+    """Hago lo mismo que _ParseContenido, salvo dibujar las tablas.
+    Devuelvo la cantidad de filas de tablas encontradas.
+    """
+    parsed.find(class_="title").text
+    parsed.find(class_="city-and-date").text
+    contenido = parsed.find(class_="col-md-9")
+    SIBOM.cuit_regex.findall(contenido.text)
+    [a.text for a in parsed.find_all(class_="annex-name")]
+    [a.text for a in contenido.find_all(
+        lambda t: SIBOM._MatchParagraphs(None, t), recursive=False)]
+
+    filas = 0
+    for tabla in contenido.find_all(lambda t: SIBOM._MatchTables(None, t)):
+        if reparse:
+            # Así lo recibía antes TableToIMG
+            tabla = BeautifulSoup(str(tabla), features="html.parser")
+        filas += len(tabla.find_all("tr"))
+    return filas
+
+
+def Medir(html: str, parser: str, strainer, reparse: bool, repeticiones: int) -> float:
+    """Devuelvo el tiempo medio, en ms, de parsear y extraer html."""
+    start = time.perf_counter()
+    for _ in range(0, repeticiones):
+        parsed = BeautifulSoup(html, features=parser, parse_only=strainer)
+        Extraer(parsed, reparse)
+    return (time.perf_counter() - start) * 1000 / repeticiones
+
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1:
+        paginas = []
+        for filename in sys.argv[1:]:
+            with open(filename, "rt") as fp:
+                paginas.append((filename, fp.read()))
+    else:
+        paginas = [("sintético", PaginaSintetica())]
+
+    modos = [("html.parser, árbol completo, re-parseo de tablas (antes)",
+              "html.parser", None, True),
+             ("html.parser, parseo dirigido", "html.parser", content_strainer, False)]
+    try:
+        import lxml  # noqa: F401
+        modos.append(("lxml, árbol completo", "lxml", None, False))
+        modos.append(("lxml, parseo dirigido", "lxml", content_strainer, False))
+    except ImportError:
+        print("lxml no está instalado, lo salteo")
+
+    for nombre, html in paginas:
+        print("%s (%s KB)" % (nombre, len(html) // 1024))
+        base = None
+        for descripcion, parser, strainer, reparse in modos:
+            ms = Medir(html, parser, strainer, reparse, 10)
+            base = base or ms
+            print("\t%-60s %8.1f ms  (x%.1f)" % (descripcion, ms, base / ms))
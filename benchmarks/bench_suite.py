@@ -0,0 +1,274 @@
+"""Suite de benchmarks sobre las páginas de SIBOM grabadas en
+benchmarks/fixtures, servidas por un FixtureServer local.
+
+Mide GetLatestID, GetAllURLs, ParsePublicacion, Publicacion.GetTweets,
+TableToIMG.GetImage (parse, layout, draw y encode por separado) y el
+procesamiento completo de un boletín, guarda los resultados en JSON y
+los compara contra un baseline.
+
+Uso:
+    python benchmarks/bench_suite.py [--font F] [--logo L] [--repeat N]
+        [--output resultados.json] [--baseline benchmarks/baseline.json]
+        [--save-baseline] [--tolerance 0.25] [--filter texto]
+
+Termina con código 1 si algún caso es más lento que el baseline por
+más de la tolerancia. Los tiempos dependen de la máquina: el baseline
+hay que regenerarlo (--save-baseline) en la misma máquina donde se
+compara. También dependen de la fuente y el logo, así que el baseline
+guarda su SHA-256, y si no coinciden con los de esta corrida no comparo
+y termino con código 2.
+"""
+import argparse
+import contextlib
+import hashlib
+import io
+import json
+import os
+import platform
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+import PIL  # noqa: E402
+from bs4 import BeautifulSoup  # noqa: E402
+from FakeTwitter import FakeTwitterAPI  # noqa: E402
+from PostingScheduler import PostingScheduler  # noqa: E402
+from SIBOM import SIBOM  # noqa: E402
+from fixture_server import FixtureServer, fixtures_dir  # noqa: E402
+
+default_baseline = os.path.join(os.path.dirname(__file__), "baseline.json")
+bulletin_id = 4047
+stages = ("parse", "layout", "draw", "encode")
+# Datos de Meta que tienen que coincidir con los del baseline para
+# comparar: con otra fuente u otro logo, las imágenes son otras
+pinned = ("font_sha256", "logo_sha256")
+
+
+def Medir(fn, repeticiones: int) -> dict:
+    """Corro fn una vez para calentar y después repeticiones veces.
+
+    Si fn devuelve un dict {etapa: segundos} con tiempos parciales,
+    se agregan como "etapa" al resultado.
+
+    Devuelvo {"": tiempos totales, etapa: tiempos, ...}, en ms.
+    """
+    fn()
+    tiempos = {"": []}
+    for _ in range(0, repeticiones):
+        start = time.perf_counter()
+        parciales = fn()
+        tiempos[""].append((time.perf_counter() - start) * 1000)
+        if not isinstance(parciales, dict):
+            continue
+        for etapa, segundos in parciales.items():
+            tiempos.setdefault(etapa, []).append(segundos * 1000)
+    return tiempos
+
+
+def Resumir(tiempos: list) -> dict:
+    """Devuelvo mediana, mínimo y cantidad de corridas."""
+    return {"median_ms": round(statistics.median(tiempos), 3),
+            "min_ms": round(min(tiempos), 3),
+            "runs": len(tiempos)}
+
+
+def NuevoSIBOM(url: str, font: str, logo: str) -> SIBOM:
+    """Devuelvo un SIBOM apuntando al servidor local, sin caches, para
+    que cada corrida haga todo el trabajo.
+    """
+    SIBOM.sibom_url = url
+    SIBOM.cache_path = ""
+    SIBOM.render_cache_path = ""
+    return SIBOM("@Benchmark", "General Pueyrredón", r"general pueyrred.n", font, logo)
+
+
+def ContentURLs(server: FixtureServer) -> list:
+    """Devuelvo las URLs de las publicaciones grabadas, ordenadas."""
+    return sorted(server.url + path[len("/bulletins/"):]
+                  for path in server.pages if "/contents/" in path)
+
+
+def Casos(server: FixtureServer, font: str, logo: str) -> list:
+    """Devuelvo una lista de pares (nombre, función) a medir."""
+    s = NuevoSIBOM(server.url, font, logo)
+    casos = [("GetLatestID", s.GetLatestID),
+             ("GetAllURLs", lambda: s.GetAllURLs(bulletin_id))]
+
+    for url in ContentURLs(server):
+        content_id = url.rsplit("/", 1)[1]
+        pub = s.ParsePublicacion(url)
+        casos.append(("ParsePublicacion[%s]" % (content_id),
+                      lambda url=url: s.ParsePublicacion(url)))
+        casos.append(("GetTweets[%s]" % (content_id), pub.GetTweets))
+
+        path = "/bulletins/" + url[len(server.url):]
+        parsed = BeautifulSoup(server.pages[path], features=s.html_parser)
+        tablas = [str(tabla) for tabla in parsed.find_all(s._MatchTables)]
+        if tablas:
+            casos.append(("GetImage[%s]" % (content_id),
+                          lambda tablas=tablas, titulo=pub.titulo: Dibujar(s, tablas, titulo)))
+
+    casos.append(("Boletin", lambda: ProcesarBoletin(server.url, font, logo)))
+    return casos
+
+
+def Dibujar(s: SIBOM, tablas: list, titulo: str) -> dict:
+    """Dibujo las tablas de una publicación y devuelvo la suma de los
+    tiempos de cada etapa.
+    """
+    s.img_gen.caption = titulo
+    total = dict.fromkeys(stages, 0)
+    for tabla in tablas:
+        s.img_gen.GetImage(tabla, 1920, 1080)
+        for etapa in stages:
+            total[etapa] += s.img_gen.timings[etapa]
+    return total
+
+
+def ProcesarBoletin(url: str, font: str, logo: str) -> None:
+    """Hago lo mismo que main.py con un boletín, publicando en una
+    FakeTwitterAPI y sin esperas entre tweets.
+    """
+    s = NuevoSIBOM(url, font, logo)
+    scheduler = PostingScheduler(FakeTwitterAPI(), sleep=lambda _: None)
+    scheduler.tweet_gap = 0
+    scheduler.thread_gap = 0
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        id = s.GetLatestID()
+        urls = s.GetAllURLs(id)
+        scheduler.Run(zip(urls, s.IterPublicaciones(id, urls)), len(urls))
+    scheduler.Close()
+    s.Close()
+    s.http.Close()
+    return
+
+
+def GetSHA256(path: str) -> str:
+    """Devuelvo el SHA-256 de un archivo, en hexadecimal."""
+    with open(path, "rb") as fp:
+        return hashlib.sha256(fp.read()).hexdigest()
+
+
+def Meta(args: argparse.Namespace) -> dict:
+    """Devuelvo los datos del entorno que influyen en los tiempos."""
+    return {"python": platform.python_version(),
+            "platform": platform.platform(),
+            "pillow": PIL.__version__,
+            "html_parser": SIBOM.html_parser,
+            "font": os.path.basename(args.font),
+            "font_sha256": GetSHA256(args.font),
+            "logo": os.path.basename(args.logo),
+            "logo_sha256": GetSHA256(args.logo),
+            "repeat": args.repeat,
+            "date": time.strftime("%Y-%m-%dT%H:%M:%S")}
+
+
+def GetDistintos(resultados: dict, baseline: dict) -> list:
+    """Devuelvo los datos de pinned en los que la corrida no coincide
+    con el baseline, imprimiendo cada uno.
+    """
+    distintos = []
+    for key in pinned:
+        # "font_sha256" --> "font"
+        name = key[:-len("_sha256")]
+        if baseline["meta"].get(key) != resultados["meta"].get(key):
+            print("ERROR: El baseline usa %s %s (SHA-256 %s) y esta corrida %s (%s)" % (
+                name, baseline["meta"].get(name), baseline["meta"].get(key),
+                resultados["meta"].get(name), resultados["meta"].get(key)))
+            distintos.append(key)
+    return distintos
+
+
+def Comparar(resultados: dict, baseline: dict, tolerance: float, min_delta: float) -> list:
+    """Imprimo la comparación contra el baseline y devuelvo los nombres
+    de los casos que empeoraron.
+
+    Un caso empeora si su mediana supera la del baseline en más de
+    tolerance (proporción) y en más de min_delta ms, así los casos muy
+    cortos no dan falsos positivos por ruido.
+    """
+    for key in ("python", "pillow", "html_parser", "platform"):
+        if baseline["meta"].get(key) != resultados["meta"].get(key):
+            print("WARNING: El baseline usa %s %s y esta corrida %s" % (
+                key, baseline["meta"].get(key), resultados["meta"].get(key)))
+
+    regresiones = []
+    print("%-40s %12s %12s %8s" % ("Caso", "Baseline ms", "Actual ms", "Ratio"))
+    for name, res in resultados["results"].items():
+        base = baseline["results"].get(name)
+        if base is None:
+            print("%-40s %12s %12.1f %8s" % (name, "-", res["median_ms"], "nuevo"))
+            continue
+
+        ratio = res["median_ms"] / base["median_ms"] if base["median_ms"] else 1
+        peor = (ratio > 1 + tolerance
+                and res["median_ms"] - base["median_ms"] > min_delta)
+        if peor:
+            regresiones.append(name)
+        print("%-40s %12.1f %12.1f %7.2fx%s" % (
+            name, base["median_ms"], res["median_ms"], ratio, (" ", " !")[peor]))
+
+    return regresiones
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--font", default="assets/Montserrat-Regular.ttf")
+    parser.add_argument("--logo", default="assets/logo.png")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--output", help="Archivo donde guardar los resultados")
+    parser.add_argument("--baseline", default=default_baseline)
+    parser.add_argument("--save-baseline", action="store_true",
+                        help="Guardar los resultados como nuevo baseline")
+    parser.add_argument("--tolerance", type=float, default=0.25)
+    parser.add_argument("--min-delta", type=float, default=2.0,
+                        help="Diferencia mínima, en ms, para considerar una regresión")
+    parser.add_argument("--filter", default="", help="Sólo los casos que contengan este texto")
+    args = parser.parse_args()
+
+    if not os.path.exists(args.font):
+        print("ERROR: No existe la fuente %s (ver --font)" % (args.font))
+        exit(1)
+    if not os.path.exists(args.logo):
+        print("ERROR: No existe el logo %s (ver --logo)" % (args.logo))
+        exit(1)
+
+    server = FixtureServer(fixtures_dir)
+    server.Start()
+    resultados = {"meta": Meta(args), "results": {}}
+    try:
+        for name, fn in Casos(server, args.font, args.logo):
+            if args.filter not in name:
+                continue
+            for etapa, tiempos in Medir(fn, args.repeat).items():
+                key = name + ("." + etapa if etapa else "")
+                resultados["results"][key] = Resumir(tiempos)
+            print("%-40s %10.1f ms" % (name, resultados["results"][name]["median_ms"]),
+                  file=sys.stderr)
+    finally:
+        server.Stop()
+
+    if args.output:
+        with open(args.output, "wt") as fp:
+            json.dump(resultados, fp, indent=4, ensure_ascii=False)
+
+    if args.save_baseline:
+        with open(args.baseline, "wt") as fp:
+            json.dump(resultados, fp, indent=4, ensure_ascii=False)
+        print("Baseline guardado en %s" % (args.baseline))
+    elif os.path.exists(args.baseline):
+        with open(args.baseline, "rt") as fp:
+            baseline = json.load(fp)
+        if GetDistintos(resultados, baseline):
+            print("ERROR: No comparo contra %s: usá la misma fuente y el mismo logo "
+                  "(--font, --logo) o regeneralo con --save-baseline" % (args.baseline))
+            exit(2)
+        regresiones = Comparar(resultados, baseline, args.tolerance, args.min_delta)
+        if regresiones:
+            print("ERROR: %s casos empeoraron: %s" % (
+                len(regresiones), ", ".join(regresiones)))
+            exit(1)
+    else:
+        print("WARNING: No existe %s, no comparo (ver --save-baseline)" % (args.baseline))
@@ -0,0 +1,65 @@
+"""Compara la cantidad de tweets de texto de un boletín grabado (ver
+benchmarks/fixtures) con y sin juntar artículos cortos
+(SIBOM.pack_tweets), y el tiempo de espera que ahorra al publicar con
+las pausas de PostingScheduler.
+
+Uso: python benchmarks/bench_tweets.py
+
+Los tweets con imágenes no cambian, así que no los cuento (ni dibujo
+las tablas).
+"""
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+from PostingScheduler import PostingScheduler  # noqa: E402
+from SIBOM import SIBOM, GetWeightedLength, tweet_max_length  # noqa: E402
+from fixture_server import FixtureServer  # noqa: E402
+
+bulletin_id = 4047
+
+
+def ContarTweets(s: SIBOM) -> dict:
+    """Devuelvo la cantidad de publicaciones, tweets de texto y el
+    largo máximo de un tweet en el boletín.
+    """
+    pubs = 0
+    tweets = 0
+    longest = 0
+    for pub in s.IterPublicaciones(bulletin_id):
+        pubs += 1
+        # El primer tweet (título y fuente) más los de los artículos
+        textos = [next(pub.IterTweets()).content] + list(pub._IterTextos())
+        tweets += len(textos)
+        longest = max(longest, max(GetWeightedLength(texto) for texto in textos))
+    return {"publicaciones": pubs, "tweets": tweets, "largo máximo": longest}
+
+
+if __name__ == "__main__":
+    server = FixtureServer()
+    SIBOM.sibom_url = server.Start()
+    SIBOM.cache_path = ""
+    SIBOM.render_cache_path = ""
+    s = SIBOM("@Benchmark", "General Pueyrredón", r"general pueyrred.n",
+              "assets/Montserrat-Regular.ttf", "assets/logo.png")
+
+    resultados = {}
+    try:
+        for pack in (False, True):
+            s.pack_tweets = pack
+            resultados[pack] = ContarTweets(s)
+    finally:
+        server.Stop()
+
+    gap = PostingScheduler.tweet_gap
+    for pack, res in resultados.items():
+        print("%-14s %s tweets en %s publicaciones, %s s de pausas (largo máximo %s)" % (
+            ("juntando" if pack else "sin juntar"), res["tweets"],
+            res["publicaciones"], res["tweets"] * gap, res["largo máximo"]))
+        if res["largo máximo"] > tweet_max_length:
+            print("ERROR: Hay tweets de más de %s caracteres" % (tweet_max_length))
+            exit(1)
+
+    ahorro = resultados[False]["tweets"] - resultados[True]["tweets"]
+    print("Ahorro: %s tweets (%.0f%%), %s s" % (
+        ahorro, 100 * ahorro / resultados[False]["tweets"], ahorro * gap))
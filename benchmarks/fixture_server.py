@@ -0,0 +1,149 @@
+"""Servidor HTTP local que imita a SIBOM sirviendo las páginas grabadas
+en benchmarks/fixtures, para correr benchmarks sin depender de la red.
+
+Uso: python benchmarks/fixture_server.py [puerto] [demora en segundos]
+"""
+import hashlib
+import json
+import os
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+fixtures_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures")
+
+
+class _HTTPServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def handle_error(self, request, client_address) -> None:
+        # GetLatestID corta la conexión apenas encuentra el municipio
+        if not isinstance(sys.exc_info()[1], ConnectionError):
+            super().handle_error(request, client_address)
+        return
+
+
+class FixtureServer:
+    """Sirve las páginas de manifest.json en un hilo aparte.
+
+    Responde con ETag y Last-Modified, y con 304 a los pedidos
+    condicionales, igual que SIBOM.
+
+    Atributos
+    ---------
+    pages : dict
+        Path de la URL (ej.: "/bulletins/4047") --> bytes de la página.
+    delay : float
+        Segundos que demora cada respuesta, para simular la red.
+    delays : dict
+        Path --> segundos que demora la respuesta a ese path, en lugar
+        de delay.
+    hits : list[<str>]
+        Paths pedidos, en orden.
+    url : str
+        URL base para usar como SIBOM.sibom_url. Se setea al llamar a
+        Start.
+    """
+    delay = 0
+    url = ""
+
+    def __init__(self, root: str = fixtures_dir, delay: float = 0, port: int = 0) -> None:
+        """
+        Parámetros
+        ----------
+        root : str
+            Directorio con manifest.json y las páginas.
+        delay : float
+            Ídem atributo.
+        port : int
+            Puerto donde escuchar. Con 0 se elige uno libre.
+        """
+        self.delay = delay
+        self.port = port
+        self.hits = []
+        self.delays = {}
+        self.pages = {}
+        with open(os.path.join(root, "manifest.json"), "rt") as fp:
+            manifest = json.load(fp)
+        for path, filename in manifest.items():
+            with open(os.path.join(root, filename), "rb") as fp:
+                self.pages[path] = fp.read()
+        self._server = None
+        return
+
+    def Start(self) -> str:
+        """Empiezo a escuchar y devuelvo la URL base de los boletines."""
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+            # Si no, los headers y el cuerpo salen en paquetes separados
+            # y cada respuesta demora ~40 ms por el ACK retrasado.
+            disable_nagle_algorithm = True
+
+            def log_message(self, *args) -> None:
+                return
+
+            def do_GET(self) -> None:
+                server._Serve(self)
+                return
+
+        self._server = _HTTPServer(("127.0.0.1", self.port), Handler)
+        self.port = self._server.server_address[1]
+        self.url = "http://127.0.0.1:%s/bulletins/" % (self.port)
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+        return self.url
+
+    def Stop(self) -> None:
+        """Dejo de escuchar."""
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+        return
+
+    def _Serve(self, handler: BaseHTTPRequestHandler) -> None:
+        """Respondo un pedido."""
+        self.hits.append(handler.path)
+        # IterURLs pide "/bulletins/(id)?" sin parámetros
+        path = handler.path.rstrip("?")
+        delay = self.delays.get(path, self.delay)
+        if delay:
+            time.sleep(delay)
+
+        body = self.pages.get(path)
+        if body is None:
+            handler.send_response(404)
+            handler.send_header("Content-Length", "0")
+            handler.end_headers()
+            return
+
+        etag = '"%s"' % (hashlib.md5(body).hexdigest())
+        if handler.headers.get("If-None-Match") == etag:
+            handler.send_response(304)
+            handler.send_header("ETag", etag)
+            handler.send_header("Content-Length", "0")
+            handler.end_headers()
+            return
+
+        handler.send_response(200)
+        handler.send_header("Content-Type", "text/html; charset=utf-8")
+        handler.send_header("ETag", etag)
+        handler.send_header("Last-Modified", "Mon, 02 Mar 2026 10:00:00 GMT")
+        handler.send_header("Content-Length", str(len(body)))
+        handler.end_headers()
+        handler.wfile.write(body)
+        return
+
+
+if __name__ == "__main__":
+    port = int(sys.argv[1]) if len(sys.argv) > 1 else 8765
+    delay = float(sys.argv[2]) if len(sys.argv) > 2 else 0
+    server = FixtureServer(delay=delay, port=port)
+    print("Sirviendo %s páginas en %s" % (len(server.pages), server.Start()))
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.Stop()
@@ -1,70 +1,95 @@
-import tweepy
-import time
+import atexit
+import os
+import sys
+from CUITIndex import CUITIndex
+from ChangeDetector import ChangeDetector
+from Metrics import metrics
 from SIBOM import SIBOM
+from SearchIndex import SearchIndex
+from StateStore import StateStore
+from PostingScheduler import PostingScheduler
 
 CONSUMER_KEY = 0
 CONSUMER_SECRET = 1
 ACCESS_TOKEN = 2
 ACCESS_TOKEN_SECRET = 3
 CITY_ID = "010d7db066434a8a"  # Mar del Plata, AR
-last_id = 0
+STATE_FILE = "state.sqlite3"
+SEARCH_FILE = "search.sqlite3"
+CUIT_FILE = "cuits.sqlite3"
+FINGERPRINTS_FILE = "fingerprints.sqlite3"
+METRICS_LOG = "metrics/events.jsonl"
+METRICS_PROM = "metrics/sibom.prom"
 
-# Leo los keys desde un archivo
-keys = []
-with open("keys", "rt") as fp:
-    for i in range(0, 4):
-        # Elimino el '\n' al final
-        keys.append(fp.readline()[:-1])
+if "--metrics" in sys.argv:
+    # Un evento JSON por etapa, y un resumen para Prometheus al salir
+    metrics.Enable(METRICS_LOG)
+    atexit.register(metrics.WritePrometheus, METRICS_PROM)
 
-with open("id", "rt") as fp:
-    last_id = int(fp.readline())
+if "--offline" in sys.argv:
+    # No publica nada: usa una imitación local de la API de Twitter, y
+    # bases de datos aparte para no marcar como publicado lo que nunca
+    # salió
+    from FakeTwitter import FakeTwitterAPI
+    api = FakeTwitterAPI()
+    STATE_FILE, SEARCH_FILE, CUIT_FILE, FINGERPRINTS_FILE = (
+        name.replace(".sqlite3", ".offline.sqlite3")
+        for name in (STATE_FILE, SEARCH_FILE, CUIT_FILE, FINGERPRINTS_FILE))
+else:
+    import tweepy
 
-auth = tweepy.OAuthHandler(keys[CONSUMER_KEY], keys[CONSUMER_SECRET])
-auth.set_access_token(keys[ACCESS_TOKEN], keys[ACCESS_TOKEN_SECRET])
-api = tweepy.API(auth, wait_on_rate_limit=True, wait_on_rate_limit_notify=True)
+    # Leo los keys desde un archivo
+    keys = []
+    with open("keys", "rt") as fp:
+        for i in range(0, 4):
+            # Elimino el '\n' al final
+            keys.append(fp.readline()[:-1])
+
+    auth = tweepy.OAuthHandler(keys[CONSUMER_KEY], keys[CONSUMER_SECRET])
+    auth.set_access_token(keys[ACCESS_TOKEN], keys[ACCESS_TOKEN_SECRET])
+    api = tweepy.API(auth, wait_on_rate_limit=True, wait_on_rate_limit_notify=True)
 
 s = SIBOM("@BoletinMGP", "General Pueyrredón", r"general pueyrred.n",
           "assets/Montserrat-Regular.ttf", "assets/logo.png")
+state = StateStore(STATE_FILE)
+s.state = state
+s.search_index = SearchIndex(SEARCH_FILE)
+s.cuit_index = CUITIndex(CUIT_FILE)
+s.fingerprints = ChangeDetector(s, FINGERPRINTS_FILE)
+muni = s.muni_display
+
+# Si todavía existe el viejo archivo "id", lo tomo como ya publicado
+if state.GetLastBulletin(muni) == 0 and os.path.exists("id"):
+    with open("id", "rt") as fp:
+        state.FinishBulletin(muni, int(fp.readline()))
+
+last_id = state.GetLastBulletin(muni)
 id = s.GetLatestID()
 
 if id == 0:
     exit(1)
-if id == last_id:
+
+# Primero termino el último boletín, si quedó a medias
+ids = []
+if last_id != 0 and not state.IsBulletinDone(muni, last_id):
+    ids.append(last_id)
+if id != last_id:
+    ids.append(id)
+
+if len(ids) == 0:
     print("No hay boletines nuevos.")
     exit(0)
 
-with open("id", "wt") as fp:
-    fp.write(str(id))
+scheduler = PostingScheduler(api, state)
+scheduler.place_id = CITY_ID
 
-urls = s.GetAllURLs(id)
-url_count = len(urls)
-i = 1
-for url in urls:
-    print("Procesando URL %s de %s" % (i, url_count))
-    tweets = s.ParsePublicacion(url).GetTweets()
+for bulletin_id in ids:
+    if not scheduler.RunBulletin(s, bulletin_id):
+        # Quedó a medias: el resto (y los boletines siguientes) esperan a
+        # la próxima corrida
+        break
 
-    last_tweet_id = ""
-    tw_count = len(tweets)
-    j = 1
-    for tweet in tweets:
-        print("\n    Tweet %s de %s... " % (j, tw_count), end="")
-        try:
-            media_ids = []
-            for filename in tweet.media_filenames:
-                media_id = api.media_upload(filename).media_id
-                media_ids.append(media_id)
-            last_tweet = api.update_status(
-                status=tweet.content, in_reply_to_status_id=last_tweet_id, media_ids=media_ids, place_id=CITY_ID)
-            last_tweet_id = last_tweet.id
-            print("Enviado")
-        except Exception:
-            print("ERROR!")
-            pass
-        # Espero 15s entre cada tweet, para no llenar el timeline de los
-        # seguidores y evitar que marquen la cuenta como spam.
-        j += 1
-        time.sleep(15)
-    # Espero 15s adicionales entre cada hilo
-    i += 1
-    time.sleep(15)
-            
+scheduler.Close()
+print("HTTP: %s" % (s.http.GetStats().AsDict()))
+if s.img_gen.render_cache is not None:
+    print("Imágenes: %s" % (s.img_gen.render_cache.GetStats()))
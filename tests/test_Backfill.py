@@ -0,0 +1,159 @@
+import contextlib
+import io
+import os
+import sys
+import tempfile
+import unittest
+from unittest import mock
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "benchmarks"))
+import Backfill as backfill_module  # noqa: E402
+from Backfill import Backfill, BackfillArchive  # noqa: E402
+from SIBOM import SIBOM  # noqa: E402
+from fixture_server import FixtureServer  # noqa: E402
+
+bulletin_id = 4047
+contents = list(range(1477570, 1477582))
+
+
+class SIBOMSinCache(SIBOM):
+    # Sin caches en disco. Las tablas se archivan sin dibujarlas.
+    cache_path = ""
+    render_cache_path = ""
+
+
+class ArchivoQueSeCorta(BackfillArchive):
+    """Imita un corte del proceso justo después de escribir el bloque
+    número fail_on, antes de actualizar el checkpoint.
+    """
+    fail_on = 0
+
+    def _WriteCheckpoint(self) -> None:
+        self.fail_on -= 1
+        if self.fail_on == 0:
+            raise RuntimeError("Corte")
+        return super()._WriteCheckpoint()
+
+
+def NuevoRegistro(content_id: int) -> dict:
+    """Devuelvo un registro de prueba del boletín bulletin_id."""
+    return {"bulletin_id": bulletin_id, "content_id": content_id,
+            "url": "/bulletins/%s/contents/%s" % (bulletin_id, content_id)}
+
+
+class BackfillArchiveTest(unittest.TestCase):
+    def setUp(self) -> None:
+        self.dir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.dir.name, "publicaciones.jsonl.gz")
+        return
+
+    def tearDown(self) -> None:
+        self.dir.cleanup()
+        return
+
+    def testDescartaBytesSinCheckpoint(self) -> None:
+        archive = BackfillArchive(self.path)
+        archive.Add(NuevoRegistro(contents[0]))
+        archive.Add(NuevoRegistro(contents[1]))
+        archive.Flush()
+        size = os.path.getsize(self.path)
+        with open(self.path, "ab") as fp:
+            fp.write(b"\x1f\x8b\x08 bloque a medio escribir")
+
+        # Quien sólo lee no lo toca: puede estar escribiéndolo otro proceso
+        self.assertEqual(len(list(BackfillArchive(self.path, read_only=True).Read())), 2)
+        self.assertGreater(os.path.getsize(self.path), size)
+
+        with contextlib.redirect_stdout(io.StringIO()) as out:
+            archive = BackfillArchive(self.path)
+        self.assertIn("WARNING", out.getvalue())
+        self.assertEqual(os.path.getsize(self.path), size)
+        self.assertEqual([record["content_id"] for record in archive.Read()], contents[:2])
+        self.assertTrue(archive.IsArchived(bulletin_id, contents[1]))
+
+    def testSinZstandard(self) -> None:
+        path = os.path.join(self.dir.name, "publicaciones.jsonl.zst")
+        with mock.patch.object(backfill_module, "zstandard", None):
+            with contextlib.redirect_stdout(io.StringIO()):
+                archive = BackfillArchive(path)
+            self.assertEqual(archive.path, self.path)
+            archive.Add(NuevoRegistro(contents[0]))
+            archive.Flush()
+            self.assertEqual(len(list(BackfillArchive(self.path).Read())), 1)
+
+            # Un archivo zstd ya empezado no se puede seguir sin zstandard
+            with open(path + ".checkpoint", "wt") as fp:
+                fp.write("{}")
+            with self.assertRaises(ImportError):
+                BackfillArchive(path)
+
+
+class BackfillTest(unittest.TestCase):
+    def setUp(self) -> None:
+        self.server = FixtureServer()
+        self.dir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.dir.name, "publicaciones.jsonl.gz")
+        SIBOMSinCache.sibom_url = self.server.Start()
+        self.sibom = SIBOMSinCache("@Test", "General Pueyrredón", r"general pueyrred.n",
+                                   "assets/Montserrat-Regular.ttf", "assets/logo.png")
+        return
+
+    def tearDown(self) -> None:
+        self.sibom.Close()
+        self.sibom.http.Close()
+        self.server.Stop()
+        self.dir.cleanup()
+        return
+
+    def Run(self, archive: BackfillArchive, ids: list) -> dict:
+        backfill = Backfill(self.sibom, archive, 2)
+        backfill.flush_every = 5
+        with contextlib.redirect_stdout(io.StringIO()):
+            return backfill.Run(ids)
+
+    def GetContentHits(self) -> list:
+        return [path for path in self.server.hits if "/contents/" in path]
+
+    def testRetomaDespuesDeUnCorte(self) -> None:
+        # Se corta después de escribir el segundo bloque
+        archive = ArchivoQueSeCorta(self.path)
+        archive.fail_on = 2
+        with self.assertRaises(RuntimeError):
+            self.Run(archive, [bulletin_id])
+        # ... y antes de terminar de escribir el tercero
+        with open(self.path, "ab") as fp:
+            fp.write(archive._Compress(b"{}\n" * 100)[:20])
+
+        with contextlib.redirect_stdout(io.StringIO()):
+            archive = BackfillArchive(self.path)
+        self.assertEqual(archive.records, 5)
+        self.server.hits.clear()
+        summary = self.Run(archive, [bulletin_id])
+
+        # Sólo se descargan las que no quedaron en el checkpoint
+        self.assertEqual(summary["publications"], len(contents) - 5)
+        self.assertEqual(len(self.GetContentHits()), len(contents) - 5)
+        self.assertEqual(summary["incomplete"], 0)
+        self.assertEqual(sorted(record["content_id"] for record in archive.Read()),
+                         contents)
+        self.assertEqual(archive.done_bulletins, {bulletin_id})
+
+    def testOtroMunicipio(self) -> None:
+        # El boletín 4098 es de General Alvarado
+        page = self.server.pages["/bulletins/%s" % (bulletin_id)]
+        self.server.pages["/bulletins/4098"] = page.replace(
+            "General Pueyrredón".encode(), b"General Alvarado").replace(
+            b"/bulletins/4047/", b"/bulletins/4098/")
+
+        archive = BackfillArchive(self.path)
+        summary = self.Run(archive, [bulletin_id, 4098])
+        self.assertEqual((summary["bulletins"], summary["other_muni"]), (1, 1))
+        self.assertEqual(summary["incomplete"], 0)
+        self.assertEqual(summary["publications"], len(contents))
+        self.assertFalse(any("/4098/" in path for path in self.GetContentHits()))
+        self.assertEqual(archive.done_bulletins, {bulletin_id})
+
+
+if __name__ == "__main__":
+    unittest.main()
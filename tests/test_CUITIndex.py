@@ -0,0 +1,55 @@
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+from CUITIndex import CUITIndex  # noqa: E402
+
+url = "/bulletins/4047/contents/1477570"
+
+
+def NuevoRegistro(cuits: list) -> dict:
+    """Devuelvo un registro como los de BackfillArchive."""
+    return {"url": url, "ciudad_fecha": "General Pueyrredón, 14 de marzo de 2026",
+            "cuits": cuits}
+
+
+class CUITIndexTest(unittest.TestCase):
+    def setUp(self) -> None:
+        self.index = CUITIndex(":memory:")
+        return
+
+    def tearDown(self) -> None:
+        self.index.Close()
+        return
+
+    def testLookup(self) -> None:
+        self.index.AddRecords([NuevoRegistro(["20-12345678-6", "20 - 12345678 - 6"])])
+        self.assertEqual(self.index.Lookup("20123456786"), [
+            {"bulletin_id": 4047, "content_id": 1477570, "fecha": "2026-03-14", "url": url}])
+        self.assertEqual(self.index.GetInvalid(), [])
+
+    def testRegistroRepetido(self) -> None:
+        record = NuevoRegistro(["20-12345678-6"])
+        self.assertEqual(self.index.AddRecords([record, record]), 2)
+        self.assertEqual(len(self.index.Lookup("20-12345678-6")), 1)
+
+        # Vale el último
+        self.index.AddRecords([record, NuevoRegistro(["30-71234567-1"])])
+        self.assertEqual(self.index.Lookup("20-12345678-6"), [])
+        self.assertEqual(len(self.index.Lookup("30-71234567-1")), 1)
+
+    def testDigitoVerificador(self) -> None:
+        self.index.AddRecords([NuevoRegistro(["20-12345678-0"])])
+        self.assertEqual(self.index.GetInvalid(), [("20123456780", 1)])
+        self.assertFalse(self.index.IsValid("20-12345678-0"))
+        self.assertTrue(self.index.IsValid("20-12345678-6"))
+
+    def testRemove(self) -> None:
+        self.index.AddRecords([NuevoRegistro(["20-12345678-6"])])
+        self.index.Remove(url)
+        self.assertEqual(self.index.Lookup("20-12345678-6"), [])
+
+
+if __name__ == "__main__":
+    unittest.main()
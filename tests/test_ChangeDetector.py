@@ -0,0 +1,122 @@
+import contextlib
+import io
+import os
+import re
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "benchmarks"))
+from CUITIndex import CUITIndex  # noqa: E402
+from ChangeDetector import ChangeDetector  # noqa: E402
+from SIBOM import SIBOM  # noqa: E402
+from SearchIndex import SearchIndex  # noqa: E402
+from fixture_server import FixtureServer  # noqa: E402
+
+bulletin_id = 4047
+
+
+class SIBOMSinCache(SIBOM):
+    # Sin caches en disco. Las imágenes no se dibujan, así que tampoco
+    # hacen falta los assets.
+    cache_path = ""
+    render_cache_path = ""
+
+
+class ChangeDetectorTest(unittest.TestCase):
+    def setUp(self) -> None:
+        self.server = FixtureServer()
+        self.dir = tempfile.TemporaryDirectory()
+        SIBOMSinCache.sibom_url = self.server.Start()
+        self.sibom = SIBOMSinCache("@Test", "General Pueyrredón", r"general pueyrred.n",
+                                   "assets/Montserrat-Regular.ttf", "assets/logo.png")
+        self.sibom.search_index = SearchIndex(":memory:")
+        self.sibom.cuit_index = CUITIndex(":memory:")
+        self.detector = ChangeDetector(
+            self.sibom, os.path.join(self.dir.name, "fingerprints.sqlite3"))
+        self.sibom.fingerprints = self.detector
+        self.urls = self.sibom.GetAllURLs(bulletin_id)
+        self.pubs = list(self.sibom.IterPublicaciones(bulletin_id, self.urls))
+        return
+
+    def tearDown(self) -> None:
+        self.detector.Close()
+        self.sibom.search_index.Close()
+        self.sibom.cuit_index.Close()
+        self.sibom.http.Close()
+        self.server.Stop()
+        self.dir.cleanup()
+        return
+
+    def Check(self) -> list:
+        with contextlib.redirect_stdout(io.StringIO()):
+            return self.detector.Check([bulletin_id])
+
+    def testSinCambios(self) -> None:
+        self.Check()
+        self.assertEqual(self.Check(), [])
+        self.assertEqual(self.detector.unchanged, len(self.urls) + 1)
+        self.assertEqual(self.detector.failures, 0)
+
+    def testModificada(self) -> None:
+        # La primera pasada guarda los validadores (no hay cache HTTP)
+        self.Check()
+        path = self.urls[1][self.urls[1].index("/bulletins/"):]
+        self.server.pages[path] = self.server.pages[path].replace(
+            "Obras del Sur".encode(), "Obras del Norte".encode(), 1)
+        changes = self.Check()
+        self.assertEqual([(change["kind"], change["url"]) for change in changes],
+                         [("modified", self.urls[1])])
+        self.assertIn("articulos", changes[0]["diff"])
+        self.assertEqual(self.detector.unchanged, len(self.urls))
+
+    def testQuitada(self) -> None:
+        pub = [pub for pub in self.pubs if len(pub.cuits) > 0][-1]
+        removed = pub.url
+        content_id = removed.rstrip("/").split("contents/")[1]
+        self.assertEqual(self.sibom.search_index.GetCount(), len(self.urls))
+        for cuit in pub.cuits:
+            self.assertIn(removed, [r["url"] for r in self.sibom.cuit_index.Lookup(cuit)])
+
+        path = "/bulletins/%s" % (bulletin_id)
+        self.server.pages[path] = re.sub(
+            rb'<a[^>]*content-link[^>]*' + content_id.encode() + rb'[^>]*>.*?</a>',
+            b"", self.server.pages[path], flags=re.S)
+        changes = self.Check()
+        self.assertEqual([(change["kind"], change["url"]) for change in changes],
+                         [("removed", removed)])
+
+        # También la saco de los índices
+        self.assertEqual(self.sibom.search_index.GetCount(), len(self.urls) - 1)
+        for cuit in pub.cuits:
+            self.assertNotIn(removed, [r["url"] for r in self.sibom.cuit_index.Lookup(cuit)])
+
+    def testAgregada(self) -> None:
+        # Una publicación con tablas: si se dibujaran, faltarían los assets
+        pub = [pub for pub in self.pubs if len(pub.tablas) > 0][0]
+        self.detector._Delete(pub.url)
+        changes = self.Check()
+        self.assertEqual([(change["kind"], change["url"]) for change in changes],
+                         [("added", pub.url)])
+        self.assertEqual(self.Check(), [])
+
+    def testOrdenDelBoletin(self) -> None:
+        # Invierto el orden de dos publicaciones en la página del boletín
+        path = "/bulletins/%s" % (bulletin_id)
+        a, b = [url.rsplit("/", 1)[1].encode() for url in self.urls[5:7]]
+        self.server.pages[path] = self.server.pages[path].replace(
+            a, b"@@").replace(b, a).replace(b"@@", b)
+        self.Check()
+
+        # Las quito: se informan en el orden en que estaban
+        self.server.pages[path] = re.sub(
+            rb'<a[^>]*content-link[^>]*(' + a + b"|" + b + rb')[^>]*>.*?</a>',
+            b"", self.server.pages[path], flags=re.S)
+        changes = self.Check()
+        self.assertEqual([(change["kind"], change["url"]) for change in changes],
+                         [("removed", self.urls[6]), ("removed", self.urls[5])])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,76 @@
+import os
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "benchmarks"))
+from HTTPCache import HTTPCache  # noqa: E402
+from HTTPClient import HTTPClient  # noqa: E402
+from fixture_server import FixtureServer  # noqa: E402
+
+path = "/bulletins/4047"
+
+
+class IterTextTest(unittest.TestCase):
+    def setUp(self) -> None:
+        self.server = FixtureServer()
+        # Start devuelve la URL de /bulletins/
+        self.url = self.server.Start() + path.split("/")[-1]
+        self.body = self.server.pages[path].decode("utf-8")
+        self.dir = tempfile.TemporaryDirectory()
+        self.cache = HTTPCache(os.path.join(self.dir.name, "http.sqlite3"))
+        return
+
+    def tearDown(self) -> None:
+        self.cache.Close()
+        self.dir.cleanup()
+        self.server.Stop()
+        return
+
+    def Leer(self, limit: int = None) -> tuple:
+        """Leo el cuerpo (o sus primeros limit caracteres) con un
+        cliente nuevo y devuelvo (texto, stats).
+        """
+        http = HTTPClient(cache=self.cache)
+        text = ""
+        chunks = http.IterText(self.url, chunk_size=1024)
+        for chunk in chunks:
+            text += chunk
+            if limit is not None and len(text) >= limit:
+                break
+        chunks.close()
+        return text, http.GetStats()
+
+    def testCorteTempranoRevalida(self) -> None:
+        text, stats = self.Leer(2048)
+        self.assertTrue(self.body.startswith(text))
+        self.assertLess(len(text), len(self.body))
+
+        # La segunda vez es un GET condicional, sin cuerpo
+        again, stats = self.Leer(2048)
+        self.assertEqual(again, self.body[:len(again)])
+        self.assertGreaterEqual(len(again), 2048)
+        self.assertEqual(stats.not_modified, 1)
+        self.assertEqual(stats.bytes, 0)
+
+    def testCompletaLoQueFalta(self) -> None:
+        self.Leer(2048)
+        text, stats = self.Leer()
+        self.assertEqual(text, self.body)
+        self.assertEqual(stats.requests, 2)
+
+        # Ya quedó completo en el cache
+        text, stats = self.Leer()
+        self.assertEqual(text, self.body)
+        self.assertEqual((stats.requests, stats.bytes), (1, 0))
+
+    def testGetTextIgnoraIncompletos(self) -> None:
+        self.Leer(2048)
+        http = HTTPClient(cache=self.cache)
+        self.assertEqual(http.GetText(self.url), self.body)
+        self.assertEqual(http.GetText(self.url, immutable=True), self.body)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,80 @@
+import os
+import sys
+import time
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+from FakeTwitter import FakeTwitterAPI  # noqa: E402
+from MediaUploader import MediaUploader  # noqa: E402
+
+# Cabecera PNG, para que GetImageExtension reconozca las imágenes
+png = b"\x89PNG\r\n\x1a\n"
+
+
+class LentaPorTamaño(FakeTwitterAPI):
+    """Las imágenes chicas tardan más que las grandes, así terminan en
+    otro orden que el de envío. Guardo el tamaño de cada media ID.
+    """
+
+    def __init__(self, **kwargs) -> None:
+        super().__init__(**kwargs)
+        self.sizes = {}
+        return
+
+    def media_upload(self, filename: str = None, file=None, **kwargs):
+        data = file.read()
+        time.sleep(0.1 if len(data) < 100 else 0)
+        media = super().media_upload(filename, file=type(file)(data), **kwargs)
+        self.sizes[media.media_id] = len(data)
+        return media
+
+
+class MediaUploaderTest(unittest.TestCase):
+    def setUp(self) -> None:
+        self.sleeps = []
+        return
+
+    def NuevoUploader(self, api: FakeTwitterAPI) -> MediaUploader:
+        uploader = MediaUploader(api, sleep=self.sleeps.append)
+        uploader.backoff_factor = 1
+        uploader.max_retries = 3
+        return uploader
+
+    def testOrden(self) -> None:
+        api = LentaPorTamaño()
+        uploader = self.NuevoUploader(api)
+        media = [png + b"x" * n for n in (1, 20, 300, 4000)]
+        ids = uploader.Result(uploader.Submit(media))
+        uploader.Close()
+        self.assertEqual([api.sizes[media_id] for media_id in ids],
+                         [len(item) for item in media])
+        # Terminaron en otro orden
+        self.assertNotEqual(ids, sorted(ids))
+
+    def testReintentaConBackoff(self) -> None:
+        api = FakeTwitterAPI(upload_fail_on={1, 2})
+        uploader = self.NuevoUploader(api)
+        ids = uploader.Result(uploader.Submit([png]))
+        uploader.Close()
+        self.assertEqual(len(ids), 1)
+        self.assertEqual(uploader.retries, 2)
+        self.assertEqual(len(api.uploads), 1)
+        # Full jitter: antes del reintento n, entre 0 y backoff_factor * 2 ** n
+        self.assertEqual(len(self.sleeps), 2)
+        for attempt, delay in enumerate(self.sleeps):
+            self.assertTrue(0 <= delay <= uploader.backoff_factor * 2 ** attempt)
+
+    def testAgotaLosReintentos(self) -> None:
+        api = FakeTwitterAPI(upload_fail_on={1, 2, 3, 4, 5})
+        uploader = self.NuevoUploader(api)
+        futures = uploader.Submit([png])
+        with self.assertRaises(Exception):
+            uploader.Result(futures)
+        uploader.Close()
+        self.assertEqual(uploader.retries, uploader.max_retries)
+        self.assertEqual(len(self.sleeps), uploader.max_retries)
+        self.assertEqual(api.uploads, [])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,65 @@
+import os
+import sys
+import tempfile
+import unittest
+from concurrent.futures import ProcessPoolExecutor
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+from HTMLtoImg import InitRenderWorker  # noqa: E402
+from Metrics import Metrics, metrics  # noqa: E402
+
+
+def Medir(n: int) -> list:
+    """Imito RenderTableInWorker: registro n eventos y los devuelvo."""
+    for i in range(n):
+        metrics.Record("table_draw", 0.5, cells=10)
+    return metrics.TakeEvents()
+
+
+class EnableBufferTest(unittest.TestCase):
+    def testGuardaLosEventos(self) -> None:
+        m = Metrics()
+        m.EnableBuffer()
+        m.Record("table_draw", 0.5, cells=10)
+        self.assertEqual(m.TakeEvents(), [("table_draw", 0.5, {"cells": 10})])
+        self.assertEqual(m.TakeEvents(), [])
+        # No se acumulan: los totales son del proceso principal
+        self.assertEqual(m.GetSummary()["stages"], {})
+
+
+class RenderWorkerTest(unittest.TestCase):
+    def setUp(self) -> None:
+        self.dir = tempfile.TemporaryDirectory()
+        self.log = os.path.join(self.dir.name, "metrics.jsonl")
+        metrics.Reset()
+        metrics.Enable(self.log)
+        return
+
+    def tearDown(self) -> None:
+        metrics.Disable()
+        metrics.Reset()
+        self.dir.cleanup()
+        return
+
+    def testRegistraEnElProcesoPrincipal(self) -> None:
+        with ProcessPoolExecutor(max_workers=2, initializer=InitRenderWorker,
+                                 initargs=(True,)) as pool:
+            results = list(pool.map(Medir, [1, 2, 3]))
+        for events in results:
+            for stage, seconds, fields in events:
+                metrics.Record(stage, seconds, **fields)
+
+        totals = metrics.GetSummary()["stages"]["table_draw"]
+        self.assertEqual((totals["count"], totals["cells"]), (6, 60))
+        # Los procesos del pool no escriben en el log
+        with open(self.log, "rt", encoding="utf-8") as fp:
+            self.assertEqual(len(fp.readlines()), 6)
+
+    def testDesactivadas(self) -> None:
+        with ProcessPoolExecutor(max_workers=1, initializer=InitRenderWorker,
+                                 initargs=(False,)) as pool:
+            self.assertEqual(pool.submit(Medir, 2).result(), [])
+
+
+if __name__ == "__main__":
+    unittest.main()
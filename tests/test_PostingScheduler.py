@@ -0,0 +1,226 @@
+import contextlib
+import io
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+from FakeTwitter import FakeTwitterAPI  # noqa: E402
+from PostingScheduler import PostingScheduler  # noqa: E402
+from SIBOM import Publicacion, Tweet  # noqa: E402
+from StateStore import StateStore  # noqa: E402
+
+bulletin_id = 4047
+urls = ["/bulletins/%s/contents/%s" % (bulletin_id, 1477570 + i) for i in range(4)]
+
+
+# Juntando: ["a\nb", "c\nd"]; sin juntar: ["a", "b", "c", "d"]
+articulos = ["a" * 200, "b" * 50, "c" * 50, "d" * 200]
+
+
+def NuevaPublicacion(url: str, tweets: int) -> Publicacion:
+    """Devuelvo una publicación de prueba con tweets de texto."""
+    pub = Publicacion()
+    pub.url = url
+    pub.IterTweets = lambda: iter(Tweet("%s #%s" % (url, j)) for j in range(tweets))
+    return pub
+
+
+def NuevaPublicacionConArticulos(url: str, pack: bool) -> Publicacion:
+    """Devuelvo una publicación de prueba con los artículos de arriba."""
+    pub = Publicacion()
+    pub.url = url
+    pub.titulo = "Decreto"
+    pub.articulos = articulos
+    pub.pack = pack
+    return pub
+
+
+class TweepError(Exception):
+    """Imita el error de tweepy 3 cuando Twitter rechaza un tweet."""
+
+    def __init__(self, api_code: int) -> None:
+        super().__init__("Twitter rechazó el tweet (%s)" % (api_code))
+        self.api_code = api_code
+        return
+
+
+class SIBOMFalso:
+    """Imita lo que usa PostingScheduler.RunBulletin de SIBOM. Si urls
+    está vacía, es como si no se hubiera podido descargar la página del
+    boletín (GetAllURLs devuelve [] en ese caso).
+    """
+    muni_display = "General Pueyrredón"
+
+    def __init__(self, urls: list) -> None:
+        self.urls = urls
+        return
+
+    def GetAllURLs(self, id: int) -> list:
+        return list(self.urls)
+
+    def IterPublicaciones(self, id: int, urls: list):
+        for url in urls:
+            yield NuevaPublicacion(url, 2)
+        return
+
+
+class PostingSchedulerTest(unittest.TestCase):
+    def setUp(self) -> None:
+        self.state = StateStore(":memory:")
+        self.state.StartBulletin("General Pueyrredón", bulletin_id, urls)
+        return
+
+    def tearDown(self) -> None:
+        self.state.Close()
+        return
+
+    def Run(self, api: FakeTwitterAPI, new=lambda url: NuevaPublicacion(url, 3)) -> bool:
+        """Publico las publicaciones pendientes (por defecto, de 3 tweets
+        cada una).
+        """
+        scheduler = PostingScheduler(api, self.state, sleep=lambda _: None)
+        scheduler.tweet_gap = 0
+        scheduler.thread_gap = 0
+        pending = self.state.GetPendingURLs(bulletin_id)
+        with contextlib.redirect_stdout(io.StringIO()):
+            completed = scheduler.Run(
+                ((url, new(url)) for url in pending), len(pending))
+        scheduler.Close()
+        return completed
+
+    def testCompleto(self) -> None:
+        api = FakeTwitterAPI()
+        self.assertTrue(self.Run(api))
+        self.assertEqual(len(api.statuses), 12)
+        self.assertEqual(self.state.GetPendingURLs(bulletin_id), [])
+
+    def testNoPublicaDespuesDeUnHiloIncompleto(self) -> None:
+        # Falla el segundo tweet de la segunda publicación
+        api = FakeTwitterAPI(fail_on={5})
+        self.assertFalse(self.Run(api))
+        self.assertEqual([status.text for status in api.statuses],
+                         ["%s #%s" % (urls[0], j) for j in range(3)] + ["%s #0" % (urls[1])])
+        self.assertEqual(self.state.GetPendingURLs(bulletin_id), urls[1:])
+
+        # La corrida siguiente retoma el hilo donde quedó, y sigue en orden
+        self.assertTrue(self.Run(api))
+        self.assertEqual([status.text for status in api.statuses[4:]],
+                         ["%s #%s" % (url, j) for url in urls[1:] for j in range(3)][1:])
+        self.assertEqual(api.statuses[4].in_reply_to_status_id, api.statuses[3].id)
+        self.assertEqual(self.state.GetPendingURLs(bulletin_id), [])
+
+    def testRetomaConElMismoModoDeJuntar(self) -> None:
+        # Falla el tercer tweet: quedan enviados el título y "a\nb"
+        api = FakeTwitterAPI(fail_on={3})
+        self.assertFalse(self.Run(api, lambda url: NuevaPublicacionConArticulos(url, True)))
+        # Aunque ahora no se junten, el hilo empezado sigue igual
+        self.assertTrue(self.Run(api, lambda url: NuevaPublicacionConArticulos(url, False)))
+
+        textos = [status.text for status in api.statuses]
+        self.assertEqual(textos[1:3], [articulos[0] + "\n" + articulos[1],
+                                       articulos[2] + "\n" + articulos[3]])
+        self.assertEqual(textos[4:8], articulos)
+        self.assertEqual(len(textos), 3 + 3 * 5)
+
+    def testLeeUnTweetPorAdelantado(self) -> None:
+        api = FakeTwitterAPI()
+        generated = []
+        read_ahead = []
+
+        def IterTweets():
+            for j in range(5):
+                generated.append(j)
+                yield Tweet("#%s" % (j))
+
+        def UpdateStatus(**kwargs):
+            # Al publicar el tweet j, a lo sumo se generó el j + 1
+            read_ahead.append(len(generated) - len(api.statuses))
+            return FakeTwitterAPI.update_status(api, **kwargs)
+
+        api.update_status = UpdateStatus
+        pub = NuevaPublicacion(urls[0], 0)
+        pub.IterTweets = IterTweets
+        self.Run(api, lambda url: pub if url == urls[0] else NuevaPublicacion(url, 1))
+        self.assertEqual(read_ahead[:5], [2, 2, 2, 2, 1])
+
+    def testNoPublicaDespuesDeUnaDescargaFallida(self) -> None:
+        api = FakeTwitterAPI()
+
+        def Nueva(url: str) -> Publicacion:
+            # SIBOM devuelve una publicación vacía si no la pudo descargar
+            return Publicacion() if url == urls[1] else NuevaPublicacion(url, 3)
+
+        self.assertFalse(self.Run(api, Nueva))
+        self.assertEqual(len(api.statuses), 3)
+        self.assertEqual(self.state.GetPendingURLs(bulletin_id), urls[1:])
+
+        self.assertTrue(self.Run(api))
+        self.assertEqual([status.text for status in api.statuses[3:]],
+                         ["%s #%s" % (url, j) for url in urls[1:] for j in range(3)])
+
+    def testSalteaErroresPermanentes(self) -> None:
+        api = FakeTwitterAPI()
+        update_status = api.update_status
+
+        def UpdateStatus(**kwargs):
+            # 187: tweet repetido
+            if kwargs["status"] == "%s #1" % (urls[0]):
+                raise TweepError(187)
+            return update_status(**kwargs)
+
+        api.update_status = UpdateStatus
+        self.assertTrue(self.Run(api))
+        self.assertEqual(len(api.statuses), 11)
+        self.assertEqual(api.statuses[1].text, "%s #2" % (urls[0]))
+        self.assertEqual(api.statuses[1].in_reply_to_status_id, api.statuses[0].id)
+        self.assertEqual(self.state.GetSkippedTweets(urls[0]), {1})
+
+    def testSalteaDespuesDeVariosIntentos(self) -> None:
+        # El segundo tweet falla en las tres corridas
+        api = FakeTwitterAPI(fail_on={2, 3, 4})
+        self.assertFalse(self.Run(api))
+        self.assertFalse(self.Run(api))
+        self.assertEqual(len(api.statuses), 1)
+        self.assertTrue(self.Run(api))
+        self.assertEqual([status.text for status in api.statuses[:2]],
+                         ["%s #0" % (urls[0]), "%s #2" % (urls[0])])
+        self.assertEqual(len(api.statuses), 11)
+        self.assertEqual(self.state.GetPendingURLs(bulletin_id), [])
+
+        # Ya no se vuelve a intentar
+        self.assertEqual(self.state.GetSkippedTweets(urls[0]), {1})
+
+    def testSalteaDescargasQueSiempreFallan(self) -> None:
+        api = FakeTwitterAPI()
+
+        def Nueva(url: str) -> Publicacion:
+            return Publicacion() if url == urls[1] else NuevaPublicacion(url, 3)
+
+        for i in range(PostingScheduler.max_attempts - 1):
+            self.assertFalse(self.Run(api, Nueva))
+        self.assertTrue(self.Run(api, Nueva))
+        self.assertEqual(len(api.statuses), 9)
+        self.assertEqual(self.state.GetPendingURLs(bulletin_id), [])
+
+    def testBoletinSinPublicaciones(self) -> None:
+        api = FakeTwitterAPI()
+        muni = SIBOMFalso.muni_display
+        scheduler = PostingScheduler(api, self.state, sleep=lambda _: None)
+        scheduler.tweet_gap = 0
+        scheduler.thread_gap = 0
+        with contextlib.redirect_stdout(io.StringIO()):
+            # Falla la descarga de la página del boletín
+            self.assertFalse(scheduler.RunBulletin(SIBOMFalso([]), 4048))
+            self.assertFalse(self.state.IsBulletinDone(muni, 4048))
+            self.assertEqual(self.state.GetLastBulletin(muni), bulletin_id)
+
+            # En la corrida siguiente se publica completo
+            self.assertTrue(scheduler.RunBulletin(SIBOMFalso(urls), bulletin_id))
+        scheduler.Close()
+        self.assertTrue(self.state.IsBulletinDone(muni, bulletin_id))
+        self.assertEqual(len(api.statuses), 2 * len(urls))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,147 @@
+import contextlib
+import io
+import os
+import sys
+import time
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "benchmarks"))
+from SIBOM import SIBOM, Publicacion, GetWeightedLength, tweet_max_length, url_length  # noqa: E402
+from fixture_server import FixtureServer  # noqa: E402
+
+bulletin_id = 4047
+
+
+class SIBOMSinCache(SIBOM):
+    # Sin caches en disco. Las imágenes no se dibujan, así que tampoco
+    # hacen falta los assets.
+    cache_path = ""
+    render_cache_path = ""
+
+
+def NuevaPublicacion(articulos: list, pack: bool = False) -> Publicacion:
+    """Devuelvo una publicación de prueba con los artículos dados."""
+    pub = Publicacion()
+    pub.articulos = articulos
+    pub.pack = pack
+    return pub
+
+
+class GetWeightedLengthTest(unittest.TestCase):
+    def testPuntuacionFinal(self) -> None:
+        # "(ver " + URL + ")."
+        self.assertEqual(GetWeightedLength(
+            "(ver https://sibom.slyt.gba.gob.ar/bulletins/1)."), 5 + url_length + 2)
+        self.assertEqual(GetWeightedLength("ver www.mardelplata.gob.ar, y"),
+                         4 + url_length + 3)
+        self.assertEqual(GetWeightedLength("http://x.com/"), url_length)
+
+    def testSinTLD(self) -> None:
+        for texto in ("www." + "a" * 36, "foo.comfoo", "bit.ly/x"):
+            self.assertEqual(GetWeightedLength(texto), len(texto), texto)
+
+    def testConProtocolo(self) -> None:
+        # Con protocolo, cualquier dominio es una URL
+        self.assertEqual(GetWeightedLength("https://bit.ly/x"), url_length)
+        self.assertEqual(GetWeightedLength("(https://bit.ly/x)."), 1 + url_length + 2)
+        self.assertEqual(GetWeightedLength("https://" + "a" * 40), url_length)
+
+    def testSinURL(self) -> None:
+        for texto in ("Art. 3.- Se dispone", "mail@ejemplo.com", "1/2"):
+            self.assertEqual(GetWeightedLength(texto), len(texto), texto)
+
+    def testCaracteresPesados(self) -> None:
+        self.assertEqual(GetWeightedLength("Pueyrredón"), 10)
+        self.assertEqual(GetWeightedLength("日本"), 4)
+
+
+class IterTextosTest(unittest.TestCase):
+    def testPalabraLarga(self) -> None:
+        # Una palabra que no entra se corta, sin agregarle espacios
+        textos = list(NuevaPublicacion(["x" * 600])._IterTextos())
+        self.assertEqual(len(textos), 3)
+        self.assertTrue(all(texto.endswith("...") for texto in textos[:-1]))
+        self.assertEqual("".join(texto.rstrip(".") for texto in textos), "x" * 600)
+        self.assertTrue(all(len(texto) <= tweet_max_length for texto in textos))
+
+    def testArticuloLargo(self) -> None:
+        palabras = ["palabra%s" % (i) for i in range(100)]
+        textos = list(NuevaPublicacion([" ".join(palabras)])._IterTextos())
+        self.assertGreater(len(textos), 1)
+        self.assertEqual(" ".join(texto.rstrip(".") for texto in textos).split(), palabras)
+        self.assertTrue(all(GetWeightedLength(texto) <= tweet_max_length
+                            for texto in textos))
+
+    def testArticuloJusto(self) -> None:
+        # Un artículo que entra justo no se divide
+        texto = "a " * 139 + "bc"
+        self.assertEqual(list(NuevaPublicacion([texto])._IterTextos()), [texto])
+
+    def testJuntar(self) -> None:
+        textos = list(NuevaPublicacion(["uno", "dos", "x" * 300], True)._IterTextos())
+        self.assertEqual(textos[0], "uno\ndos")
+        self.assertEqual(len(textos), 3)
+
+
+class PrimerTweetTest(unittest.TestCase):
+    def NuevaPublicacion(self, titulo: str) -> Publicacion:
+        pub = Publicacion()
+        pub.ciudad_fecha = "General Pueyrredón, 1 de enero de 2021"
+        pub.titulo = titulo
+        pub.url = "https://sibom.slyt.gba.gob.ar/bulletins/4047/contents/1477570"
+        return pub
+
+    def testTituloCorto(self) -> None:
+        texto = next(self.NuevaPublicacion("Decreto 1").IterTweets()).content
+        self.assertIn("\nDecreto 1\nFuente: ", texto)
+
+    def testTituloLargo(self) -> None:
+        titulo = " ".join("palabra%s" % (i) for i in range(60))
+        texto = next(self.NuevaPublicacion(titulo).IterTweets()).content
+        self.assertLessEqual(GetWeightedLength(texto), tweet_max_length)
+        # Se acorta el título, no la fuente
+        corto = texto.split("\n")[1]
+        self.assertTrue(corto.endswith("..."))
+        self.assertTrue(titulo.startswith(corto[:-3]))
+        self.assertIn("Fuente: https://sibom", texto)
+
+
+class IterPublicacionesTest(unittest.TestCase):
+    def setUp(self) -> None:
+        self.server = FixtureServer()
+        SIBOMSinCache.sibom_url = self.server.Start()
+        self.sibom = SIBOMSinCache("@Test", "General Pueyrredón", r"general pueyrred.n",
+                                   "assets/Montserrat-Regular.ttf", "assets/logo.png")
+        self.urls = self.sibom.GetAllURLs(bulletin_id)
+        self.paths = [url[url.index("/bulletins/"):] for url in self.urls]
+        return
+
+    def tearDown(self) -> None:
+        self.sibom.http.Close()
+        self.server.Stop()
+        return
+
+    def testOrden(self) -> None:
+        # Las primeras tardan más, así las descargas terminan al revés
+        for i, path in enumerate(self.paths):
+            self.server.delays[path] = 0.02 * (len(self.paths) - i)
+        start = time.perf_counter()
+        pubs = list(self.sibom.IterPublicaciones(bulletin_id, self.urls, max_workers=4))
+        elapsed = time.perf_counter() - start
+
+        self.assertEqual([pub.url for pub in pubs], self.urls)
+        self.assertTrue(all(pub.titulo != "" for pub in pubs))
+        # En paralelo tarda bastante menos que la suma de las demoras
+        self.assertLess(elapsed, sum(self.server.delays.values()) / 2)
+
+    def testDescargaFallida(self) -> None:
+        del self.server.pages[self.paths[3]]
+        with contextlib.redirect_stdout(io.StringIO()):
+            pubs = list(self.sibom.IterPublicaciones(bulletin_id, self.urls))
+        self.assertEqual([pub.url for pub in pubs],
+                         self.urls[:3] + [""] + self.urls[4:])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,71 @@
+import os
+import sys
+import tempfile
+import time
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+from HTTPCache import HTTPCache  # noqa: E402
+from RenderCache import RenderCache  # noqa: E402
+
+
+class SQLiteLRUTest(unittest.TestCase):
+    def setUp(self) -> None:
+        self.dir = tempfile.TemporaryDirectory()
+        return
+
+    def tearDown(self) -> None:
+        self.dir.cleanup()
+        return
+
+    def LastUsed(self, cache: RenderCache, key: str) -> float:
+        return cache._db.execute(
+            "SELECT last_used FROM images WHERE key = ?", (key,)).fetchone()[0]
+
+    def testEliminaLasMenosUsadas(self) -> None:
+        cache = RenderCache(os.path.join(self.dir.name, "render.sqlite3"), max_bytes=30)
+        cache.touch_interval = 0
+        cache.Put("a", b"a" * 10)
+        cache.Put("b", b"b" * 10)
+        cache.Put("c", b"c" * 10)
+        # "a" pasa a ser la más reciente, así que se elimina "b"
+        self.assertEqual(cache.Get("a"), b"a" * 10)
+        cache.Put("d", b"d" * 10)
+        self.assertIsNone(cache.Get("b"))
+
+        stats = cache.GetStats()
+        self.assertEqual((stats["hits"], stats["misses"], stats["evictions"]), (1, 1, 1))
+        self.assertEqual((stats["entries"], stats["bytes"]), (3, 30))
+        cache.Close()
+
+    def testNoEscribeEnCadaBusqueda(self) -> None:
+        cache = RenderCache(os.path.join(self.dir.name, "render.sqlite3"))
+        cache.Put("a", b"a")
+        last_used = self.LastUsed(cache, "a")
+        changes = cache._db.total_changes
+        for i in range(10):
+            cache.Get("a")
+        self.assertEqual(cache._db.total_changes, changes)
+        self.assertEqual(self.LastUsed(cache, "a"), last_used)
+
+        # Pasado touch_interval sí se actualiza
+        cache._db.execute("UPDATE images SET last_used = ?",
+                          (time.time() - cache.touch_interval - 1,))
+        cache.Get("a")
+        self.assertGreater(self.LastUsed(cache, "a"), last_used - 1)
+        cache.Close()
+
+    def testHTTPCache(self) -> None:
+        cache = HTTPCache(os.path.join(self.dir.name, "http.sqlite3"), max_bytes=10)
+        cache.Store("http://x/1", "uno", etag='"1"')
+        cache.Store("http://x/2", "dos" * 3, complete=False)
+        self.assertIsNone(cache.Lookup("http://x/1"))
+        entry = cache.Lookup("http://x/2")
+        self.assertEqual((entry.body, entry.complete), ("dos" * 3, False))
+        self.assertEqual(cache.Size(), 9)
+        self.assertEqual(cache.GetStats()["evictions"], 1)
+        cache.Close()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,48 @@
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+from SearchIndex import SearchIndex  # noqa: E402
+
+url = "/bulletins/4047/contents/1477570"
+
+
+def NuevoRegistro(titulo: str) -> dict:
+    """Devuelvo un registro como los de BackfillArchive."""
+    return {"url": url, "titulo": titulo, "ciudad_fecha": "General Pueyrredón",
+            "articulos": ["Se dispone la licitación"], "anexos": []}
+
+
+class SearchIndexTest(unittest.TestCase):
+    def setUp(self) -> None:
+        self.index = SearchIndex(":memory:")
+        return
+
+    def tearDown(self) -> None:
+        self.index.Close()
+        return
+
+    def testSearch(self) -> None:
+        self.index.AddRecords([NuevoRegistro("Decreto 1")])
+        self.assertEqual([r["url"] for r in self.index.Search("pueyrredon licitacion")], [url])
+        self.assertEqual([r["url"] for r in self.index.Search("lic*")], [url])
+        self.assertEqual(self.index.Search("titulo:resolucion"), [])
+        # Sintaxis inválida: busco las palabras tal cual
+        self.assertEqual(self.index.Search("S.A."), [])
+
+    def testRegistroRepetido(self) -> None:
+        self.assertEqual(self.index.AddRecords(
+            [NuevoRegistro("Decreto 1"), NuevoRegistro("Decreto 2")]), 1)
+        self.assertEqual(self.index.GetCount(), 1)
+        self.assertEqual(self.index.Search("decreto")[0]["titulo"], "Decreto 2")
+
+    def testRemove(self) -> None:
+        self.index.AddRecords([NuevoRegistro("Decreto 1")])
+        self.index.Remove(url)
+        self.assertEqual(self.index.GetCount(), 0)
+        self.assertEqual(self.index.Search("decreto"), [])
+
+
+if __name__ == "__main__":
+    unittest.main()